@@ -2,6 +2,7 @@ from app.core.config import settings
 from app.db.base import Base
 from logging.config import fileConfig
 import os
+import re
 
 from sqlalchemy import engine_from_config, pool
 from alembic import context
@@ -19,11 +20,23 @@ config.set_main_option("sqlalchemy.url", settings.database_url)
 fileConfig(config.config_file_name)
 target_metadata = Base.metadata
 
+# Postgres-only schema that the models deliberately leave unmapped.
+UNMAPPED = {("column", "search_vector"), ("index", "ix_messages_search_vector")}
+# monthly messages partitions, managed by app.db.partitions
+PARTITION = re.compile(r"messages_(y\d{4}m\d{2}|default)")
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if reflected and type_ == "table" and PARTITION.fullmatch(name):
+        return False
+    return not (reflected and (type_, name) in UNMAPPED)
+
 
 def run_migrations_offline():
     context.configure(
-        url=DATABASE_URL,
+        url=settings.database_url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -39,7 +52,8 @@ def run_migrations_online():
     )
     with connectable.connect() as connection:
         context.configure(connection=connection,
-                          target_metadata=target_metadata)
+                          target_metadata=target_metadata,
+                          include_object=include_object)
         with context.begin_transaction():
             context.run_migrations()
 
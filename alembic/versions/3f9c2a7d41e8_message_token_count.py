@@ -0,0 +1,28 @@
+"""message token count
+
+Revision ID: 3f9c2a7d41e8
+Revises: bdd20acba60d
+Create Date: 2026-10-17 09:12:44.201377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d41e8'
+down_revision: Union[str, Sequence[str], None] = 'bdd20acba60d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('messages', sa.Column('token_count', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('messages', 'token_count')
@@ -0,0 +1,73 @@
+"""hot path indexes
+
+Revision ID: 7c1e5b9a0d24
+Revises: 3f9c2a7d41e8
+Create Date: 2026-10-17 14:03:51.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e5b9a0d24'
+down_revision: Union[str, Sequence[str], None] = '3f9c2a7d41e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_messages_conversation_id_timestamp', 'messages', ['conversation_id', 'timestamp']),
+    ('ix_conversations_user_id_created_at', 'conversations', ['user_id', 'created_at']),
+    ('ix_uploads_user_id_created_at', 'uploads', ['user_id', 'created_at']),
+]
+
+# Daily rows written by the old read-then-insert counters may be duplicated;
+# fold them into the oldest row before the unique index is built.
+DUPLICATE_USAGE = """
+    SELECT user_id, date, min(usage_id::text)::uuid AS keep,
+           sum(message_count) AS message_count,
+           sum(coalesce(token_count, 0)) AS token_count,
+           sum(coalesce(file_uploads, 0)) AS file_uploads
+    FROM usage
+    GROUP BY user_id, date
+    HAVING count(*) > 1
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        f"""
+        UPDATE usage SET message_count = d.message_count,
+                         token_count = d.token_count,
+                         file_uploads = d.file_uploads
+        FROM ({DUPLICATE_USAGE}) AS d
+        WHERE usage.usage_id = d.keep
+        """
+    )
+    op.execute(
+        f"""
+        DELETE FROM usage USING ({DUPLICATE_USAGE}) AS d
+        WHERE usage.user_id = d.user_id AND usage.date = d.date AND usage.usage_id <> d.keep
+        """
+    )
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block. A
+    # failed concurrent build leaves an invalid index behind, so drop any
+    # leftover before building.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+        op.drop_index('uq_usage_user_id_date', table_name='usage', postgresql_concurrently=True, if_exists=True)
+        op.create_index('uq_usage_user_id_date', 'usage', ['user_id', 'date'], unique=True, postgresql_concurrently=True)
+    op.execute('ALTER TABLE usage ADD CONSTRAINT uq_usage_user_id_date UNIQUE USING INDEX uq_usage_user_id_date')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_usage_user_id_date', 'usage', type_='unique')
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
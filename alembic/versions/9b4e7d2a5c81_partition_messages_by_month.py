@@ -0,0 +1,110 @@
+"""partition messages by month
+
+Revision ID: 9b4e7d2a5c81
+Revises: f3c8d2a6b519
+Create Date: 2026-10-17 19:12:05.331870
+
+Rebuilds ``messages`` as a table range-partitioned on ``timestamp`` with one
+partition per month and copies every row across. The old table stays locked
+while the rows are copied, so run this in a maintenance window. Later months
+are created by app.db.partitions.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e7d2a5c81'
+down_revision: Union[str, Sequence[str], None] = 'f3c8d2a6b519'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = 'message_id, conversation_id, user_id, content, timestamp, message_type, metadata, token_count'
+
+TABLE = """
+    CREATE TABLE messages (
+        message_id uuid NOT NULL,
+        conversation_id uuid NOT NULL REFERENCES conversations (conversation_id),
+        user_id uuid REFERENCES users (user_id),
+        content json NOT NULL,
+        timestamp timestamp without time zone {timestamp},
+        message_type varchar NOT NULL,
+        metadata json,
+        token_count integer,
+        search_vector tsvector
+            GENERATED ALWAYS AS (to_tsvector('english', coalesce(content->>'text', ''))) STORED,
+        PRIMARY KEY ({key})
+    ) {partitioning}
+"""
+
+# Every month from the oldest message up to three months ahead, the same
+# horizon as MESSAGE_PARTITION_MONTHS_AHEAD.
+MONTHLY_PARTITIONS = """
+    DO $$
+    DECLARE
+        month timestamp := date_trunc('month', coalesce((SELECT min(timestamp) FROM messages_unpartitioned), now()));
+    BEGIN
+        WHILE month < date_trunc('month', now()) + interval '4 months' LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                'messages_y' || to_char(month, 'YYYY"m"MM'), month, month + interval '1 month'
+            );
+            month := month + interval '1 month';
+        END LOOP;
+    END $$
+"""
+
+
+def _set_aside(old: str) -> None:
+    op.execute(f'ALTER TABLE messages RENAME TO {old}')
+    # index names are schema-wide, so free them for the new table
+    op.execute(f'ALTER INDEX messages_pkey RENAME TO {old}_pkey')
+    op.execute(f'ALTER INDEX ix_messages_conversation_id_timestamp_message_id RENAME TO ix_{old}_conversation')
+    op.execute(f'ALTER INDEX ix_messages_search_vector RENAME TO ix_{old}_search_vector')
+
+
+def _index() -> None:
+    # built after the copy, which is faster than maintaining them row by row
+    op.create_index(
+        'ix_messages_conversation_id_timestamp_message_id',
+        'messages',
+        ['conversation_id', 'timestamp', 'message_id'],
+    )
+    op.create_index('ix_messages_search_vector', 'messages', ['search_vector'], postgresql_using='gin')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _set_aside('messages_unpartitioned')
+    op.execute(
+        TABLE.format(
+            timestamp='NOT NULL DEFAULT now()',
+            key='message_id, timestamp',
+            partitioning='PARTITION BY RANGE (timestamp)',
+        )
+    )
+    op.execute(MONTHLY_PARTITIONS)
+    op.execute('CREATE TABLE messages_default PARTITION OF messages DEFAULT')
+    op.execute(
+        f"""
+        INSERT INTO messages ({COLUMNS})
+        SELECT message_id, conversation_id, user_id, content, coalesce(timestamp, now()),
+               message_type, metadata, token_count
+        FROM messages_unpartitioned
+        """
+    )
+    _index()
+    op.drop_table('messages_unpartitioned')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _set_aside('messages_partitioned')
+    op.execute(TABLE.format(timestamp='DEFAULT now()', key='message_id', partitioning=''))
+    op.execute(f'INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_partitioned')
+    _index()
+    # drops the partitions with it
+    op.drop_table('messages_partitioned')
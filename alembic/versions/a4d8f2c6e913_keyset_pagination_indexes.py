@@ -0,0 +1,67 @@
+"""keyset pagination indexes
+
+Revision ID: a4d8f2c6e913
+Revises: 7c1e5b9a0d24
+Create Date: 2026-10-17 16:40:12.874019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d8f2c6e913'
+down_revision: Union[str, Sequence[str], None] = '7c1e5b9a0d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Pages are ordered by (time, id); with the id in the index the next page is
+# one index range scan and no sort. Each index replaces the narrower one.
+INDEXES = [
+    (
+        'ix_messages_conversation_id_timestamp_message_id',
+        'ix_messages_conversation_id_timestamp',
+        'messages',
+        ['conversation_id', 'timestamp', 'message_id'],
+    ),
+    (
+        'ix_conversations_user_id_created_at_conversation_id',
+        'ix_conversations_user_id_created_at',
+        'conversations',
+        ['user_id', 'created_at', 'conversation_id'],
+    ),
+    (
+        'ix_uploads_user_id_created_at_upload_id',
+        'ix_uploads_user_id_created_at',
+        'uploads',
+        ['user_id', 'created_at', 'upload_id'],
+    ),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, old, table, columns in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+            op.drop_index(old, table_name=table, postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_live_created_at_user_id', table_name='users', postgresql_concurrently=True, if_exists=True)
+        op.create_index(
+            'ix_users_live_created_at_user_id',
+            'users',
+            ['created_at', 'user_id'],
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_live_created_at_user_id', table_name='users', postgresql_concurrently=True)
+        for name, old, table, columns in reversed(INDEXES):
+            op.create_index(old, table, columns[:2], postgresql_concurrently=True)
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,42 @@
+"""conversation message counts
+
+Revision ID: c2b7e4f91a36
+Revises: a4d8f2c6e913
+Create Date: 2026-10-17 16:41:08.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2b7e4f91a36'
+down_revision: Union[str, Sequence[str], None] = 'a4d8f2c6e913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversations', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('conversations', sa.Column('last_message_at', sa.DateTime(), nullable=True))
+    op.execute(
+        """
+        UPDATE conversations SET message_count = m.message_count,
+                                 last_message_at = m.last_message_at
+        FROM (
+            SELECT conversation_id, count(*) AS message_count, max(timestamp) AS last_message_at
+            FROM messages
+            GROUP BY conversation_id
+        ) AS m
+        WHERE conversations.conversation_id = m.conversation_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('conversations', 'last_message_at')
+    op.drop_column('conversations', 'message_count')
@@ -0,0 +1,47 @@
+"""message full text search
+
+Revision ID: e5a91c3d7b42
+Revises: c2b7e4f91a36
+Create Date: 2026-10-17 17:26:44.917305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a91c3d7b42'
+down_revision: Union[str, Sequence[str], None] = 'c2b7e4f91a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A stored generated column rewrites the table once; afterwards Postgres
+    # keeps it in step with content on every insert and update. The config
+    # must match SEARCH_CONFIG in app.repositories.message.
+    op.execute(
+        """
+        ALTER TABLE messages ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', coalesce(content->>'text', ''))) STORED
+        """
+    )
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_messages_search_vector', table_name='messages', postgresql_concurrently=True, if_exists=True)
+        op.create_index(
+            'ix_messages_search_vector',
+            'messages',
+            ['search_vector'],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_messages_search_vector', table_name='messages', postgresql_concurrently=True)
+    op.drop_column('messages', 'search_vector')
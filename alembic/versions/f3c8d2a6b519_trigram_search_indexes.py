@@ -0,0 +1,50 @@
+"""trigram search indexes
+
+Revision ID: f3c8d2a6b519
+Revises: e5a91c3d7b42
+Create Date: 2026-10-17 18:02:37.640128
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8d2a6b519'
+down_revision: Union[str, Sequence[str], None] = 'e5a91c3d7b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Substring filters ('%q%') cannot use a B-tree; gin_trgm_ops serves them.
+# User lookups only ever see live users, so those indexes are partial.
+INDEXES = [
+    ('ix_conversations_title_trgm', 'conversations', 'title', None),
+    ('ix_users_live_email_trgm', 'users', 'email', 'deleted_at IS NULL'),
+    ('ix_users_live_phone_number_trgm', 'users', 'phone_number', 'deleted_at IS NULL'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        for name, table, column, where in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+            op.create_index(
+                name,
+                table,
+                [column],
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -1,21 +1,20 @@
 from uuid import UUID
 import logging
 from fastapi import Header, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.database import get_db
+from app.db.database import get_async_db, get_db
 from app.repositories import user as user_repo
+from app.repositories.aio import user as async_user_repo
 from app.core import decode_access_token
 
 
 logger = logging.getLogger(__name__)
 
 
-def get_current_user(
-    authorization: str | None = Header(None, alias="Authorization"),
-    x_user_id: UUID | None = Header(None, alias="X-User-ID"),
-    db: Session = Depends(get_db),
-):
+def _credentials(authorization: str | None, x_user_id: UUID | None):
     if authorization:
         token = authorization.replace("Bearer ", "")
         try:
@@ -28,8 +27,10 @@ def get_current_user(
     if not user_id:
         logger.warning("Missing credentials")
         raise HTTPException(status_code=401, detail="Missing credentials")
+    return user_id
 
-    user = user_repo.get_user(db, user_id)
+
+def _active(user, user_id):
     if not user:
         logger.warning("User %s not found", user_id)
         raise HTTPException(status_code=404, detail="User not found")
@@ -39,6 +40,26 @@ def get_current_user(
     return user
 
 
+def get_current_user(
+    authorization: str | None = Header(None, alias="Authorization"),
+    x_user_id: UUID | None = Header(None, alias="X-User-ID"),
+    db: Session = Depends(get_db),
+):
+    user_id = _credentials(authorization, x_user_id)
+    return _active(user_repo.get_user(db, user_id), user_id)
+
+
+async def get_current_user_async(
+    authorization: str | None = Header(None, alias="Authorization"),
+    x_user_id: UUID | None = Header(None, alias="X-User-ID"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Same as :func:`get_current_user` for endpoints using ``get_async_db``."""
+    # the revocation check is a blocking Redis call
+    user_id = await run_in_threadpool(_credentials, authorization, x_user_id)
+    return _active(await async_user_repo.get_user(db, user_id), user_id)
+
+
 def verify_admin(
     authorization: str | None = Header(None, alias="Authorization"),
     db: Session = Depends(get_db),
@@ -0,0 +1,47 @@
+"""Opaque cursors for keyset-paginated list endpoints.
+
+A cursor encodes the sort key ``(timestamp, id)`` of the last row of a page.
+List endpoints fetch ``limit + 1`` rows to learn whether another page exists
+and return its cursor as ``next_cursor`` in the response envelope.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+
+Key = Tuple[datetime, UUID]
+
+
+def encode_cursor(key: Key) -> str:
+    raw = json.dumps([key[0].isoformat(), str(key[1])])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Key]:
+    """Return the key in ``cursor``; a malformed cursor is a 400."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), UUID(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page(rows: Sequence[Any], limit: int, key: Callable[[Any], Key]) -> Tuple[List[Any], Optional[str]]:
+    """Trim ``limit + 1`` fetched rows to a page and its ``next_cursor``."""
+    items = list(rows[:limit])
+    if len(rows) <= limit or not items:
+        return items, None
+    return items, encode_cursor(key(items[-1]))
+
+
+def no_cursor(cursor: Optional[str]) -> None:
+    """Reject ``cursor`` on a search, whose results page with ``skip`` instead."""
+    if cursor:
+        raise HTTPException(status_code=400, detail="Search results are paged with skip, not cursor")
@@ -0,0 +1,32 @@
+"""Streaming response helpers shared by the chat endpoints."""
+
+import logging
+
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+class ChatStreamingResponse(StreamingResponse):
+    """Streaming response that cleans up when the client goes away.
+
+    Starlette stops iterating the body on disconnect but leaves the generator
+    suspended, so the upstream LLM stream would keep running. This response
+    always closes the body iterator and then runs the background task, which
+    lets the generator record a truncated turn that ``finalize`` persists.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        background, self.background = self.background, None
+        try:
+            await super().__call__(scope, receive, send)
+        except ClientDisconnect:
+            logger.info("Client disconnected during stream")
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            if background is not None:
+                await background()
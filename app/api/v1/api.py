@@ -11,6 +11,7 @@ from app.api.v1.endpoints import (
     uploads,
     admin,
     moderation,
+    jobs,
 )
 
 api_router = APIRouter()
@@ -24,3 +25,4 @@ api_router.include_router(message_router)
 api_router.include_router(uploads.router)
 api_router.include_router(admin.router)
 api_router.include_router(moderation.router)
+api_router.include_router(jobs.router)
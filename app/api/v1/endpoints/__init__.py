@@ -7,6 +7,7 @@ from .conversations import router as conversations_router, message_router
 from .uploads import router as uploads_router
 from .admin import router as admin_router
 from .moderation import router as moderation_router
+from .jobs import router as jobs_router
 
 __all__ = [
     "auth_router",
@@ -19,4 +20,5 @@ __all__ = [
     "uploads_router",
     "admin_router",
     "moderation_router",
+    "jobs_router",
 ]
@@ -5,7 +5,10 @@ from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.orm import Session
 
 from app.api.deps import verify_admin
-from app.db.database import get_db
+from app.api.pagination import decode_cursor, no_cursor, page
+from app.db.database import async_engine, engine, get_db, get_read_db, replica_router
+from app.db.pool import pool_stats
+from app.repositories.usage_counter import usage_counter
 from sqlalchemy.exc import IntegrityError
 
 from app.repositories import user as user_repo
@@ -19,6 +22,10 @@ from app.schemas import (
     UsageRead,
 )
 from app.core import success, StandardResponse
+from app.core.history_cache import history_cache
+from app.services import llm
+from app.services.admission import admission
+from app.services.search import search_users
 
 logger = logging.getLogger(__name__)
 
@@ -32,12 +39,18 @@ def admin_list_users(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db),
 ) -> List[UserRead]:
     logger.info("Admin listing users")
-    users = user_repo.list_users(db, skip=skip, limit=limit, search=search)
+    if search:
+        no_cursor(cursor)
+        users, next_cursor = search_users(db, search, skip=skip, limit=limit), None
+    else:
+        users = user_repo.list_users(db, skip=skip, limit=limit + 1, after=decode_cursor(cursor))
+        users, next_cursor = page(users, limit, lambda u: (u.created_at, u.user_id))
     payload = [UserRead.model_validate(u) for u in users]
-    return success(payload).dict()
+    return success(payload, next_cursor=next_cursor).dict()
 
 
 @router.patch(
@@ -83,7 +96,7 @@ def admin_delete_user(user_id: UUID, db: Session = Depends(get_db)) -> UserRead:
     summary="User conversations",
 )
 def admin_user_conversations(
-    user_id: UUID, db: Session = Depends(get_db)
+    user_id: UUID, db: Session = Depends(get_read_db)
 ) -> List[ConversationRead]:
     user = user_repo.get_user(db, user_id)
     if not user:
@@ -98,7 +111,7 @@ def admin_user_conversations(
     response_model=StandardResponse,
     summary="User usage",
 )
-def admin_user_usage(user_id: UUID, db: Session = Depends(get_db)) -> List[UsageRead]:
+def admin_user_usage(user_id: UUID, db: Session = Depends(get_read_db)) -> List[UsageRead]:
     user = user_repo.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -148,3 +161,29 @@ def admin_restore_user(user_id: UUID, db: Session = Depends(get_db)) -> UserRead
     restored = user_repo.restore_user(db, user)
     logger.info("Admin restored user %s", user_id)
     return success(UserRead.model_validate(restored)).dict()
+
+
+@router.get("/metrics/llm", response_model=StandardResponse, summary="LLM metrics")
+def admin_llm_metrics() -> dict:
+    """Return admission queue, provider and cache statistics for this worker."""
+    return success(
+        {
+            "admission": admission.stats(),
+            "providers": llm.router.stats(),
+            "response_cache": llm.response_cache.stats(),
+            "history_cache": history_cache.stats(),
+        }
+    ).dict()
+
+
+@router.get("/metrics/db", response_model=StandardResponse, summary="Database pool metrics")
+def admin_db_metrics() -> dict:
+    """Return connection pool occupancy, checkout waits, replica state and usage flushes."""
+    return success(
+        {
+            "sync": pool_stats(engine),
+            "async": pool_stats(async_engine.sync_engine),
+            "replicas": replica_router.stats(),
+            "usage_counter": usage_counter.stats(),
+        }
+    ).dict()
@@ -1,102 +1,139 @@
+import asyncio
 import logging
 from datetime import date
-from typing import Any
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.concurrency import run_in_threadpool
 from starlette.responses import StreamingResponse
 from starlette.background import BackgroundTask
-from starlette.concurrency import iterate_in_threadpool
 
-from app.core import success, StandardResponse
-from app.db.database import get_db
-from app.schemas.chat import ChatRequest
-from app.services.llm import chat_with_openai_history, stream_openai_history
-from app.services import check_chat_rate_limit
+from app.api.streaming import ChatStreamingResponse
+
+from app.core import success, StandardResponse, settings
+from app.db.database import get_db, replica_router
+from app.schemas.chat import ChatBatchRequest, ChatRequest
+from app.services.llm import async_chat_with_openai_history, async_stream_openai_history
+from app.services import check_chat_rate_limit, build_chat_context
+from app.services.admission import OverCapacity
+from app.services.quota import check_chat_quota
+from app.services.sse import sse_stream
+from app.services.write_behind import write_behind
 from app.core import PLANS
-from app.repositories import usage as usage_repo
 from app.repositories import conversation as convo_repo
-from app.repositories import message as message_repo
+from app.repositories.unit_of_work import UnitOfWork, record_chat_turn
 from app.api.deps import get_current_user
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+def _prepare_turn(db, user_id, request: ChatRequest, plan: dict) -> list:
+    """Enforce quota, rate limit and ownership and build the prompt; runs in the threadpool."""
+    check_chat_quota(db, user_id, plan)
+    check_chat_rate_limit(user_id)
+    if request.conversation_id:
+        convo = convo_repo.get_conversation(db, request.conversation_id)
+        if not convo or convo.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+    return build_chat_context(db, request.conversation_id, request.message, plan)
+
+
+def _prepare_batch(db, user_id, items: list[ChatRequest], plan: dict) -> list[list]:
+    """Batch counterpart of :func:`_prepare_turn`."""
+    check_chat_quota(db, user_id, plan, messages=len(items))
+    check_chat_rate_limit(user_id)
+    conversation_ids = list({item.conversation_id for item in items if item.conversation_id})
+    owned = convo_repo.get_owned_conversation_ids(db, user_id, conversation_ids)
+    if len(owned) != len(conversation_ids):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return [build_chat_context(db, item.conversation_id, item.message, plan) for item in items]
+
+
+async def _resume(first: Optional[str], rest: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+    """Yield the delta read ahead, then the rest of the stream."""
+    async with aclosing(rest):
+        if first is not None:
+            yield first
+        async for delta in rest:
+            yield delta
+
+
 @router.post("/chat", response_model=StandardResponse, summary="Chat with OpenAI GPT-4")
 async def chat(
     request: ChatRequest,
+    http_request: Request,
     current_user = Depends(get_current_user),
     db=Depends(get_db),
     stream: bool = False,
 ) -> dict | StreamingResponse:
-    """Proxy a message to the language model with plan enforcement."""
+    """Proxy a message to the language model with plan enforcement.
+
+    Streaming responses are plain text unless the client sends
+    ``Accept: text/event-stream``, in which case batched SSE events are used.
+    """
     logger.info("Chat request from %s", current_user.user_id)
 
     # plan enforcement using configured plans
-    plan = PLANS.get(current_user.plan, PLANS["free"])
-    daily = usage_repo.get_daily_usage(db, current_user.user_id, date.today())
-    if daily and daily.message_count >= plan["daily_messages"]:
-        raise HTTPException(status_code=403, detail="Upgrade required")
-    if daily and daily.token_count is not None and daily.token_count >= plan["daily_tokens"]:
-        raise HTTPException(status_code=403, detail="Upgrade required")
-
-    # rate limiting
-    check_chat_rate_limit(current_user.user_id)
-
-    history = [
-        {
-            "role": "system",
-            "content": (
-                "You are Flynkle, a witty, deeply personal AI assistant who speaks "
-                "like a friend and doesn't say 'As an AI...'"
-            ),
-        }
-    ]
-    if request.conversation_id:
-        convo = convo_repo.get_conversation(db, request.conversation_id)
-        if not convo or convo.user_id != current_user.user_id:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        msgs = message_repo.list_messages(db, request.conversation_id)
-        for m in msgs:
-            if m.message_type == "user":
-                role = "user"
-            elif m.message_type == "ai":
-                role = "assistant"
-            else:
-                continue
-            text = m.content.get("text") if isinstance(m.content, dict) else str(m.content)
-            history.append({"role": role, "content": text})
-    history.append({"role": "user", "content": request.message})
+    plan_name = current_user.plan if current_user.plan in PLANS else "free"
+    plan = PLANS[plan_name]
+    # the session and Redis clients are synchronous; keep them off the event loop
+    history = await run_in_threadpool(_prepare_turn, db, current_user.user_id, request, plan)
+    # identical concurrent turns (retries, several tabs) share one upstream call
+    scope = str(request.conversation_id or current_user.user_id)
 
     if stream:
         state: dict[str, Any] = {}
+        user_id = current_user.user_id
+        if settings.stream_write_behind:
+            # the queue persists the turn, so give the connection back before
+            # the first token instead of holding it for the whole stream
+            db.close()
+
         def finalize() -> None:
-            if request.conversation_id:
-                message_repo.create_message(
-                    db,
-                    request.conversation_id,
-                    current_user.user_id,
-                    {"text": request.message},
-                    "user",
-                )
-                message_repo.create_message(
-                    db,
-                    request.conversation_id,
-                    None,
-                    {"text": state.get("response", "")},
-                    "ai",
-                )
-            usage_repo.increment_message_count(db, current_user.user_id, date.today())
-            usage_repo.increment_token_count(db, current_user.user_id, date.today(), state.get("tokens", 0))
+            if state.get("error"):
+                return
+            turn = (
+                user_id,
+                request.conversation_id,
+                request.message,
+                state.get("response", ""),
+                state.get("tokens", 0),
+            )
+            extra = {"truncated": True} if state.get("truncated") else None
+            if settings.stream_write_behind:
+                write_behind.submit_chat_turn(*turn, extra=extra)
+            else:
+                record_chat_turn(db, *turn, extra=extra)
+                # committed after the response started
+                replica_router.mark_write(str(user_id))
 
         try:
-            generator = stream_openai_history(history, state)
-            return StreamingResponse(
-                iterate_in_threadpool(generator),
+            generator = async_stream_openai_history(history, state, scope=scope, plan=plan_name)
+            # read ahead to the first delta so admission and upstream failures
+            # still get a status code instead of an empty 200
+            first = await anext(generator, None)
+            generator = _resume(first, generator)
+            if "text/event-stream" in http_request.headers.get("accept", ""):
+                return ChatStreamingResponse(
+                    sse_stream(
+                        generator,
+                        state,
+                        max_bytes=settings.sse_flush_bytes,
+                        max_delay=settings.sse_flush_ms / 1000,
+                    ),
+                    background=BackgroundTask(finalize),
+                    media_type="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                )
+            return ChatStreamingResponse(
+                generator,
                 background=BackgroundTask(finalize),
                 media_type="text/plain",
             )
+        except HTTPException:
+            raise
         except RuntimeError as exc:
             logger.exception("LLM request failed")
             raise HTTPException(
@@ -111,7 +148,11 @@ async def chat(
             ) from exc
     else:
         try:
-            content, tokens = await run_in_threadpool(chat_with_openai_history, history)
+            content, tokens = await async_chat_with_openai_history(
+                history, use_cache=plan.get("response_cache", False), scope=scope, plan=plan_name
+            )
+        except HTTPException:
+            raise
         except RuntimeError as exc:  # pragma: no cover - LLM errors
             logger.exception("LLM request failed")
             raise HTTPException(
@@ -125,21 +166,84 @@ async def chat(
                 detail={"message": "Internal error", "data": {"source": "server", "reason": "unexpected"}},
             ) from exc
 
-        if request.conversation_id:
-            message_repo.create_message(
-                db,
-                request.conversation_id,
-                current_user.user_id,
-                {"text": request.message},
-                "user",
-            )
-            message_repo.create_message(
-                db,
-                request.conversation_id,
-                None,
-                {"text": content},
-                "ai",
-            )
-        usage_repo.increment_message_count(db, current_user.user_id, date.today())
-        usage_repo.increment_token_count(db, current_user.user_id, date.today(), tokens)
+        await run_in_threadpool(
+            record_chat_turn, db, current_user.user_id, request.conversation_id, request.message, content, tokens
+        )
         return success({"response": content, "tokens": tokens}).dict()
+
+
+@router.post("/chat/batch", response_model=StandardResponse, summary="Send several independent chat messages")
+async def chat_batch(
+    request: ChatBatchRequest,
+    current_user = Depends(get_current_user),
+    db=Depends(get_db),
+) -> dict:
+    """Answer many independent prompts with one set of plan and rate checks.
+
+    Prompts are sent to the model concurrently, up to
+    ``settings.chat_batch_concurrency`` at a time; each one sees its
+    conversation as it was before the batch. Results keep the request order
+    and a failed prompt is reported in place without failing the others. All
+    messages and the usage increment are written in one transaction.
+    """
+    items = request.requests
+    logger.info("Chat batch of %d from %s", len(items), current_user.user_id)
+    if len(items) > settings.chat_batch_max_size:
+        raise HTTPException(status_code=400, detail=f"At most {settings.chat_batch_max_size} requests per batch")
+
+    plan_name = current_user.plan if current_user.plan in PLANS else "free"
+    plan = PLANS[plan_name]
+    histories = await run_in_threadpool(_prepare_batch, db, current_user.user_id, items, plan)
+    limit = asyncio.Semaphore(settings.chat_batch_concurrency)
+
+    async def answer(item: ChatRequest, history: list) -> tuple[str, int]:
+        async with limit:
+            return await async_chat_with_openai_history(
+                history,
+                use_cache=plan.get("response_cache", False),
+                scope=str(item.conversation_id or current_user.user_id),
+                plan=plan_name,
+            )
+
+    outcomes = await asyncio.gather(
+        *(answer(item, history) for item, history in zip(items, histories)),
+        return_exceptions=True,
+    )
+
+    results: list[dict] = []
+    uow = UnitOfWork(db)
+    answered = total_tokens = 0
+    over_capacity = None
+    for item, outcome in zip(items, outcomes):
+        if isinstance(outcome, OverCapacity):
+            over_capacity = outcome
+            results.append({"error": "LLM capacity exhausted", "retry_after": outcome.retry_after})
+            continue
+        if isinstance(outcome, RuntimeError):
+            logger.warning("LLM request in batch failed: %s", outcome)
+            results.append({"error": "OpenAI request failed"})
+            continue
+        if isinstance(outcome, BaseException):
+            logger.error("Unexpected chat batch failure", exc_info=outcome)
+            raise HTTPException(
+                status_code=500,
+                detail={"message": "Internal error", "data": {"source": "server", "reason": "unexpected"}},
+            ) from outcome
+        content, tokens = outcome
+        answered += 1
+        total_tokens += tokens
+        results.append({"response": content, "tokens": tokens})
+        if item.conversation_id:
+            uow.add_message(item.conversation_id, current_user.user_id, {"text": item.message}, "user")
+            uow.add_message(item.conversation_id, None, {"text": content}, "ai")
+
+    if not answered:
+        if over_capacity is not None:
+            raise over_capacity
+        raise HTTPException(
+            status_code=502,
+            detail={"message": "OpenAI request failed", "data": {"source": "openai", "reason": "all requests failed"}},
+        )
+    uow.add_usage(current_user.user_id, date.today(), messages=answered, tokens=total_tokens)
+    await run_in_threadpool(uow.commit)
+    return success({"results": results, "tokens": total_tokens}).dict()
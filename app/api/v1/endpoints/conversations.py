@@ -1,19 +1,29 @@
 from datetime import date
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 import logging
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_current_user_async
+from app.api.pagination import decode_cursor, no_cursor, page
 from app.core import success
-from app.db.database import get_db
+from app.db.database import get_async_read_db, get_db, get_read_db, replica_router
 from app.repositories import conversation as convo_repo
 from app.repositories import message as message_repo
-from app.repositories import usage as usage_repo
+from app.repositories.unit_of_work import UnitOfWork
+from app.repositories.aio import conversation as async_convo_repo
+from app.repositories.aio import message as async_message_repo
 from app.core import PLANS
 from app.services.llm import chat_with_openai
 from app.services import check_chat_rate_limit, check_message_rate_limit
+from app.services.admission import OverCapacity
+from app.services.jobs import jobs
+from app.services.quota import check_chat_quota, check_tokens, daily_usage
+from app.services.search import async_search_conversations
 from app.schemas import (
     ConversationCreate,
     ConversationRead,
@@ -22,6 +32,7 @@ from app.schemas import (
     MessageUpdate,
     MessageCreate,
     MessageRead,
+    MessageSearchResult,
 )
 from app.core import success, StandardResponse
 
@@ -31,21 +42,37 @@ logger = logging.getLogger(__name__)
 
 
 @router.get("", response_model=StandardResponse, summary="List conversations")
-def list_conversations(
-    current_user=Depends(get_current_user),
-    db: Session = Depends(get_db),
+async def list_conversations(
+    current_user=Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db),
     q: str | None = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
 ) -> List[ConversationRead]:
-    convos = convo_repo.list_conversations(db, current_user.user_id, query=q)
+    """List conversations newest first; pass ``next_cursor`` back as ``cursor``.
+
+    With ``q``, return up to ``limit`` conversations whose title contains it,
+    best matches first; those pages use ``skip`` rather than a cursor.
+    """
+    if q:
+        no_cursor(cursor)
+        convos = await async_search_conversations(db, current_user.user_id, q, skip=skip, limit=limit)
+        next_cursor = None
+    else:
+        convos = await async_convo_repo.list_conversations(
+            db, current_user.user_id, skip=skip, limit=limit + 1, after=decode_cursor(cursor)
+        )
+        convos, next_cursor = page(convos, limit, lambda c: (c.created_at, c.conversation_id))
     logger.info("Listing conversations for %s", current_user.user_id)
     payload = [ConversationRead.model_validate(c) for c in convos]
-    return success(payload).dict()
+    return success(payload, next_cursor=next_cursor).dict()
 
 
 @router.get("/export", response_model=StandardResponse, summary="Export conversation summaries")
 def export_conversations(
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ) -> List[ConversationSummary]:
     data = convo_repo.export_summaries(db, current_user.user_id)
     logger.info("Exporting summaries for %s", current_user.user_id)
@@ -134,20 +161,24 @@ def bulk_delete_conversations(
     response_model=StandardResponse,
     summary="List messages",
 )
-def list_messages(
+async def list_messages(
     conversation_id: UUID,
-    current_user=Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: str | None = None,
 ) -> List[MessageRead]:
-    convo = convo_repo.get_conversation(db, conversation_id)
+    """List messages oldest first; pass ``next_cursor`` back as ``cursor``."""
+    after = decode_cursor(cursor)
+    convo = await async_convo_repo.get_conversation(db, conversation_id)
     if not convo or convo.user_id != current_user.user_id:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    msgs = message_repo.list_messages(db, conversation_id, skip=skip, limit=limit)
+    msgs = await async_message_repo.list_messages(db, conversation_id, skip=skip, limit=limit + 1, after=after)
+    msgs, next_cursor = page(msgs, limit, lambda m: (m.timestamp, m.message_id))
     logger.info("Listing messages in %s for %s", conversation_id, current_user.user_id)
     payload = [MessageRead.model_validate(m) for m in msgs]
-    return success(payload).dict()
+    return success(payload, next_cursor=next_cursor).dict()
 
 
 @router.post(
@@ -166,69 +197,113 @@ def create_message(
         raise HTTPException(status_code=404, detail="Conversation not found")
     check_message_rate_limit(current_user.user_id)
     # plan enforcement using configured plans
-    plan = PLANS.get(current_user.plan, PLANS["free"])
-    daily = usage_repo.get_daily_usage(db, current_user.user_id, date.today())
-    if daily and daily.message_count >= plan["daily_messages"]:
-        raise HTTPException(status_code=403, detail="Upgrade required")
-    if (
-        daily
-        and daily.token_count is not None
-        and daily.token_count >= plan["daily_tokens"]
-    ):
-        raise HTTPException(status_code=403, detail="Upgrade required")
-    msg = message_repo.create_message(
-        db,
+    plan_name = current_user.plan if current_user.plan in PLANS else "free"
+    plan = PLANS[plan_name]
+    used = check_chat_quota(db, current_user.user_id, plan)
+    # the prompt, the reply and both usage deltas are written in one
+    # transaction; the prompt is stored even when the LLM part is refused
+    uow = UnitOfWork(db)
+    msg = uow.add_message(
         conversation_id,
         current_user.user_id,
         msg_in.content,
         msg_in.message_type,
     )
+    uow.add_usage(current_user.user_id, date.today(), messages=1)
+    ai_msg = None
+    invoke = msg_in.invoke_llm and msg_in.message_type in {"user", "ai", "tool"}
+    try:
+        if invoke:
+            check_chat_rate_limit(current_user.user_id)
+        if invoke and not msg_in.background:
+            try:
+                content, tokens = chat_with_openai(
+                    str(msg_in.content), use_cache=plan.get("response_cache", False), plan=plan_name
+                )
+            except OverCapacity:
+                raise
+            except Exception as exc:  # pragma: no cover - LLM failure
+                logger.exception("LLM call failed")
+            else:
+                check_tokens(used, plan, tokens)
+                ai_msg = uow.add_message(conversation_id, None, {"text": content}, "ai")
+                uow.add_usage(current_user.user_id, date.today(), tokens=tokens)
+    finally:
+        uow.commit()
     logger.info(
         "Message %s created in %s by %s",
         msg.message_id,
         conversation_id,
         current_user.user_id,
     )
-    usage_repo.increment_message_count(db, current_user.user_id, date.today())
-
-    if msg_in.invoke_llm and msg_in.message_type in {"user", "ai", "tool"}:
-        check_chat_rate_limit(current_user.user_id)
-        tokens_used = daily.token_count or 0 if daily else 0
-        if tokens_used >= plan["daily_tokens"]:
-            raise HTTPException(status_code=403, detail="Upgrade required")
-        try:
-            content, tokens = chat_with_openai(str(msg_in.content))
-        except Exception as exc:  # pragma: no cover - LLM failure
-            logger.exception("LLM call failed")
-        else:
-            if tokens_used + tokens > plan["daily_tokens"]:
-                raise HTTPException(status_code=403, detail="Upgrade required")
-            ai_msg = message_repo.create_message(
-                db,
-                conversation_id,
-                None,
-                {"text": content},
-                "ai",
-            )
-            usage_repo.increment_token_count(
-                db, current_user.user_id, date.today(), tokens
-            )
-            logger.info(
-                "AI message %s created in %s", ai_msg.message_id, conversation_id
-            )
+    if ai_msg is not None:
+        logger.info(
+            "AI message %s created in %s", ai_msg.message_id, conversation_id
+        )
+    if invoke and msg_in.background:
+        job = jobs.create(current_user.user_id, "message_reply", conversation_id=str(conversation_id))
+        jobs.submit(
+            job,
+            _reply_in_background,
+            db.get_bind(),
+            current_user.user_id,
+            plan_name,
+            conversation_id,
+            str(msg_in.content),
+        )
+        logger.info("Queued reply job %s for message %s", job["job_id"], msg.message_id)
+        payload = {"message": MessageRead.model_validate(msg), "job": job}
+        return JSONResponse(status_code=202, content=jsonable_encoder(success(payload, code=202)))
 
     return success(MessageRead.model_validate(msg)).dict()
 
 
+def _reply_in_background(bind, user_id: UUID, plan_name: str, conversation_id: UUID, prompt: str) -> dict:
+    """Generate and store the AI reply for a job-mode message."""
+    plan = PLANS[plan_name]
+    try:
+        content, tokens = chat_with_openai(prompt, use_cache=plan.get("response_cache", False), plan=plan_name)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=502, detail="OpenAI request failed") from exc
+    db = Session(bind=bind, autoflush=False)
+    try:
+        check_tokens(daily_usage(db, user_id), plan, tokens)
+        uow = UnitOfWork(db)
+        ai_msg = uow.add_message(conversation_id, None, {"text": content}, "ai")
+        uow.add_usage(user_id, date.today(), tokens=tokens)
+        uow.commit()
+    finally:
+        db.close()
+    replica_router.mark_write(str(user_id))
+    logger.info("AI message %s created in %s", ai_msg.message_id, conversation_id)
+    return jsonable_encoder(MessageRead.model_validate(ai_msg))
+
+
 @message_router.get("/search", response_model=StandardResponse, summary="Search messages")
 def search_messages_endpoint(
-    q: str,
+    q: str = Query(..., min_length=1),
+    conversation_id: UUID | None = None,
+    message_type: str | None = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db),
-) -> List[MessageRead]:
-    msgs = message_repo.search_messages(db, current_user.user_id, q)
+    db: Session = Depends(get_read_db),
+) -> List[MessageSearchResult]:
+    """Full-text search over the user's messages, best matches first."""
+    hits = message_repo.search_messages(
+        db,
+        current_user.user_id,
+        q,
+        conversation_id=conversation_id,
+        message_type=message_type,
+        skip=skip,
+        limit=limit,
+    )
     logger.info("Searching messages for %s", current_user.user_id)
-    payload = [MessageRead.model_validate(m) for m in msgs]
+    payload = [
+        MessageSearchResult.model_validate(hit.message).model_copy(update={"rank": hit.rank, "highlight": hit.highlight})
+        for hit in hits
+    ]
     return success(payload).dict()
 
 
@@ -237,10 +312,11 @@ def search_messages_endpoint(
 )
 def get_message(
     message_id: UUID,
+    conversation_id: UUID | None = None,
     current_user=Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> MessageRead:
-    msg = message_repo.get_message(db, message_id)
+    msg = message_repo.get_message(db, message_id, conversation_id)
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
     convo = convo_repo.get_conversation(db, msg.conversation_id)
@@ -256,10 +332,11 @@ def get_message(
 def update_message(
     message_id: UUID,
     msg_in: MessageUpdate,
+    conversation_id: UUID | None = None,
     current_user=Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> MessageRead:
-    msg = message_repo.get_message(db, message_id)
+    msg = message_repo.get_message(db, message_id, conversation_id)
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
     convo = convo_repo.get_conversation(db, msg.conversation_id)
@@ -281,10 +358,11 @@ def update_message(
 )
 def delete_message(
     message_id: UUID,
+    conversation_id: UUID | None = None,
     current_user=Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> MessageRead:
-    msg = message_repo.get_message(db, message_id)
+    msg = message_repo.get_message(db, message_id, conversation_id)
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
     convo = convo_repo.get_conversation(db, msg.conversation_id)
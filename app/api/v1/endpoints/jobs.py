@@ -0,0 +1,55 @@
+"""Status of background LLM jobs."""
+
+import asyncio
+import logging
+from typing import AsyncGenerator
+
+from fastapi import APIRouter, Depends, HTTPException
+from starlette.responses import StreamingResponse
+
+from app.api.deps import get_current_user
+from app.core import success, StandardResponse
+from app.services.jobs import TERMINAL, jobs
+from app.services.sse import sse_event
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.25  # seconds between store reads for subscribers
+
+
+def _owned_job(job_id: str, current_user) -> dict:
+    job = jobs.get(job_id)
+    if not job or job["user_id"] != str(current_user.user_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/{job_id}", response_model=StandardResponse, summary="Get job status")
+def get_job(job_id: str, current_user=Depends(get_current_user)) -> dict:
+    """Return a job's status and, once finished, its result or error."""
+    return success(_owned_job(job_id, current_user)).dict()
+
+
+@router.get("/{job_id}/events", summary="Subscribe to job status")
+async def job_events(job_id: str, current_user=Depends(get_current_user)) -> StreamingResponse:
+    """Stream ``status`` SSE events until the job finishes, then ``done``."""
+    job = _owned_job(job_id, current_user)
+
+    async def events(job: dict) -> AsyncGenerator[str, None]:
+        sent = None
+        while True:
+            if job != sent:
+                yield sse_event("status", job)
+                sent = job
+            if job["status"] in TERMINAL:
+                break
+            await asyncio.sleep(POLL_INTERVAL)
+            job = jobs.get(job_id) or job
+        yield sse_event("done", {})
+
+    return StreamingResponse(
+        events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,15 +1,15 @@
-from datetime import date
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 
 from app.api.deps import get_current_user
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.repositories import usage as usage_repo
 from app.repositories import conversation as convo_repo
 from app.schemas import UsageRead
 from app.core import success, StandardResponse, PLANS
 from app.services.billing import charge_plan
+from app.services.quota import daily_usage
 
 import logging
 
@@ -27,7 +27,7 @@ def list_plans() -> dict:
 @router.get("/user/usage", response_model=StandardResponse, summary="User usage")
 def get_usage(
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     logger.info("Fetching usage for %s", current_user.user_id)
     usage = usage_repo.get_usage(db, current_user.user_id)
@@ -54,20 +54,13 @@ def upgrade_plan(
     convo_count = convo_repo.count_conversations(db, current_user.user_id)
     if convo_count > new_plan["max_conversations"]:
         raise HTTPException(status_code=400, detail="Over conversation quota")
-    daily = usage_repo.get_daily_usage(db, current_user.user_id, date.today())
-    if daily:
-        if daily.message_count > new_plan["daily_messages"]:
-            raise HTTPException(status_code=400, detail="Over message quota")
-        if (
-            daily.token_count is not None
-            and daily.token_count > new_plan["daily_tokens"]
-        ):
-            raise HTTPException(status_code=400, detail="Over token quota")
-        if (
-            daily.file_uploads is not None
-            and daily.file_uploads > new_plan["max_file_uploads"]
-        ):
-            raise HTTPException(status_code=400, detail="Over file quota")
+    used = daily_usage(db, current_user.user_id)
+    if used.messages > new_plan["daily_messages"]:
+        raise HTTPException(status_code=400, detail="Over message quota")
+    if used.tokens > new_plan["daily_tokens"]:
+        raise HTTPException(status_code=400, detail="Over token quota")
+    if used.file_uploads > new_plan["max_file_uploads"]:
+        raise HTTPException(status_code=400, detail="Over file quota")
 
     charge_plan(str(current_user.user_id), plan)
 
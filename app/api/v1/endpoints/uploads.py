@@ -3,10 +3,12 @@ from uuid import UUID
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.api.deps import get_current_user
-from app.db.database import get_db
+from app.api.pagination import decode_cursor, page
+from app.db.database import get_db, get_read_db
 from app.core import success, StandardResponse, PLANS, settings
 from app.services import upload_file_obj, get_file_url, delete_file
-from app.repositories import usage as usage_repo
+from app.services.quota import check_upload_quota
+from app.repositories.unit_of_work import UnitOfWork
 from app.repositories import upload as upload_repo
 from app.schemas import UploadRead
 
@@ -23,10 +25,7 @@ def upload_file(
     db: Session = Depends(get_db),
 ):
     plan = PLANS.get(current_user.plan, PLANS["free"])
-    daily = usage_repo.get_daily_usage(db, current_user.user_id, date.today())
-    uploads = daily.file_uploads if daily and daily.file_uploads is not None else 0
-    if uploads >= plan.get("max_file_uploads", 0):
-        raise HTTPException(status_code=403, detail="Upgrade required")
+    check_upload_quota(db, current_user.user_id, plan)
 
     data = file.file.read()
     size = len(data)
@@ -45,7 +44,9 @@ def upload_file(
         size,
     )
     url = get_file_url(key)
-    usage_repo.increment_file_uploads(db, current_user.user_id, date.today())
+    uow = UnitOfWork(db)
+    uow.add_usage(current_user.user_id, date.today(), file_uploads=1)
+    uow.commit()
     payload = {"url": url, "upload_id": record.upload_id}
     return success(payload).dict()
 
@@ -53,16 +54,20 @@ def upload_file(
 @router.get("", response_model=StandardResponse, summary="List uploads")
 def list_uploads(
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: str | None = None,
 ) -> list[UploadRead]:
-    uploads = upload_repo.list_uploads(db, current_user.user_id, skip=skip, limit=limit)
+    uploads = upload_repo.list_uploads(
+        db, current_user.user_id, skip=skip, limit=limit + 1, after=decode_cursor(cursor)
+    )
+    uploads, next_cursor = page(uploads, limit, lambda u: (u.created_at, u.upload_id))
     payload = [
         UploadRead.model_validate(u).model_copy(update={"url": get_file_url(u.key)})
         for u in uploads
     ]
-    return success(payload).dict()
+    return success(payload, next_cursor=next_cursor).dict()
 
 
 @router.delete("/{upload_id}", response_model=StandardResponse, summary="Delete upload")
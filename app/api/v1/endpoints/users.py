@@ -6,11 +6,13 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.repositories import user as user_repo
 from app.schemas import UserCreate, UserRead, UserUpdate
 from app.core import success, StandardResponse
 from app.api.deps import get_current_user
+from app.api.pagination import decode_cursor, no_cursor, page
+from app.services.search import search_users
 
 router = APIRouter(prefix="/users", tags=["users"])
 logger = logging.getLogger(__name__)
@@ -47,14 +49,20 @@ def list_users(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = Query(None),
+    cursor: Optional[str] = None,
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ) -> List[UserRead]:
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Forbidden")
-    users = user_repo.list_users(db, skip=skip, limit=limit, search=search)
+    if search:
+        no_cursor(cursor)
+        users, next_cursor = search_users(db, search, skip=skip, limit=limit), None
+    else:
+        users = user_repo.list_users(db, skip=skip, limit=limit + 1, after=decode_cursor(cursor))
+        users, next_cursor = page(users, limit, lambda u: (u.created_at, u.user_id))
     payload = [UserRead.model_validate(u) for u in users]
-    return success(payload).dict()
+    return success(payload, next_cursor=next_cursor).dict()
 
 
 @router.put("/{user_id}", response_model=StandardResponse, summary="Update user")
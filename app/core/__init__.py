@@ -3,6 +3,7 @@
 from .config import settings
 from .responses import StandardResponse, success
 from .plans import PLANS
+from .tokens import content_text, estimate_tokens
 from .security import (
     hash_password,
     verify_password,
@@ -19,6 +20,8 @@ __all__ = [
     "StandardResponse",
     "success",
     "PLANS",
+    "content_text",
+    "estimate_tokens",
     "hash_password",
     "verify_password",
     "create_access_token",
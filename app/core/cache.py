@@ -0,0 +1,248 @@
+"""Small cache primitives shared by the services."""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.security import _get_redis_client
+
+# minimum lifetime (seconds) of a Redis key version
+VERSION_TTL = 3600
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with an optional TTL per entry.
+
+    Keys also carry a version for compare-and-set writers: ``bump`` drops a
+    key and advances its version, ``set_if_version`` stores only if the
+    version is still the one read. Versions of the ``maxsize`` most recently
+    bumped keys are kept; older ones read as the newest version evicted, so a
+    forgotten version can only make a pending ``set_if_version`` fail.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, tuple[Any, Optional[float]]]" = OrderedDict()
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._stamp = 0
+        self._version_floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is not None:
+            value, expires_at = item
+            if expires_at is None or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._set(key, value)
+
+    async def aget(self, key: str) -> Any:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        self.set(key, value)
+
+    def _set(self, key: str, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get_versioned(self, key: str) -> Tuple[Any, int]:
+        """Return the value of ``key`` (or ``None``) and its version."""
+        with self._lock:
+            return self._get(key), self._versions.get(key, self._version_floor)
+
+    def set_if_version(self, key: str, value: Any, version: int) -> bool:
+        """Store ``value`` and advance the version if it is still ``version``."""
+        with self._lock:
+            if self._versions.get(key, self._version_floor) != version:
+                return False
+            self._bump(key)
+            self._set(key, value)
+            return True
+
+    def bump(self, key: str) -> None:
+        """Drop ``key`` so pending ``set_if_version`` calls on it fail."""
+        with self._lock:
+            self._data.pop(key, None)
+            self._bump(key)
+
+    def _bump(self, key: str) -> None:
+        self._stamp += 1
+        self._versions[key] = self._stamp
+        self._versions.move_to_end(key)
+        while len(self._versions) > self.maxsize:
+            _, stamp = self._versions.popitem(last=False)
+            self._version_floor = max(self._version_floor, stamp)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current size."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+class RedisCache:
+    """JSON values in Redis under ``prefix`` with a TTL.
+
+    Falls back to an in-process :class:`LRUCache` whenever Redis is not
+    reachable, mirroring how token revocation degrades in ``security``.
+    """
+
+    def __init__(self, prefix: str, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.fallback = LRUCache(maxsize, ttl)
+
+    def get(self, key: str) -> Any:
+        client = _get_redis_client()
+        if client:
+            try:
+                raw = client.get(f"{self.prefix}:{key}")
+            except Exception:
+                pass
+            else:
+                if raw is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+                return json.loads(raw)
+        return self.fallback.get(key)
+
+    def set(self, key: str, value: Any) -> None:
+        client = _get_redis_client()
+        if client:
+            try:
+                if self.ttl:
+                    client.setex(f"{self.prefix}:{key}", int(self.ttl), json.dumps(value))
+                else:
+                    client.set(f"{self.prefix}:{key}", json.dumps(value))
+                return
+            except Exception:
+                pass
+        self.fallback.set(key, value)
+
+    # the client is synchronous, so async callers reach Redis off the event loop
+
+    async def aget(self, key: str) -> Any:
+        return await run_in_threadpool(self.get, key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        await run_in_threadpool(self.set, key, value)
+
+    def delete(self, key: str) -> None:
+        client = _get_redis_client()
+        if client:
+            try:
+                client.delete(f"{self.prefix}:{key}")
+            except Exception:
+                pass
+        self.fallback.delete(key)
+
+    # Versions live under ``<prefix>:v:<key>`` and outlive the value so a
+    # writer's bump is still seen by fills that started before it.
+
+    def _version_ttl(self) -> int:
+        return max(int(self.ttl or 0), VERSION_TTL)
+
+    def get_versioned(self, key: str) -> Tuple[Any, int]:
+        client = _get_redis_client()
+        if client:
+            try:
+                raw, version = client.mget(f"{self.prefix}:{key}", f"{self.prefix}:v:{key}")
+            except Exception:
+                pass
+            else:
+                if raw is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                return (json.loads(raw) if raw is not None else None), int(version or 0)
+        return self.fallback.get_versioned(key)
+
+    def set_if_version(self, key: str, value: Any, version: int) -> bool:
+        client = _get_redis_client()
+        if client:
+            value_key, version_key = f"{self.prefix}:{key}", f"{self.prefix}:v:{key}"
+
+            def swap(pipe: Any) -> bool:
+                if int(pipe.get(version_key) or 0) != version:
+                    return False
+                pipe.multi()
+                pipe.incr(version_key)
+                pipe.expire(version_key, self._version_ttl())
+                if self.ttl:
+                    pipe.setex(value_key, int(self.ttl), json.dumps(value))
+                else:
+                    pipe.set(value_key, json.dumps(value))
+                return True
+
+            try:
+                # WATCH/MULTI: a concurrent bump aborts and re-runs the check
+                return client.transaction(swap, version_key, value_from_callable=True)
+            except Exception:
+                pass
+        return self.fallback.set_if_version(key, value, version)
+
+    def bump(self, key: str) -> None:
+        client = _get_redis_client()
+        if client:
+            try:
+                pipe = client.pipeline(transaction=True)
+                pipe.delete(f"{self.prefix}:{key}")
+                pipe.incr(f"{self.prefix}:v:{key}")
+                pipe.expire(f"{self.prefix}:v:{key}", self._version_ttl())
+                pipe.execute()
+            except Exception:
+                pass
+        self.fallback.bump(key)
+
+    def clear(self) -> None:
+        self.fallback.clear()
+
+    def stats(self) -> dict:
+        fallback = self.fallback.stats()
+        return {
+            "hits": self.hits + fallback["hits"],
+            "misses": self.misses + fallback["misses"],
+            "size": fallback["size"],
+        }
+
+
+def make_cache(backend: str, prefix: str, maxsize: int, ttl: Optional[float]):
+    """Return the cache implementation selected by ``backend``."""
+    if backend == "redis":
+        return RedisCache(prefix, maxsize, ttl)
+    return LRUCache(maxsize, ttl)
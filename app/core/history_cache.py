@@ -0,0 +1,139 @@
+"""Per-conversation cache of ready-to-send prompt history.
+
+Entries hold the newest prompt-eligible messages of a conversation as chat
+completion dicts, so hot conversations build their prompt without touching
+the database. The message repository keeps entries current on every write.
+
+The ``memory`` backend is per process; deployments running several workers
+should use ``redis`` so every worker sees the same appends. Writes are
+conditional on a per-conversation version (WATCH/MULTI on Redis), so
+concurrent writers never overwrite each other's changes.
+"""
+
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from app.core.cache import make_cache
+from app.core.config import settings
+from app.core.tokens import content_text, estimate_tokens
+
+ROLES = {"user": "user", "ai": "assistant"}
+
+
+def prompt_entry(msg: Any) -> Optional[Dict[str, Any]]:
+    """Return the cached prompt form of ``msg`` or ``None`` if it is not sent."""
+    role = ROLES.get(msg.message_type)
+    text = content_text(msg.content)
+    if role is None or text is None:
+        return None
+    tokens = msg.token_count if msg.token_count is not None else estimate_tokens(text)
+    return {"id": str(msg.message_id), "role": role, "content": text, "tokens": tokens}
+
+
+class HistoryCache:
+    """Newest-first suffix of each conversation's prompt history.
+
+    ``complete`` records whether the cached messages reach back to the start
+    of the conversation; when it is false a caller needing more history than
+    is cached must fall back to the database.
+
+    Every write goes through a version compare-and-set. A fill from the
+    database passes the version read before its query, so a message written
+    meanwhile makes the fill a no-op instead of caching a stale snapshot;
+    an edit that loses a race with another worker drops the entry.
+    """
+
+    def __init__(self, backend: str, maxsize: int, ttl: float, max_messages: int) -> None:
+        self.enabled = backend != "off"
+        self.max_messages = max_messages
+        self._store = make_cache(backend, "history", maxsize, ttl)
+
+    def get(self, conversation_id: UUID) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        return self._store.get(str(conversation_id))
+
+    def version(self, conversation_id: UUID) -> int:
+        """Return the version to pass to :meth:`put` after reading the database."""
+        if not self.enabled:
+            return 0
+        return self._store.get_versioned(str(conversation_id))[1]
+
+    def put(
+        self,
+        conversation_id: UUID,
+        messages: List[Dict[str, Any]],
+        complete: bool,
+        version: Optional[int] = None,
+    ) -> bool:
+        """Store ``messages`` (oldest first) unless the entry changed since ``version``."""
+        if not self.enabled:
+            return False
+        if version is None:
+            version = self.version(conversation_id)
+        if len(messages) > self.max_messages:
+            messages = messages[-self.max_messages:]
+            complete = False
+        entry = {"complete": complete, "messages": messages}
+        return self._store.set_if_version(str(conversation_id), entry, version)
+
+    def append(self, msg: Any) -> None:
+        """Add a newly created message to an existing entry."""
+        entry = prompt_entry(msg)
+        if entry is None:
+            return
+        self._edit(msg.conversation_id, lambda messages: messages + [entry])
+
+    def update(self, msg: Any) -> None:
+        """Replace an edited message, dropping the entry if its position is unknown."""
+        entry = prompt_entry(msg)
+        key = str(msg.message_id)
+
+        def edit(messages: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+            ids = [m["id"] for m in messages]
+            if key not in ids:
+                return messages if entry is None else None
+            messages = list(messages)
+            if entry is None:
+                del messages[ids.index(key)]
+            else:
+                messages[ids.index(key)] = entry
+            return messages
+
+        self._edit(msg.conversation_id, edit)
+
+    def remove(self, msg: Any) -> None:
+        """Drop a deleted message from an existing entry."""
+        key = str(msg.message_id)
+        self._edit(msg.conversation_id, lambda messages: [m for m in messages if m["id"] != key])
+
+    def _edit(self, conversation_id: UUID, edit) -> None:
+        # With no entry the write is still a change: bumping the version
+        # voids any fill whose database read started before it.
+        if not self.enabled:
+            return
+        cached, version = self._store.get_versioned(str(conversation_id))
+        if cached is None:
+            self.invalidate(conversation_id)
+            return
+        messages = edit(cached["messages"])
+        if messages is None:
+            self.invalidate(conversation_id)
+        elif messages != cached["messages"]:
+            if not self.put(conversation_id, messages, cached["complete"], version):
+                self.invalidate(conversation_id)
+
+    def invalidate(self, conversation_id: UUID) -> None:
+        if self.enabled:
+            self._store.bump(str(conversation_id))
+
+    def stats(self) -> dict:
+        return self._store.stats()
+
+
+history_cache = HistoryCache(
+    settings.history_cache_backend,
+    settings.history_cache_size,
+    settings.history_cache_ttl,
+    settings.history_cache_max_messages,
+)
@@ -7,6 +7,11 @@ PLANS = {
         "daily_tokens": 5000,
         "max_conversations": 3,
         "max_file_uploads": 0,
+        "context_tokens": 2000,
+        "response_cache": True,
+        # concurrent upstream LLM calls and queue priority (lower runs first)
+        "llm_concurrency": 32,
+        "priority": 1,
     },
     "pro": {
         "price": 10,
@@ -14,5 +19,9 @@ PLANS = {
         "daily_tokens": 100000,
         "max_conversations": 100,
         "max_file_uploads": 100,
+        "context_tokens": 6000,
+        "response_cache": False,
+        "llm_concurrency": 64,
+        "priority": 0,
     },
 }
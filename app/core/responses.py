@@ -8,8 +8,11 @@ class StandardResponse(BaseModel):
     code: int
     message: str
     data: Optional[Any] = None
+    next_cursor: Optional[str] = None  # set by paginated list endpoints
 
 
-def success(data: Any = None, message: str = "Success", code: int = 200) -> StandardResponse:
+def success(
+    data: Any = None, message: str = "Success", code: int = 200, next_cursor: Optional[str] = None
+) -> StandardResponse:
     """Return a standardized success response."""
-    return StandardResponse(code=code, message=message, data=data)
+    return StandardResponse(code=code, message=message, data=data, next_cursor=next_cursor)
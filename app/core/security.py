@@ -15,18 +15,22 @@ _revoked_tokens: Dict[str, float] = {}
 _refresh_tokens: Dict[str, float] = {}
 
 redis_client = None
+# while Redis is down, reconnect at most once per interval instead of per call
+REDIS_RETRY_INTERVAL = 5.0
+_redis_retry_at = 0.0
 
 
 def _get_redis_client():
     """Lazily initialize and return a Redis client if possible."""
-    global redis_client
-    if redis_client is None and getattr(settings, "redis_url", None):
+    global redis_client, _redis_retry_at
+    if redis_client is None and getattr(settings, "redis_url", None) and time.monotonic() >= _redis_retry_at:
         try:
             client = redis.from_url(settings.redis_url, decode_responses=True)
             client.ping()
             redis_client = client
         except Exception:
             redis_client = None
+            _redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
     return redis_client
 
 
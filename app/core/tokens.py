@@ -0,0 +1,24 @@
+"""Lightweight token accounting helpers for prompt budgeting."""
+
+from typing import Any, Optional
+
+# Rough average for English text with GPT tokenizers.
+CHARS_PER_TOKEN = 4
+# Per-message framing overhead added by the chat completions format.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def content_text(content: Any) -> Optional[str]:
+    """Return the prompt text stored in a message ``content`` payload."""
+    if isinstance(content, dict):
+        return content.get("text")
+    if content is None:
+        return None
+    return str(content)
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Estimate how many tokens ``text`` costs as a single chat message."""
+    if not text:
+        return MESSAGE_OVERHEAD_TOKENS
+    return MESSAGE_OVERHEAD_TOKENS + (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
@@ -1,15 +1,66 @@
 """Database utilities."""
 
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
+from fastapi import Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.sql import functions
 
 from app.core import settings
+from app.db.pool import engine_options
+from app.db.replicas import Replica, ReplicaRouter, request_caller
 
-engine = create_engine(settings.database_url)
+ASYNC_DRIVERS = {
+    "postgresql://": "postgresql+asyncpg://",
+    "postgresql+psycopg2://": "postgresql+asyncpg://",
+    "sqlite://": "sqlite+aiosqlite://",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Return ``url`` rewritten for the matching asyncio driver."""
+    for prefix, replacement in ASYNC_DRIVERS.items():
+        if url.startswith(prefix):
+            return replacement + url[len(prefix):]
+    return url
+
+
+@compiles(functions.now, "sqlite")
+def _sqlite_now(element, compiler, **kw) -> str:
+    # CURRENT_TIMESTAMP has whole seconds and a shorter text form than bound
+    # DateTime values, which breaks (timestamp, id) cursor comparisons
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+engine = create_engine(settings.database_url, **engine_options(settings.database_url))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+_async_url = settings.async_database_url or async_database_url(settings.database_url)
+async_engine = create_async_engine(_async_url, **engine_options(_async_url, is_async=True))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+
+def replica(url: str) -> Replica:
+    """Return a :class:`Replica` with pools configured like the primary's."""
+    async_url = async_database_url(url)
+    return Replica(
+        create_engine(url, **engine_options(url)),
+        create_async_engine(async_url, **engine_options(async_url, is_async=True)),
+    )
+
+
+replica_router = ReplicaRouter(
+    [replica(url) for url in settings.db_replica_urls],
+    max_lag=settings.db_replica_max_lag,
+    check_interval=settings.db_replica_check_interval,
+    sticky_seconds=settings.db_read_your_writes,
+)
+
 Base = declarative_base()
 
 
@@ -20,3 +71,40 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Provide an asyncio session for endpoints that run on the event loop."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_read_db(request: Request, db: Session = Depends(get_db)) -> Generator:
+    """Provide a session for read-only endpoints, on a replica when one is usable.
+
+    Falls back to the primary session ``db`` (opened lazily, so unused when a
+    replica serves the read); see :mod:`app.db.replicas`.
+    """
+    picked = replica_router.pick(request_caller(request.headers))
+    if picked is None:
+        yield db
+        return
+    replica_db = picked.sessions()
+    try:
+        yield replica_db
+    finally:
+        replica_db.close()
+
+
+async def get_async_read_db(
+    request: Request, db: AsyncSession = Depends(get_async_db)
+) -> AsyncGenerator[AsyncSession, None]:
+    """Asyncio twin of :func:`get_read_db`."""
+    caller = request_caller(request.headers)
+    # with replicas configured the read-your-writes check may call Redis
+    picked = await run_in_threadpool(replica_router.pick, caller) if replica_router.replicas else None
+    if picked is None:
+        yield db
+        return
+    async with picked.async_sessions() as replica_db:
+        yield replica_db
@@ -0,0 +1,161 @@
+"""Monthly partitions of the ``messages`` table.
+
+On PostgreSQL ``messages`` is range-partitioned on ``timestamp`` with one
+partition per calendar month (``messages_y2026m10``) and ``messages_default``
+for anything outside them. A month's partition has to exist before the month
+starts: rows that land in the default partition block creating it later.
+:func:`ensure_message_partitions` creates the current month and the next
+``MESSAGE_PARTITION_MONTHS_AHEAD`` months. It runs when the tables are
+created, and at startup and every few hours in each worker unless
+``MESSAGE_PARTITION_MAINTENANCE=false``. In that case run it from cron::
+
+    python -m app.db.partitions
+
+and each worker only checks at startup that next month's partition exists.
+
+Repository queries scoped to a conversation bound ``timestamp`` from below
+(see :func:`app.repositories.message.in_conversation`) so older partitions
+are pruned.
+"""
+
+import logging
+import threading
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.core import settings
+from app.db.database import engine
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 6 * 3600  # seconds
+
+EXISTING_PARTITIONS = text(
+    """
+    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'messages'::regclass
+    """
+)
+
+
+def add_months(month: date, months: int) -> date:
+    """Return the first day of the month ``months`` after ``month``'s."""
+    years, index = divmod(month.month - 1 + months, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"messages_y{month.year}m{month.month:02d}"
+
+
+def ensure_message_partitions(
+    connection: Connection, today: Optional[date] = None, months_ahead: Optional[int] = None
+) -> List[str]:
+    """Create missing monthly ``messages`` partitions and return their names.
+
+    Does nothing on databases other than PostgreSQL.
+    """
+    if connection.dialect.name != "postgresql":
+        return []
+    if months_ahead is None:
+        months_ahead = settings.message_partition_months_ahead
+    existing = set(connection.execute(EXISTING_PARTITIONS).scalars())
+    current = (today or date.today()).replace(day=1)
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        # IF NOT EXISTS: several workers may race to create the same month
+        connection.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF messages "
+                f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+            )
+        )
+        created.append(name)
+    if "messages_default" not in existing:
+        connection.execute(text("CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT"))
+    return created
+
+
+def maintenance_enabled(bind: Engine) -> bool:
+    """Whether workers maintain partitions: the setting, else only on PostgreSQL."""
+    if settings.message_partition_maintenance is None:
+        return bind.dialect.name == "postgresql"
+    return settings.message_partition_maintenance
+
+
+def create_message_partitions(target, connection: Connection, **kw) -> None:
+    """``after_create`` hook of the ``messages`` table."""
+    ensure_message_partitions(connection)
+
+
+class PartitionMaintainer:
+    """Keep future ``messages`` partitions created from a background thread."""
+
+    def __init__(self, engine: Engine, interval: float = CHECK_INTERVAL) -> None:
+        self.engine = engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> List[str]:
+        with self.engine.begin() as connection:
+            created = ensure_message_partitions(connection)
+        if created:
+            logger.info("Created message partitions %s", ", ".join(created))
+        return created
+
+    def check(self, today: Optional[date] = None) -> bool:
+        """Log an error unless next month's partition exists; ``True`` if it does."""
+        with self.engine.connect() as connection:
+            if connection.dialect.name != "postgresql":
+                return True
+            existing = set(connection.execute(EXISTING_PARTITIONS).scalars())
+        name = partition_name(add_months((today or date.today()).replace(day=1), 1))
+        if name in existing:
+            return True
+        logger.error(
+            "Message partition %s is missing; run python -m app.db.partitions "
+            "or set MESSAGE_PARTITION_MAINTENANCE=true",
+            name,
+        )
+        return False
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="message-partitions", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Creating message partitions failed")
+            if self._stop.wait(self.interval):
+                return
+
+
+partition_maintainer = PartitionMaintainer(engine)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    created = partition_maintainer.run_once()
+    print(f"Created {len(created)} message partitions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Connection pool configuration and metrics.
+
+Engines for server databases use :class:`MeteredQueuePool` (or its asyncio
+twin) sized from the ``DB_POOL_*`` settings. Every checkout is timed, from
+asking the pool for a connection until one is handed out, so waits caused by
+an exhausted pool show up in :func:`pool_stats` before they turn into
+``QueuePool limit`` timeouts.
+
+With ``DB_PGBOUNCER=true`` the engines are set up for pgbouncer in
+transaction pooling mode, where consecutive transactions may run on different
+server connections: drivers that cache server-side prepared statements
+(asyncpg, psycopg 3) have that cache switched off. psycopg2 never prepares
+statements and needs no change.
+"""
+
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core import settings
+
+WAIT_SAMPLES = 1000
+
+
+class MeteredPool:
+    """Mixin recording checkout wait times and timeouts of a queue pool."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.checkouts = 0
+        self.timeouts = 0
+        self._metrics_lock = threading.Lock()
+
+    def connect(self) -> Any:
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeout:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        with self._metrics_lock:
+            self.checkouts += 1
+            self.waits.append(time.perf_counter() - started)
+        return connection
+
+    def recreate(self) -> "MeteredPool":
+        pool = super().recreate()
+        pool.waits, pool.checkouts, pool.timeouts = self.waits, self.checkouts, self.timeouts
+        return pool
+
+
+class MeteredQueuePool(MeteredPool, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(MeteredPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def _percentile(samples: list, pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+def _pgbouncer_connect_args(url: str) -> Dict[str, Any]:
+    if url.startswith("postgresql+asyncpg://"):
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            # names must not clash with statements left on a shared server connection
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    if url.startswith("postgresql+psycopg://"):
+        return {"prepare_threshold": None}
+    return {}
+
+
+def engine_options(url: str, is_async: bool = False) -> Dict[str, Any]:
+    """Return pool keyword arguments for ``create_engine`` on ``url``.
+
+    SQLite keeps SQLAlchemy's own pool choice; its connections are local and
+    the in-memory variant cannot use a queue pool at all.
+    """
+    if url.startswith("sqlite"):
+        return {}
+    options: Dict[str, Any] = {
+        "poolclass": MeteredAsyncQueuePool if is_async else MeteredQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if settings.db_pgbouncer:
+        connect_args = _pgbouncer_connect_args(url)
+        if connect_args:
+            options["connect_args"] = connect_args
+    return options
+
+
+def pool_stats(engine: Engine) -> Dict[str, Any]:
+    """Return occupancy and checkout wait statistics for ``engine``'s pool."""
+    pool = engine.pool
+    stats: Dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    if isinstance(pool, MeteredPool):
+        with pool._metrics_lock:
+            waits = list(pool.waits)
+            stats.update(checkouts=pool.checkouts, timeouts=pool.timeouts)
+        stats.update(
+            wait_p50=_percentile(waits, 0.5),
+            wait_p95=_percentile(waits, 0.95),
+            wait_max=max(waits) if waits else None,
+        )
+    return stats
@@ -0,0 +1,235 @@
+"""Read-replica routing for read-only endpoints.
+
+Endpoints that only read take their session from ``get_read_db`` or
+``get_async_read_db`` in :mod:`app.db.database`. :class:`ReplicaRouter` hands
+those out round-robin over the replicas in ``DB_REPLICA_URLS`` that passed
+their last health check and are at most ``DB_REPLICA_MAX_LAG`` seconds behind
+the primary. When none qualifies, reads go to the primary.
+
+A background thread re-checks every replica each ``DB_REPLICA_CHECK_INTERVAL``
+seconds. After a caller's successful write their reads stay on the primary
+for ``DB_READ_YOUR_WRITES`` seconds so they see their own changes. Middleware
+in :mod:`app.main` records writes as the response starts; work committed
+after that (streamed chat turns, background replies) calls
+:meth:`ReplicaRouter.mark_write` itself once it commits. That window is kept in Redis when it
+is reachable, so it holds across workers, and in process memory otherwise.
+"""
+
+import itertools
+import logging
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+import jwt
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import settings
+from app.core.security import _get_redis_client
+from app.db.pool import pool_stats
+
+logger = logging.getLogger(__name__)
+
+# Seconds since the last replayed transaction, or 0 when everything received
+# has been replayed (an idle primary writes nothing, so the timestamp ages).
+LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+# drop expired in-memory write windows once this many have piled up
+STICKY_PRUNE_SIZE = 10_000
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class Replica:
+    """Engines and session factories of one read replica."""
+
+    def __init__(self, engine: Engine, async_engine: AsyncEngine) -> None:
+        self.name = engine.url.render_as_string(hide_password=True)
+        self.engine = engine
+        self.async_engine = async_engine
+        self.sessions = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.async_sessions = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        # unusable until the first health check passes
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.reads = 0
+
+
+def request_caller(headers: Mapping[str, str]) -> Optional[str]:
+    """Return the user id a request acts as, without validating it.
+
+    Only used to key read-your-writes windows; authentication still happens
+    in the endpoint dependencies.
+    """
+    authorization = headers.get("Authorization")
+    if authorization:
+        try:
+            data = jwt.decode(
+                authorization.replace("Bearer ", ""), settings.secret_key, algorithms=[settings.jwt_algorithm]
+            )
+        except jwt.PyJWTError:
+            return None
+        return data.get("sub")
+    return headers.get("X-User-ID")
+
+
+class ReplicaRouter:
+    """Pick a healthy, caught-up replica for each read, or ``None`` for the primary."""
+
+    def __init__(
+        self,
+        replicas: Sequence[Replica],
+        max_lag: float,
+        check_interval: float,
+        sticky_seconds: float,
+        client_factory: Callable[[], Any] = _get_redis_client,
+    ) -> None:
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.client_factory = client_factory
+        self.primary_reads = 0
+        self._cycle = itertools.count()
+        self._sticky: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def usable(self) -> List[Replica]:
+        return [r for r in self.replicas if r.healthy and r.lag is not None and r.lag <= self.max_lag]
+
+    def pick(self, caller: Optional[str] = None) -> Optional[Replica]:
+        """Return the replica for the next read, ``None`` to read from the primary."""
+        usable = self.usable() if self.replicas else []
+        if not usable or (caller and self.is_sticky(caller)):
+            self.primary_reads += 1
+            return None
+        replica = usable[next(self._cycle) % len(usable)]
+        replica.reads += 1
+        return replica
+
+    def mark_write(self, caller: str) -> None:
+        """Keep ``caller``'s reads on the primary for ``sticky_seconds``."""
+        if not self.replicas or self.sticky_seconds <= 0:
+            return
+        client = self.client_factory()
+        if client:
+            try:
+                client.psetex(f"db:sticky:{caller}", math.ceil(self.sticky_seconds * 1000), "1")
+                return
+            except Exception:
+                # fall back to in-memory store
+                pass
+        now = time.monotonic()
+        if len(self._sticky) >= STICKY_PRUNE_SIZE:
+            self._sticky = {key: until for key, until in self._sticky.items() if until > now}
+        self._sticky[caller] = now + self.sticky_seconds
+
+    def is_sticky(self, caller: str) -> bool:
+        client = self.client_factory()
+        if client:
+            try:
+                return client.exists(f"db:sticky:{caller}") == 1
+            except Exception:
+                pass
+        until = self._sticky.get(caller)
+        if until is None:
+            return False
+        if until > time.monotonic():
+            return True
+        self._sticky.pop(caller, None)
+        return False
+
+    def _lag(self, connection: Connection) -> float:
+        if connection.dialect.name != "postgresql":
+            return 0.0
+        return float(connection.execute(LAG_QUERY).scalar() or 0)
+
+    def check(self) -> None:
+        """Probe every replica and record whether it is reachable and its lag."""
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as connection:
+                    replica.lag = self._lag(connection)
+            except SQLAlchemyError:
+                if replica.healthy or replica.lag is None:
+                    logger.warning("Replica %s failed its health check", replica.name, exc_info=True)
+                replica.healthy = False
+                continue
+            replica.healthy = True
+            if replica.lag > self.max_lag:
+                logger.warning("Replica %s lags %.1fs behind the primary", replica.name, replica.lag)
+
+    def start(self) -> None:
+        self.check()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-health", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Replica health check failed")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "primary_reads": self.primary_reads,
+            "replicas": [
+                {
+                    "name": r.name,
+                    "healthy": r.healthy,
+                    "lag": r.lag,
+                    "reads": r.reads,
+                    "pool": pool_stats(r.engine),
+                }
+                for r in self.replicas
+            ],
+        }
+
+
+class ReadYourWritesMiddleware:
+    """Start a caller's primary-read window when a write request succeeds.
+
+    Plain ASGI rather than ``BaseHTTPMiddleware`` so streamed responses pass
+    through untouched; the window opens as the response starts.
+    """
+
+    def __init__(self, app: ASGIApp, router: ReplicaRouter) -> None:
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in READ_METHODS or not self.router.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marking(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                caller = request_caller(Headers(scope=scope))
+                if caller:
+                    await run_in_threadpool(self.router.mark_write, caller)
+            await send(message)
+
+        await self.app(scope, receive, send_marking)
@@ -0,0 +1,187 @@
+"""Deterministic OpenAI-compatible stand-in for load and latency testing.
+
+Serves ``POST /v1/chat/completions`` (streaming and non-streaming, with
+usage) without any network access. Answers are derived from a hash of the
+request messages and the seed, so the same prompt always gets the same reply.
+Timing and failures are controlled by the ``FAKE_LLM_*`` settings:
+
+* ``FAKE_LLM_TTFT`` - seconds before the first token
+* ``FAKE_LLM_TOKENS_PER_SEC`` - generation speed after the first token
+* ``FAKE_LLM_RESPONSE_TOKENS`` - reply length (capped by ``max_tokens``)
+* ``FAKE_LLM_ERROR_RATE`` - fraction of requests answered with HTTP 500
+
+Run it next to the API and set ``LLM_BACKEND=fake`` there::
+
+    python -m app.fake_llm --port 8001
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import Any, AsyncGenerator, Dict, List
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app.core import settings
+from app.core.tokens import content_text, estimate_tokens
+
+WORDS = (
+    "sure", "here", "is", "a", "quick", "answer", "about", "that", "and",
+    "the", "idea", "you", "asked", "for", "with", "some", "detail", "so",
+    "it", "works", "well", "in", "practice", "today",
+)
+
+
+class FakeLLM:
+    """Chat completions endpoint with configurable latency and error rate."""
+
+    def __init__(
+        self,
+        ttft: float = 0.5,
+        tokens_per_sec: float = 50.0,
+        response_tokens: int = 64,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.seed = seed
+        self._failures = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.active = 0
+        self.peak = 0
+        self.app = Starlette(
+            routes=[
+                Route("/v1/chat/completions", self.completions, methods=["POST"]),
+                Route("/v1/stats", self.stats, methods=["GET"]),
+            ]
+        )
+
+    @classmethod
+    def from_settings(cls) -> "FakeLLM":
+        return cls(
+            ttft=settings.fake_llm_ttft,
+            tokens_per_sec=settings.fake_llm_tokens_per_sec,
+            response_tokens=settings.fake_llm_response_tokens,
+            error_rate=settings.fake_llm_error_rate,
+            seed=settings.fake_llm_seed,
+        )
+
+    def reset(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.active = 0
+        self.peak = 0
+
+    def reply(self, messages: List[Dict[str, Any]], limit: int) -> List[str]:
+        """Return the deterministic reply tokens for ``messages``."""
+        payload = json.dumps({"seed": self.seed, "messages": messages}, sort_keys=True)
+        digest = hashlib.sha256(payload.encode()).digest()
+        rng = random.Random(digest)
+        return [rng.choice(WORDS) + " " for _ in range(limit)]
+
+    async def stats(self, request: Request) -> JSONResponse:
+        return JSONResponse(
+            {"requests": self.requests, "errors": self.errors, "active": self.active, "peak": self.peak}
+        )
+
+    async def completions(self, request: Request) -> Response:
+        body = await request.json()
+        self.requests += 1
+        if self.error_rate and self._failures.random() < self.error_rate:
+            self.errors += 1
+            return JSONResponse(
+                {"error": {"message": "Injected failure", "type": "server_error", "code": None}},
+                status_code=500,
+            )
+        messages = body.get("messages", [])
+        model = body.get("model", "fake")
+        limit = min(self.response_tokens, body.get("max_tokens") or self.response_tokens)
+        tokens = self.reply(messages, limit)
+        prompt_tokens = sum(estimate_tokens(content_text(m.get("content"))) for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            return StreamingResponse(
+                self._events(model, tokens, usage if include_usage else None),
+                media_type="text/event-stream",
+            )
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.ttft + max(len(tokens) - 1, 0) / self.tokens_per_sec)
+        finally:
+            self.active -= 1
+        return JSONResponse(
+            {
+                "id": "fake-completion",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    async def _events(
+        self, model: str, tokens: List[str], usage: Dict[str, int] | None
+    ) -> AsyncGenerator[str, None]:
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.ttft)
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(1 / self.tokens_per_sec)
+                yield _chunk(model, [{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+            yield _chunk(model, [{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if usage is not None:
+                yield _chunk(model, [], usage)
+            yield "data: [DONE]\n\n"
+        finally:
+            self.active -= 1
+
+
+def _chunk(model: str, choices: List[Dict[str, Any]], usage: Dict[str, int] | None = None) -> str:
+    data = {
+        "id": "fake-completion",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": choices,
+        "usage": usage,
+    }
+    return f"data: {json.dumps(data)}\n\n"
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+    uvicorn.run(FakeLLM.from_settings().app, host=args.host, port=args.port, backlog=4096)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,22 @@
 """Application entrypoint and global configuration."""
 
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 
 from app.api.v1.api import api_router
 from sqlalchemy.exc import SQLAlchemyError
-from app.core import success
+from app.core import success, settings
+from app.services.write_behind import write_behind
+from app.repositories.usage_counter import usage_counter
+from app.db.database import engine, replica_router
+from app.db.partitions import maintenance_enabled, partition_maintainer
+from app.db.replicas import ReadYourWritesMiddleware
 
 load_dotenv()
 
@@ -19,7 +26,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Flynkle API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and drain background workers with the application."""
+    if settings.stream_write_behind:
+        write_behind.start()
+    if usage_counter.buffered:
+        usage_counter.start()
+    if replica_router.replicas:
+        replica_router.start()
+    maintain_partitions = maintenance_enabled(engine)
+    if maintain_partitions:
+        partition_maintainer.start()
+    elif engine.dialect.name == "postgresql":
+        # maintained by cron: only complain if it has fallen behind
+        try:
+            await run_in_threadpool(partition_maintainer.check)
+        except Exception:
+            logger.exception("Checking message partitions failed")
+    yield
+    if settings.stream_write_behind:
+        write_behind.stop()
+    if usage_counter.buffered:
+        usage_counter.stop()
+    if replica_router.replicas:
+        replica_router.stop()
+    if maintain_partitions:
+        partition_maintainer.stop()
+
+
+app = FastAPI(title="Flynkle API", version="0.1.0", lifespan=lifespan)
 
 
 @app.exception_handler(SQLAlchemyError)
@@ -39,7 +76,7 @@ async def handle_http_exceptions(request: Request, exc: HTTPException):
         message = exc.detail.get("message", "Error")
         data = exc.detail.get("data")
     resp = success(message=message, data=data, code=exc.status_code)
-    return JSONResponse(status_code=exc.status_code, content=resp.dict())
+    return JSONResponse(status_code=exc.status_code, content=resp.dict(), headers=exc.headers)
 
 
 @app.exception_handler(Exception)
@@ -58,6 +95,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ReadYourWritesMiddleware, router=replica_router)
+
 app.include_router(api_router, prefix="/api/v1")
 
 
@@ -1,18 +1,30 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index, Integer, JSON, event
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 
 from app.db.database import Base
+from app.db.partitions import create_message_partitions
 
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_conversation_id_timestamp_message_id", "conversation_id", "timestamp", "message_id"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
-    message_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    message_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, insert_sentinel=True)
     conversation_id = Column(UUID(as_uuid=True), ForeignKey("conversations.conversation_id"), nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=True)
     content = Column(JSON, nullable=False)
-    timestamp = Column(DateTime, server_default=func.now())
+    # part of the key because messages are range-partitioned on it in PostgreSQL
+    timestamp = Column(DateTime, primary_key=True, server_default=func.now())
     message_type = Column(String, nullable=False)
     extra = Column("metadata", JSON, nullable=True)
+    token_count = Column(Integer, nullable=True)
+    # PostgreSQL also has a generated, GIN-indexed ``search_vector`` column;
+    # it is left unmapped and queried by app.repositories.message.
+
+
+event.listen(Message.__table__, "after_create", create_message_partitions)
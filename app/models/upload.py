@@ -1,11 +1,14 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from app.db.database import Base
 
 class Upload(Base):
     __tablename__ = "uploads"
+    __table_args__ = (
+        Index("ix_uploads_user_id_created_at_upload_id", "user_id", "created_at", "upload_id"),
+    )
 
     upload_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, Date, DateTime, Integer, ForeignKey
+from sqlalchemy import Column, Date, DateTime, Integer, ForeignKey, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 
@@ -8,6 +8,7 @@ from app.db.database import Base
 
 class Usage(Base):
     __tablename__ = "usage"
+    __table_args__ = (UniqueConstraint("user_id", "date", name="uq_usage_user_id_date"),)
 
     usage_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, DateTime, JSON, func
+from sqlalchemy import Column, String, Boolean, DateTime, Index, JSON, func, text
 from sqlalchemy.dialects.postgresql import UUID
 
 from app.db.database import Base
@@ -8,6 +8,27 @@ from app.db.database import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # admin listing pages through live users newest first
+        Index(
+            "ix_users_live_created_at_user_id",
+            "created_at",
+            "user_id",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        # pg_trgm indexes for admin user lookup (app.services.search)
+        *(
+            Index(
+                f"ix_users_live_{column}_trgm",
+                column,
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+                postgresql_where=text("deleted_at IS NULL"),
+            ).ddl_if(dialect="postgresql")
+            for column in ("email", "phone_number")
+        ),
+    )
 
     user_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
 
@@ -0,0 +1,41 @@
+"""Flush Redis usage counters to the database and repair drifted totals.
+
+Used with ``USAGE_COUNTER_BACKEND=redis`` (see
+:mod:`app.repositories.usage_counter`)::
+
+    python -m app.reconcile_usage flush
+    python -m app.reconcile_usage reconcile --day 2026-10-17
+
+``reconcile`` flushes first, then resets each Redis total for the day to the
+database row plus any deltas that arrived meanwhile, and lists the users
+whose totals were wrong.
+"""
+
+import argparse
+import logging
+from datetime import date
+
+from app.db.database import SessionLocal
+from app.repositories.usage_counter import UsageCounter
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["flush", "reconcile"])
+    parser.add_argument("--day", type=date.fromisoformat, default=date.today())
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    counter = UsageCounter("redis", SessionLocal)
+    if counter.client_factory() is None:
+        parser.exit(1, "Redis is not reachable\n")
+    if args.command == "flush":
+        print(f"Flushed {counter.flush()} usage rows")
+        return
+    drift = counter.reconcile(args.day)
+    for entry in drift:
+        print(f"{entry['user_id']}: redis {entry['redis']} -> database {entry['database']}")
+    print(f"Reconciled {args.day}: {len(drift)} users corrected")
+
+
+if __name__ == "__main__":
+    main()
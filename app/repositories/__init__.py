@@ -3,5 +3,6 @@ from . import conversation
 from . import message
 from . import usage
 from . import upload
+from . import unit_of_work
 
-__all__ = ["user", "conversation", "message", "usage", "upload"]
+__all__ = ["user", "conversation", "message", "usage", "upload", "unit_of_work"]
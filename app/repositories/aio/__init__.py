@@ -0,0 +1,13 @@
+"""Asyncio versions of the repositories for endpoints using ``get_async_db``.
+
+Functions mirror the sync modules one level up, take an ``AsyncSession`` and
+must be awaited.
+"""
+
+from . import user
+from . import conversation
+from . import message
+from . import usage
+from . import upload
+
+__all__ = ["user", "conversation", "message", "usage", "upload"]
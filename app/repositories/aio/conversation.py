@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.conversation import Conversation
+from app.repositories.pagination import keyset
+
+
+async def create_conversation(db: AsyncSession, user_id: UUID, title: Optional[str] = None) -> Conversation:
+    conv = Conversation(user_id=user_id, title=title)
+    db.add(conv)
+    await db.commit()
+    await db.refresh(conv)
+    return conv
+
+
+async def get_conversation(db: AsyncSession, conversation_id: UUID) -> Optional[Conversation]:
+    return await db.get(Conversation, conversation_id)
+
+
+async def list_conversations(
+    db: AsyncSession,
+    user_id: UUID,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    after: Optional[Tuple[datetime, UUID]] = None,
+) -> List[Conversation]:
+    stmt = select(Conversation).where(Conversation.user_id == user_id)
+    stmt = keyset(stmt, [Conversation.created_at, Conversation.conversation_id], after, descending=True)
+    result = await db.scalars(stmt.offset(skip).limit(limit))
+    return list(result)
+
+
+async def count_conversations(db: AsyncSession, user_id: UUID) -> int:
+    """Return number of conversations owned by the user."""
+    return await db.scalar(
+        select(func.count()).select_from(Conversation).where(Conversation.user_id == user_id)
+    ) or 0
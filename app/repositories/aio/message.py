@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.message import Message
+from app.repositories.message import in_conversation
+from app.repositories.pagination import keyset
+
+
+async def get_message(
+    db: AsyncSession, message_id: UUID, conversation_id: Optional[UUID] = None
+) -> Optional[Message]:
+    """Asyncio twin of :func:`app.repositories.message.get_message`."""
+    stmt = select(Message).where(Message.message_id == message_id)
+    if conversation_id is not None:
+        stmt = stmt.where(*in_conversation(conversation_id))
+    return await db.scalar(stmt)
+
+
+async def list_messages(
+    db: AsyncSession,
+    conversation_id: UUID,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, UUID]] = None,
+) -> List[Message]:
+    stmt = select(Message).where(*in_conversation(conversation_id))
+    if after is not None:
+        stmt = stmt.where(Message.timestamp >= after[0])
+    stmt = keyset(stmt, [Message.timestamp, Message.message_id], after)
+    result = await db.scalars(stmt.offset(skip).limit(limit))
+    return list(result)
+
+
+async def list_recent_messages(db: AsyncSession, conversation_id: UUID, skip: int = 0, limit: int = 50) -> List[Message]:
+    """Return a page of a conversation's messages, newest first."""
+    result = await db.scalars(
+        select(Message)
+        .where(*in_conversation(conversation_id))
+        .order_by(Message.timestamp.desc(), Message.message_id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return list(result)
+
+
+async def count_messages(db: AsyncSession, conversation_id: UUID) -> int:
+    """Return message count for a conversation."""
+    return await db.scalar(
+        select(func.count(Message.message_id)).where(*in_conversation(conversation_id))
+    ) or 0
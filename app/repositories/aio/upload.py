@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.upload import Upload
+from app.repositories.pagination import keyset
+
+
+async def list_uploads(
+    db: AsyncSession,
+    user_id: UUID,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, UUID]] = None,
+) -> List[Upload]:
+    """Return uploads newest first, before the ``(created_at, upload_id)`` key if given."""
+    stmt = select(Upload).where(Upload.user_id == user_id)
+    stmt = keyset(stmt, [Upload.created_at, Upload.upload_id], after, descending=True)
+    result = await db.scalars(stmt.offset(skip).limit(limit))
+    return list(result)
+
+
+async def get_upload(db: AsyncSession, upload_id: UUID) -> Optional[Upload]:
+    return await db.get(Upload, upload_id)
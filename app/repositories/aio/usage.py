@@ -0,0 +1,22 @@
+from datetime import date
+from typing import List, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.usage import Usage
+
+
+async def get_usage(db: AsyncSession, user_id: UUID) -> List[Usage]:
+    result = await db.scalars(
+        select(Usage).where(Usage.user_id == user_id).order_by(Usage.date.desc())
+    )
+    return list(result)
+
+
+async def get_daily_usage(db: AsyncSession, user_id: UUID, day: date) -> Optional[Usage]:
+    result = await db.scalars(
+        select(Usage).where(Usage.user_id == user_id, Usage.date == day).limit(1)
+    )
+    return result.first()
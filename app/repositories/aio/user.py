@@ -0,0 +1,28 @@
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.user import User
+
+
+async def get_user(db: AsyncSession, user_id: UUID) -> Optional[User]:
+    result = await db.scalars(
+        select(User).where(User.user_id == user_id, User.deleted_at.is_(None)).limit(1)
+    )
+    return result.first()
+
+
+async def get_user_include_deleted(db: AsyncSession, user_id: UUID) -> Optional[User]:
+    """Return a user regardless of deletion state."""
+    result = await db.scalars(select(User).where(User.user_id == user_id).limit(1))
+    return result.first()
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    """Retrieve a user by email."""
+    result = await db.scalars(
+        select(User).where(User.email == email, User.deleted_at.is_(None)).limit(1)
+    )
+    return result.first()
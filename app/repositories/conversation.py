@@ -1,8 +1,10 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Tuple
 from uuid import UUID
 from sqlalchemy.orm import Session
 from app.models.conversation import Conversation
-from app.repositories.message import count_messages
+from app.core.history_cache import history_cache
+from app.repositories.pagination import keyset
 
 
 def create_conversation(db: Session, user_id: UUID, title: Optional[str] = None) -> Conversation:
@@ -17,11 +19,29 @@ def get_conversation(db: Session, conversation_id: UUID) -> Optional[Conversatio
     return db.query(Conversation).filter(Conversation.conversation_id == conversation_id).first()
 
 
-def list_conversations(db: Session, user_id: UUID, query: Optional[str] = None) -> List[Conversation]:
+def get_owned_conversation_ids(db: Session, user_id: UUID, conversation_ids: List[UUID]) -> set[UUID]:
+    """Return which of ``conversation_ids`` belong to the user, in one query."""
+    if not conversation_ids:
+        return set()
+    rows = (
+        db.query(Conversation.conversation_id)
+        .filter(Conversation.user_id == user_id, Conversation.conversation_id.in_(conversation_ids))
+        .all()
+    )
+    return {row[0] for row in rows}
+
+
+def list_conversations(
+    db: Session,
+    user_id: UUID,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    after: Optional[Tuple[datetime, UUID]] = None,
+) -> List[Conversation]:
+    """Return conversations newest first, before the ``(created_at, id)`` key if given."""
     q = db.query(Conversation).filter(Conversation.user_id == user_id)
-    if query:
-        q = q.filter(Conversation.title.ilike(f"%{query}%"))
-    return q.order_by(Conversation.created_at.desc()).all()
+    q = keyset(q, [Conversation.created_at, Conversation.conversation_id], after, descending=True)
+    return q.offset(skip).limit(limit).all()
 
 
 def count_conversations(db: Session, user_id: UUID) -> int:
@@ -42,6 +62,7 @@ def update_conversation(db: Session, conv: Conversation, title: Optional[str] =
 def delete_conversation(db: Session, conv: Conversation) -> Conversation:
     db.delete(conv)
     db.commit()
+    history_cache.invalidate(conv.conversation_id)
     return conv
 
 
@@ -49,19 +70,22 @@ def bulk_delete(db: Session, user_id: UUID, ids: List[UUID]) -> int:
     q = db.query(Conversation).filter(Conversation.user_id == user_id, Conversation.conversation_id.in_(ids))
     count = q.delete(synchronize_session=False)
     db.commit()
+    for conversation_id in ids:
+        history_cache.invalidate(conversation_id)
     return count
 
 
 def export_summaries(db: Session, user_id: UUID) -> List[dict]:
-    """Return conversation summaries with message counts."""
-    convos = list_conversations(db, user_id)
-    summaries = []
-    for conv in convos:
-        summaries.append(
-            {
-                "conversation_id": conv.conversation_id,
-                "title": conv.title,
-                "message_count": count_messages(db, conv.conversation_id),
-            }
+    """Return conversation summaries with message counts in one query."""
+    rows = (
+        db.query(
+            Conversation.conversation_id,
+            Conversation.title,
+            Conversation.message_count,
+            Conversation.last_message_at,
         )
-    return summaries
+        .filter(Conversation.user_id == user_id)
+        .order_by(Conversation.created_at.desc(), Conversation.conversation_id.desc())
+        .all()
+    )
+    return [row._asdict() for row in rows]
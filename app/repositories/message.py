@@ -1,28 +1,167 @@
-from typing import List, Optional
+import html
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, NamedTuple, Optional, Tuple
 from uuid import UUID
-from sqlalchemy.orm import Session
-from sqlalchemy import func, String, cast
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import Select, case, func, insert, literal, literal_column, select, update
 from app.models.message import Message
 from app.models.conversation import Conversation
+from app.core.tokens import content_text, estimate_tokens
+from app.core.history_cache import history_cache
+from app.repositories.pagination import keyset
 
 
-def create_message(db: Session, conversation_id: UUID, user_id: Optional[UUID], content: dict, message_type: str) -> Message:
-    msg = Message(conversation_id=conversation_id, user_id=user_id, content=content, message_type=message_type)
+def create_message(
+    db: Session,
+    conversation_id: UUID,
+    user_id: Optional[UUID],
+    content: dict,
+    message_type: str,
+    extra: Optional[dict] = None,
+) -> Message:
+    msg = Message(
+        conversation_id=conversation_id,
+        user_id=user_id,
+        content=content,
+        message_type=message_type,
+        extra=extra,
+        token_count=estimate_tokens(content_text(content)),
+    )
     db.add(msg)
-    db.commit()
+    db.flush()
     db.refresh(msg)
+    _count_new_messages(db, [msg])
+    db.commit()
+    history_cache.append(msg)
     return msg
 
 
-def get_message(db: Session, message_id: UUID) -> Optional[Message]:
-    return db.query(Message).filter(Message.message_id == message_id).first()
+def _count_new_messages(db: Session, msgs: List[Message]) -> None:
+    """Add stored ``msgs`` to their conversations' ``message_count`` and ``last_message_at``."""
+    added: dict = {}
+    for msg in msgs:
+        count, latest = added.get(msg.conversation_id, (0, msg.timestamp))
+        added[msg.conversation_id] = (count + 1, max(latest, msg.timestamp))
+    for conversation_id, (count, latest) in added.items():
+        db.execute(
+            update(Conversation)
+            .where(Conversation.conversation_id == conversation_id)
+            .values(
+                message_count=Conversation.message_count + count,
+                last_message_at=case(
+                    (Conversation.last_message_at > latest, Conversation.last_message_at),
+                    else_=latest,
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+def insert_messages(db: Session, msgs: List[Message]) -> List[Message]:
+    """Insert ``msgs`` with one multi-row ``INSERT ... RETURNING`` without committing.
+
+    The objects are not added to the session; their ``timestamp`` is filled
+    from the returned rows and their conversations' ``message_count`` and
+    ``last_message_at`` are bumped. Messages written together must keep their
+    order under ``(timestamp, message_id)`` paging, so on PostgreSQL each row
+    reads the clock separately; other databases (SQLite in tests) stamp a
+    whole statement with one time, so rows get increasing times here.
+    """
+    if not msgs:
+        return msgs
+    postgres = db.get_bind().dialect.name == "postgresql"
+    start = datetime.now(timezone.utc).replace(tzinfo=None)
+    for i, msg in enumerate(msgs):
+        if msg.message_id is None:
+            msg.message_id = uuid.uuid4()
+        if msg.token_count is None:
+            msg.token_count = estimate_tokens(content_text(msg.content))
+        if not postgres:
+            msg.timestamp = start + timedelta(microseconds=i)
+    stmt = insert(Message)
+    if postgres:
+        stmt = stmt.values(timestamp=func.clock_timestamp())
+    stmt = (
+        stmt.returning(Message.timestamp, sort_by_parameter_order=True)
+        # keep NULL columns so every row shares one multi-row statement
+        .execution_options(render_nulls=True)
+    )
+    rows = db.execute(
+        stmt,
+        [
+            {
+                "message_id": msg.message_id,
+                "conversation_id": msg.conversation_id,
+                "user_id": msg.user_id,
+                "content": msg.content,
+                "message_type": msg.message_type,
+                "extra": msg.extra,
+                "token_count": msg.token_count,
+                **({} if postgres else {"timestamp": msg.timestamp}),
+            }
+            for msg in msgs
+        ],
+    ).all()
+    for msg, row in zip(msgs, rows):
+        msg.timestamp = row.timestamp
+    _count_new_messages(db, msgs)
+    return msgs
+
+
+def in_conversation(conversation_id: UUID) -> Tuple[Any, Any]:
+    """Filter for one conversation's messages that lets PostgreSQL prune partitions.
 
+    ``messages`` is range-partitioned on ``timestamp`` and no message predates
+    its conversation, so the conversation's ``created_at`` limits the scan to
+    the partitions from then on.
+    """
+    started = (
+        select(Conversation.created_at)
+        .where(Conversation.conversation_id == conversation_id)
+        .scalar_subquery()
+    )
+    return (
+        Message.conversation_id == conversation_id,
+        Message.timestamp >= func.coalesce(started, literal(datetime.min)),
+    )
+
+
+def get_message(db: Session, message_id: UUID, conversation_id: Optional[UUID] = None) -> Optional[Message]:
+    """Return a message by id, optionally only if it is in ``conversation_id``.
+
+    The id alone is looked up in every ``messages`` partition; passing the
+    conversation limits the lookup to the partitions it can be in.
+    """
+    query = db.query(Message).filter(Message.message_id == message_id)
+    if conversation_id is not None:
+        query = query.filter(*in_conversation(conversation_id))
+    return query.first()
 
-def list_messages(db: Session, conversation_id: UUID, skip: int = 0, limit: int = 100) -> List[Message]:
+
+def list_messages(
+    db: Session,
+    conversation_id: UUID,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, UUID]] = None,
+) -> List[Message]:
+    """Return messages oldest first, after the ``(timestamp, message_id)`` key if given."""
+    query = db.query(Message).filter(*in_conversation(conversation_id))
+    if after is not None:
+        # the row comparison alone does not prune partitions
+        query = query.filter(Message.timestamp >= after[0])
+    query = keyset(query, [Message.timestamp, Message.message_id], after)
+    return query.offset(skip).limit(limit).all()
+
+
+def list_recent_messages(db: Session, conversation_id: UUID, skip: int = 0, limit: int = 50) -> List[Message]:
+    """Return a page of a conversation's messages, newest first."""
     return (
         db.query(Message)
-        .filter(Message.conversation_id == conversation_id)
-        .order_by(Message.timestamp)
+        .filter(*in_conversation(conversation_id))
+        .order_by(Message.timestamp.desc(), Message.message_id.desc())
         .offset(skip)
         .limit(limit)
         .all()
@@ -38,18 +177,36 @@ def update_message(
 ) -> Message:
     if content is not None:
         msg.content = content
+        msg.token_count = estimate_tokens(content_text(content))
     if message_type is not None:
         msg.message_type = message_type
     if extra is not None:
         msg.extra = extra
     db.commit()
     db.refresh(msg)
+    history_cache.update(msg)
     return msg
 
 
 def delete_message(db: Session, msg: Message) -> Message:
     db.delete(msg)
+    db.flush()
+    latest = (
+        select(func.max(Message.timestamp))
+        .where(*in_conversation(msg.conversation_id))
+        .scalar_subquery()
+    )
+    db.execute(
+        update(Conversation)
+        .where(Conversation.conversation_id == msg.conversation_id)
+        .values(
+            message_count=case((Conversation.message_count > 0, Conversation.message_count - 1), else_=0),
+            last_message_at=latest,
+        )
+        .execution_options(synchronize_session=False)
+    )
     db.commit()
+    history_cache.remove(msg)
     return msg
 
 
@@ -57,19 +214,103 @@ def count_messages(db: Session, conversation_id: UUID) -> int:
     """Return message count for a conversation."""
     return (
         db.query(func.count(Message.message_id))
-        .filter(Message.conversation_id == conversation_id)
+        .filter(*in_conversation(conversation_id))
         .scalar()
     ) or 0
 
 
-def search_messages(db: Session, user_id: UUID, query: str) -> List[Message]:
-    """Search a user's messages by content."""
-    pattern = f"%{query}%"
-    return (
-        db.query(Message)
-        .join(Conversation, Message.conversation_id == Conversation.conversation_id)
-        .filter(Conversation.user_id == user_id)
-        .filter(cast(Message.content, String).ilike(pattern))
-        .order_by(Message.timestamp.desc())
-        .all()
+# Text search configuration of the ``search_vector`` generated column.
+SEARCH_CONFIG = "english"
+# Exists only on PostgreSQL (see the message full-text search migration), so
+# it is not mapped on ``Message``.
+search_vector = literal_column("messages.search_vector")
+# ts_headline does not escape the text, so matches are delimited with control
+# characters that are swapped for <mark> tags after the rest is HTML-escaped.
+HEADLINE_START, HEADLINE_STOP = "\x02", "\x03"
+HEADLINE_OPTIONS = f"StartSel={HEADLINE_START}, StopSel={HEADLINE_STOP}, MaxFragments=2, MinWords=10, MaxWords=30"
+
+
+class SearchHit(NamedTuple):
+    message: Message
+    rank: Optional[float]
+    highlight: Optional[str]
+
+
+def search_messages(
+    db: Session,
+    user_id: UUID,
+    query: str,
+    conversation_id: Optional[UUID] = None,
+    message_type: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 20,
+) -> List[SearchHit]:
+    """Search the text of a user's messages, best matches first.
+
+    PostgreSQL matches ``query`` (web search syntax) against the GIN-indexed
+    ``search_vector`` and ranks with ``ts_rank_cd``. Other databases (SQLite
+    in tests) fall back to a case-insensitive substring match, newest first.
+    """
+    stmt = (
+        select(Message)
+        .join(
+            Conversation,
+            (Message.conversation_id == Conversation.conversation_id)
+            & (Message.timestamp >= Conversation.created_at),
+        )
+        .where(Conversation.user_id == user_id)
+    )
+    if conversation_id is not None:
+        stmt = stmt.where(Message.conversation_id == conversation_id)
+    if message_type is not None:
+        stmt = stmt.where(Message.message_type == message_type)
+    if db.get_bind().dialect.name == "postgresql":
+        rows = db.execute(ranked_search(stmt, query, skip, limit))
+        return [SearchHit(msg, rank, _mark_headline(headline)) for msg, rank, headline in rows]
+    text = Message.content["text"].as_string()
+    escaped = re.sub(r"([\\%_])", r"\\\1", query)
+    msgs = db.scalars(
+        stmt.where(text.ilike(f"%{escaped}%", escape="\\"))
+        .order_by(Message.timestamp.desc(), Message.message_id.desc())
+        .offset(skip)
+        .limit(limit)
+    ).all()
+    return [SearchHit(msg, None, _highlight(content_text(msg.content) or "", query)) for msg in msgs]
+
+
+def ranked_search(stmt: Select, query: str, skip: int, limit: int) -> Select:
+    """Return the PostgreSQL full-text page of ``stmt`` with rank and headline.
+
+    The page is cut in a subquery so ``ts_headline``, which re-parses the
+    text, only runs for the rows returned. The headline is raw text; pass it
+    through :func:`_mark_headline` before handing it out.
+    """
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    rank = func.ts_rank_cd(search_vector, tsquery)
+    hits = (
+        stmt.add_columns(rank.label("rank"))
+        .where(search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), Message.timestamp.desc(), Message.message_id.desc())
+        .offset(skip)
+        .limit(limit)
+        .subquery()
+    )
+    hit = aliased(Message, hits)
+    # drop stray delimiters from the text so only ts_headline's become tags
+    text = func.translate(hit.content["text"].as_string(), HEADLINE_START + HEADLINE_STOP, "")
+    headline = func.ts_headline(SEARCH_CONFIG, text, tsquery, HEADLINE_OPTIONS)
+    return select(hit, hits.c.rank, headline).order_by(
+        hits.c.rank.desc(), hit.timestamp.desc(), hit.message_id.desc()
     )
+
+
+def _mark_headline(headline: Optional[str]) -> Optional[str]:
+    if headline is None:
+        return None
+    return html.escape(headline).replace(HEADLINE_START, "<mark>").replace(HEADLINE_STOP, "</mark>")
+
+
+def _highlight(text: str, query: str) -> str:
+    # odd items are the matches
+    parts = re.split(f"({re.escape(query)})", text, flags=re.IGNORECASE)
+    return "".join(f"<mark>{html.escape(part)}</mark>" if i % 2 else html.escape(part) for i, part in enumerate(parts))
@@ -0,0 +1,17 @@
+"""Keyset pagination for repository queries."""
+
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import tuple_
+
+
+def keyset(query: Any, columns: Sequence[Any], after: Optional[Sequence[Any]] = None, descending: bool = False) -> Any:
+    """Order ``query`` by ``columns`` and keep only rows past the ``after`` key.
+
+    ``columns`` must end with a unique column so the order is total. Works on
+    both ``Query`` and ``select()`` objects.
+    """
+    if after is not None:
+        key = tuple_(*columns)
+        query = query.where(key < tuple(after) if descending else key > tuple(after))
+    return query.order_by(*(column.desc() if descending else column for column in columns))
@@ -0,0 +1,97 @@
+"""Collect chat writes and persist them in a single transaction."""
+
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.core.history_cache import history_cache
+from app.models.message import Message
+from app.repositories import message as message_repo
+from app.repositories import usage as usage_repo
+from app.repositories.usage_counter import usage_counter
+
+
+class UnitOfWork:
+    """Stage messages and usage deltas, then write them with one commit.
+
+    ``commit`` issues one multi-row message insert and one usage upsert per
+    user and day, both using ``RETURNING``, so a chat turn costs a handful of
+    round trips instead of a commit and refresh per row. With Redis usage
+    counters the deltas are counted there once the transaction succeeds. The
+    history cache is only touched after the transaction succeeds.
+    """
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+        self.messages: List[Message] = []
+        self.usage: Dict[Tuple[UUID, date], List[int]] = {}
+
+    def add_message(
+        self,
+        conversation_id: UUID,
+        user_id: Optional[UUID],
+        content: dict,
+        message_type: str,
+        extra: Optional[dict] = None,
+        message_id: Optional[UUID] = None,
+    ) -> Message:
+        msg = Message(
+            message_id=message_id,
+            conversation_id=conversation_id,
+            user_id=user_id,
+            content=content,
+            message_type=message_type,
+            extra=extra,
+        )
+        self.messages.append(msg)
+        return msg
+
+    def add_usage(
+        self, user_id: UUID, day: date, messages: int = 0, tokens: int = 0, file_uploads: int = 0
+    ) -> None:
+        delta = self.usage.setdefault((user_id, day), [0, 0, 0])
+        delta[0] += messages
+        delta[1] += tokens
+        delta[2] += file_uploads
+
+    def commit(self) -> List[Message]:
+        """Write everything staged so far and return the stored messages."""
+        try:
+            message_repo.insert_messages(self.db, self.messages)
+            if not usage_counter.buffered:
+                for (user_id, day), deltas in self.usage.items():
+                    usage_repo.add_usage(self.db, user_id, day, *deltas)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        if usage_counter.buffered:
+            for (user_id, day), deltas in self.usage.items():
+                usage_counter.record(self.db, user_id, day, *deltas)
+        for msg in self.messages:
+            history_cache.append(msg)
+        stored, self.messages, self.usage = self.messages, [], {}
+        return stored
+
+
+def record_chat_turn(
+    db: Session,
+    user_id: UUID,
+    conversation_id: Optional[UUID],
+    prompt: str,
+    reply: str,
+    tokens: int,
+    extra: Optional[dict] = None,
+) -> List[Message]:
+    """Store one chat exchange and its usage in a single transaction.
+
+    Without a conversation only the usage is recorded.
+    """
+    uow = UnitOfWork(db)
+    if conversation_id:
+        uow.add_message(conversation_id, user_id, {"text": prompt}, "user")
+        uow.add_message(conversation_id, None, {"text": reply}, "ai", extra=extra)
+    uow.add_usage(user_id, date.today(), messages=1, tokens=tokens)
+    return uow.commit()
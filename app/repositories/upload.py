@@ -1,7 +1,9 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Tuple
 from uuid import UUID
 from sqlalchemy.orm import Session
 from app.models.upload import Upload
+from app.repositories.pagination import keyset
 
 
 def create_upload(db: Session, user_id: UUID, bucket: str, key: str, content_type: str | None, size: int) -> Upload:
@@ -18,15 +20,17 @@ def create_upload(db: Session, user_id: UUID, bucket: str, key: str, content_typ
     return upload
 
 
-def list_uploads(db: Session, user_id: UUID, skip: int = 0, limit: int = 100) -> List[Upload]:
-    return (
-        db.query(Upload)
-        .filter(Upload.user_id == user_id)
-        .order_by(Upload.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+def list_uploads(
+    db: Session,
+    user_id: UUID,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, UUID]] = None,
+) -> List[Upload]:
+    """Return uploads newest first, before the ``(created_at, upload_id)`` key if given."""
+    query = db.query(Upload).filter(Upload.user_id == user_id)
+    query = keyset(query, [Upload.created_at, Upload.upload_id], after, descending=True)
+    return query.offset(skip).limit(limit).all()
 
 
 def get_upload(db: Session, upload_id: UUID) -> Optional[Upload]:
@@ -1,9 +1,13 @@
 from datetime import date
 from typing import List, Optional
 from uuid import UUID
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 from app.models.usage import Usage
 
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
 
 def get_usage(db: Session, user_id: UUID) -> List[Usage]:
     return (
@@ -18,58 +22,35 @@ def get_daily_usage(db: Session, user_id: UUID, day: date) -> Optional[Usage]:
     return db.query(Usage).filter(Usage.user_id == user_id, Usage.date == day).first()
 
 
-def increment_message_count(db: Session, user_id: UUID, day: date) -> Usage:
-    usage = get_daily_usage(db, user_id, day)
-    if not usage:
-        usage = Usage(
-            user_id=user_id,
-            date=day,
-            message_count=0,
-            token_count=0,
-            file_uploads=0,
-        )
-        db.add(usage)
-    usage.message_count += 1
-    db.commit()
-    db.refresh(usage)
-    return usage
-
-
-def increment_token_count(db: Session, user_id: UUID, day: date, tokens: int) -> Usage:
-    """Add used tokens to the daily usage counter."""
-    usage = get_daily_usage(db, user_id, day)
-    if not usage:
-        usage = Usage(
-            user_id=user_id,
-            date=day,
-            message_count=0,
-            token_count=0,
-            file_uploads=0,
-        )
-        db.add(usage)
-    if usage.token_count is None:
-        usage.token_count = 0
-    usage.token_count += tokens
-    db.commit()
-    db.refresh(usage)
-    return usage
-
-
-def increment_file_uploads(db: Session, user_id: UUID, day: date) -> Usage:
-    """Track uploaded files for a user."""
-    usage = get_daily_usage(db, user_id, day)
-    if not usage:
-        usage = Usage(
-            user_id=user_id,
-            date=day,
-            message_count=0,
-            token_count=0,
-            file_uploads=0,
-        )
-        db.add(usage)
-    if usage.file_uploads is None:
-        usage.file_uploads = 0
-    usage.file_uploads += 1
-    db.commit()
-    db.refresh(usage)
-    return usage
+def add_usage(
+    db: Session,
+    user_id: UUID,
+    day: date,
+    messages: int = 0,
+    tokens: int = 0,
+    file_uploads: int = 0,
+) -> Usage:
+    """Add counter deltas to the daily row without committing.
+
+    One ``INSERT ... ON CONFLICT (user_id, date) DO UPDATE ... RETURNING``
+    creates the row or bumps all counters in SQL, so concurrent requests
+    neither lose increments nor create duplicate days.
+    """
+    upsert = _INSERTS.get(db.get_bind().dialect.name, postgresql.insert)
+    stmt = upsert(Usage).values(
+        user_id=user_id,
+        date=day,
+        message_count=messages,
+        token_count=tokens,
+        file_uploads=file_uploads,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Usage.user_id, Usage.date],
+        set_={
+            "message_count": Usage.message_count + stmt.excluded.message_count,
+            "token_count": func.coalesce(Usage.token_count, 0) + stmt.excluded.token_count,
+            "file_uploads": func.coalesce(Usage.file_uploads, 0) + stmt.excluded.file_uploads,
+            "last_updated_at": func.now(),
+        },
+    )
+    return db.scalars(stmt.returning(Usage), execution_options={"populate_existing": True}).one()
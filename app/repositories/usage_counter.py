@@ -0,0 +1,330 @@
+"""Daily usage counters buffered in Redis.
+
+With ``USAGE_COUNTER_BACKEND=redis`` usage deltas are not written to the
+``usage`` row on every request. Each user and day has two Redis hashes with
+``messages``, ``tokens`` and ``file_uploads`` fields:
+
+* ``usage:total:<user_id>:<day>`` - today's totals, read by quota checks.
+  It is seeded from the database row plus unflushed deltas the first time it
+  is needed.
+* ``usage:pending:<user_id>:<day>`` - deltas not yet in the database. The
+  key is listed in the ``usage:dirty`` set.
+* ``usage:inflight:<user_id>:<day>`` - deltas taken by a flush that has not
+  finished yet, which may or may not be committed.
+
+Both hashes are bumped with ``HINCRBY`` in one ``MULTI`` block. A flusher
+thread in every worker moves pending deltas to in-flight atomically, adds
+them to the database with :func:`app.repositories.usage.add_usage` and then
+drops them from in-flight. Deltas from a failed flush are put back. Seeding
+waits while deltas are in flight, since the database may not reflect them
+yet; it reads the database inside a ``WATCH`` so a flush starting meanwhile
+makes it start over.
+
+When Redis is unreachable, deltas go straight to the database and quota
+checks read the database, which then lags by the deltas still pending in
+Redis. Totals can drift after such an outage or an expired key; run the
+reconciliation command to flush and reset them from the database::
+
+    python -m app.reconcile_usage reconcile [--day 2026-10-17]
+
+The default ``db`` backend keeps the counters in the database only.
+"""
+
+import logging
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.core import settings
+from app.core.security import _get_redis_client
+from app.db.database import SessionLocal
+from app.repositories import usage as usage_repo
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("messages", "tokens", "file_uploads")
+DIRTY_KEY = "usage:dirty"
+KEY_TTL = 3 * 24 * 3600  # outlives the day plus any flush backlog
+SEED_ATTEMPTS = 20  # times a seed waits for in-flight deltas to settle
+SEED_WAIT = 0.05  # seconds
+
+
+class DailyUsage(NamedTuple):
+    messages: int
+    tokens: int
+    file_uploads: int
+
+
+def _member(user_id: UUID, day: date) -> str:
+    return f"{user_id}:{day.isoformat()}"
+
+
+def _total_key(member: str) -> str:
+    return f"usage:total:{member}"
+
+
+def _pending_key(member: str) -> str:
+    return f"usage:pending:{member}"
+
+
+def _inflight_key(member: str) -> str:
+    return f"usage:inflight:{member}"
+
+
+def _parse(values: Dict[str, Any]) -> DailyUsage:
+    return DailyUsage(*(int(values.get(field) or 0) for field in FIELDS))
+
+
+def _db_usage(db: Session, user_id: UUID, day: date) -> DailyUsage:
+    row = usage_repo.get_daily_usage(db, user_id, day)
+    if row is None:
+        return DailyUsage(0, 0, 0)
+    return DailyUsage(row.message_count or 0, row.token_count or 0, row.file_uploads or 0)
+
+
+def _add(*usages: DailyUsage) -> DailyUsage:
+    return DailyUsage(*(sum(values) for values in zip(*usages)))
+
+
+class UsageCounter:
+    """Count usage in Redis and flush the deltas to the database."""
+
+    def __init__(
+        self,
+        backend: str,
+        session_factory: Callable[[], Session],
+        flush_interval: float = 5.0,
+        client_factory: Callable[[], Any] = _get_redis_client,
+    ) -> None:
+        self.backend = backend
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.client_factory = client_factory
+        self.flushed = 0
+        self.fallback_writes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def buffered(self) -> bool:
+        """Whether deltas go to Redis instead of the caller's transaction."""
+        return self.backend == "redis"
+
+    def _client(self) -> Any:
+        return self.client_factory() if self.buffered else None
+
+    # -- reads ---------------------------------------------------------------
+
+    def get(self, db: Session, user_id: UUID, day: date) -> DailyUsage:
+        """Return the user's counters for ``day``."""
+        client = self._client()
+        if client is not None:
+            member = _member(user_id, day)
+            try:
+                totals = client.hgetall(_total_key(member))
+                if totals:
+                    return _parse(totals)
+                return self._seed(client, member, lambda: _db_usage(db, user_id, day))
+            except Exception:
+                logger.warning("Redis unavailable, reading usage from the database", exc_info=True)
+        return _db_usage(db, user_id, day)
+
+    def _seed(self, client: Any, member: str, load: Callable[[], DailyUsage]) -> DailyUsage:
+        """Create the totals hash as stored counters plus pending deltas."""
+        total_key, pending_key, inflight_key = _total_key(member), _pending_key(member), _inflight_key(member)
+
+        def seed(pipe: Any) -> Optional[DailyUsage]:
+            if pipe.exists(total_key):
+                return None
+            if pipe.exists(inflight_key):
+                # the database may or may not include them yet
+                return _add(load(), _parse(pipe.hgetall(pending_key)), _parse(pipe.hgetall(inflight_key)))
+            # read after WATCH: a flush taking deltas meanwhile aborts the seed
+            totals = _add(load(), _parse(pipe.hgetall(pending_key)))
+            pipe.multi()
+            pipe.hset(total_key, mapping=dict(zip(FIELDS, totals)))
+            pipe.expire(total_key, KEY_TTL)
+            return None
+
+        for _ in range(SEED_ATTEMPTS):
+            busy = client.transaction(seed, total_key, pending_key, inflight_key, value_from_callable=True)
+            if busy is None:
+                return _parse(client.hgetall(total_key))
+            time.sleep(SEED_WAIT)
+        # a flush is stuck; count its deltas without caching a total
+        logger.warning("Usage deltas for %s still in flight, not seeding totals", member)
+        return busy
+
+    # -- writes --------------------------------------------------------------
+
+    def record(
+        self,
+        db: Session,
+        user_id: UUID,
+        day: date,
+        messages: int = 0,
+        tokens: int = 0,
+        file_uploads: int = 0,
+    ) -> None:
+        """Count a committed delta, writing it through ``db`` without Redis."""
+        deltas = dict(zip(FIELDS, (messages, tokens, file_uploads)))
+        client = self._client()
+        if client is not None:
+            try:
+                self._increment(client, _member(user_id, day), deltas)
+                return
+            except Exception:
+                logger.warning("Redis unavailable, writing usage to the database", exc_info=True)
+        usage_repo.add_usage(db, user_id, day, messages, tokens, file_uploads)
+        db.commit()
+        self.fallback_writes += 1
+
+    def _increment(self, client: Any, member: str, deltas: Dict[str, int]) -> None:
+        total_key, pending_key = _total_key(member), _pending_key(member)
+
+        def increment(pipe: Any) -> None:
+            # an unseeded total is left alone; seeding adds the pending deltas
+            seeded = pipe.exists(total_key)
+            pipe.multi()
+            for field, delta in deltas.items():
+                if delta:
+                    pipe.hincrby(pending_key, field, delta)
+                    if seeded:
+                        pipe.hincrby(total_key, field, delta)
+            pipe.expire(pending_key, KEY_TTL)
+            pipe.sadd(DIRTY_KEY, member)
+
+        client.transaction(increment, total_key)
+
+    # -- flushing ------------------------------------------------------------
+
+    def _take(self, client: Any, member: str) -> DailyUsage:
+        """Move the member's pending deltas to in-flight and return them."""
+        pending_key, inflight_key = _pending_key(member), _inflight_key(member)
+
+        def take(pipe: Any) -> DailyUsage:
+            deltas = _parse(pipe.hgetall(pending_key))
+            pipe.multi()
+            for field, delta in zip(FIELDS, deltas):
+                if delta:
+                    pipe.hincrby(inflight_key, field, delta)
+            pipe.expire(inflight_key, KEY_TTL)
+            pipe.delete(pending_key)
+            pipe.srem(DIRTY_KEY, member)
+            return deltas
+
+        return client.transaction(take, pending_key, value_from_callable=True)
+
+    def _settle(self, client: Any, taken: List[Tuple[str, DailyUsage]], restore: bool = False) -> None:
+        """Drop taken deltas from in-flight, back to pending with ``restore``."""
+        for member, deltas in taken:
+            pending_key, inflight_key = _pending_key(member), _inflight_key(member)
+
+            def settle(pipe: Any) -> None:
+                # other workers' flushes may have deltas in flight too
+                left = [i - d for i, d in zip(_parse(pipe.hgetall(inflight_key)), deltas)]
+                pipe.multi()
+                if any(left):
+                    pipe.hset(inflight_key, mapping=dict(zip(FIELDS, left)))
+                else:
+                    pipe.delete(inflight_key)
+                if restore:
+                    for field, delta in zip(FIELDS, deltas):
+                        if delta:
+                            pipe.hincrby(pending_key, field, delta)
+                    pipe.expire(pending_key, KEY_TTL)
+                    pipe.sadd(DIRTY_KEY, member)
+
+            client.transaction(settle, inflight_key)
+
+    def _write(self, taken: List[Tuple[str, DailyUsage]]) -> None:
+        db = self.session_factory()
+        try:
+            for member, deltas in taken:
+                user_id, day = member.split(":")
+                usage_repo.add_usage(db, UUID(user_id), date.fromisoformat(day), *deltas)
+            db.commit()
+        finally:
+            db.close()
+
+    def flush(self) -> int:
+        """Move all pending deltas into the database; return the rows touched."""
+        client = self._client()
+        if client is None:
+            return 0
+        taken: List[Tuple[str, DailyUsage]] = []
+        try:
+            for member in client.smembers(DIRTY_KEY):
+                deltas = self._take(client, member)
+                if any(deltas):
+                    taken.append((member, deltas))
+        except Exception:
+            self._settle(client, taken, restore=True)
+            raise
+        if not taken:
+            return 0
+        try:
+            self._write(taken)
+        except Exception:
+            self._settle(client, taken, restore=True)
+            raise
+        self._settle(client, taken)
+        self.flushed += len(taken)
+        return len(taken)
+
+    def reconcile(self, day: date) -> List[Dict[str, Any]]:
+        """Flush, then reset the day's Redis totals from the database.
+
+        Returns the users whose totals disagreed with the database.
+        """
+        client = self._client()
+        if client is None:
+            return []
+        self.flush()
+        drift = []
+        db = self.session_factory()
+        try:
+            for key in client.scan_iter(match=f"usage:total:*:{day.isoformat()}"):
+                member = key[len("usage:total:"):]
+                user_id = UUID(member.split(":")[0])
+                cached = _parse(client.hgetall(key))
+                client.delete(key)
+                fixed = self._seed(client, member, lambda: _db_usage(db, user_id, day))
+                if cached != fixed:
+                    drift.append({"user_id": str(user_id), "redis": cached._asdict(), "database": fixed._asdict()})
+        finally:
+            db.close()
+        return drift
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="usage-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flusher after a last flush."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            stopping = self._stop.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Usage flush failed; deltas kept in Redis")
+            if stopping:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "flushed": self.flushed, "fallback_writes": self.fallback_writes}
+
+
+usage_counter = UsageCounter(settings.usage_counter_backend, SessionLocal, settings.usage_flush_interval)
+
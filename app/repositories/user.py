@@ -1,12 +1,12 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from uuid import UUID
 
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 from app.core.security import hash_password
+from app.repositories.pagination import keyset
 from datetime import datetime
 
 
@@ -94,9 +94,13 @@ def restore_user(db: Session, user: User) -> User:
     return user
 
 
-def list_users(db: Session, skip: int = 0, limit: int = 100, search: Optional[str] = None) -> List[User]:
+def list_users(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, UUID]] = None,
+) -> List[User]:
+    """Return live users newest first, before the ``(created_at, user_id)`` key if given."""
     query = db.query(User).filter(User.deleted_at.is_(None))
-    if search:
-        pattern = f"%{search}%"
-        query = query.filter(or_(User.email.ilike(pattern), User.phone_number.ilike(pattern)))
-    return query.order_by(User.created_at.desc()).offset(skip).limit(limit).all()
+    query = keyset(query, [User.created_at, User.user_id], after, descending=True)
+    return query.offset(skip).limit(limit).all()
@@ -6,7 +6,7 @@ from .conversation import (
     ConversationUpdate,
     ConversationSummary,
 )
-from .message import MessageCreate, MessageRead, MessageUpdate
+from .message import MessageCreate, MessageRead, MessageSearchResult, MessageUpdate
 from .usage import UsageRead
 from .upload import UploadRead
 from pydantic import BaseModel
@@ -33,6 +33,7 @@ __all__ = [
     "ConversationSummary",
     "MessageCreate",
     "MessageRead",
+    "MessageSearchResult",
     "MessageUpdate",
     "UsageRead",
     "UploadRead",
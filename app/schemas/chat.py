@@ -1,6 +1,6 @@
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class ChatRequest(BaseModel):
     message: str
@@ -9,3 +9,6 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
 
+class ChatBatchRequest(BaseModel):
+    requests: List[ChatRequest] = Field(..., min_length=1)
+
@@ -18,6 +18,8 @@ class ConversationRead(ConversationBase):
     user_id: UUID
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -26,5 +28,6 @@ class ConversationSummary(BaseModel):
     conversation_id: UUID
     title: Optional[str] = None
     message_count: int
+    last_message_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
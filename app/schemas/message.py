@@ -9,6 +9,8 @@ class MessageBase(BaseModel):
 
 class MessageCreate(MessageBase):
     invoke_llm: bool = False
+    # with invoke_llm, answer 202 and generate the reply as a background job
+    background: bool = False
 
 class MessageUpdate(BaseModel):
     content: Optional[dict] = None
@@ -23,3 +25,9 @@ class MessageRead(MessageBase):
     extra: Optional[dict] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+class MessageSearchResult(MessageRead):
+    # ts_rank_cd score on PostgreSQL; None on the LIKE fallback
+    rank: Optional[float] = None
+    # message text with matches wrapped in <mark> tags
+    highlight: Optional[str] = None
@@ -1,6 +1,12 @@
 """Service utilities for the API."""
 
-from .llm import chat_with_openai, chat_with_openai_history, stream_openai_history
+from .llm import (
+    chat_with_openai,
+    chat_with_openai_history,
+    stream_openai_history,
+    async_chat_with_openai_history,
+    async_stream_openai_history,
+)
 from .rate_limiter import (
     check_chat_rate_limit,
     check_login_rate_limit,
@@ -14,12 +20,15 @@ from .password_reset import (
     verify_email_token,
 )
 from .billing import charge_plan
+from .context import build_chat_context
 from .storage import upload_file_obj, get_file_url, delete_file
 
 __all__ = [
     "chat_with_openai",
     "chat_with_openai_history",
     "stream_openai_history",
+    "async_chat_with_openai_history",
+    "async_stream_openai_history",
     "check_chat_rate_limit",
     "check_login_rate_limit",
     "check_message_rate_limit",
@@ -29,6 +38,7 @@ __all__ = [
     "generate_verification_token",
     "verify_email_token",
     "charge_plan",
+    "build_chat_context",
     "upload_file_obj",
     "get_file_url",
     "delete_file",
@@ -0,0 +1,270 @@
+"""Admission control for upstream LLM calls.
+
+Every LLM call takes a slot from a global pool and from its plan's pool
+(``llm_concurrency`` in :data:`app.core.plans.PLANS`). When no slot is free
+the call waits in a bounded queue ordered by plan ``priority`` (lower runs
+first), then arrival. Calls that find the queue full, or wait longer than
+the timeout, fail fast with :class:`OverCapacity`, a 503 with
+``Retry-After``, instead of piling more load on the provider.
+
+Slots can be taken from async code (``slot``) and from sync endpoints running
+in the threadpool (``sync_slot``); both share the same pools.
+"""
+
+import asyncio
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional
+
+from fastapi import HTTPException
+
+from app.core import PLANS, settings
+
+logger = logging.getLogger(__name__)
+
+WAIT_SAMPLES = 1000
+
+
+class OverCapacity(HTTPException):
+    """Raised when an LLM call cannot be admitted in time (HTTP 503)."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(
+            status_code=503,
+            detail="LLM capacity exhausted, retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """One admitted LLM slot; ``release`` may be called more than once."""
+
+    def __init__(self, controller: "AdmissionController", plan: str) -> None:
+        self.controller = controller
+        self.plan = plan
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller.release(self.plan, time.monotonic() - self.started)
+
+
+class _Waiter:
+    def __init__(self, plan: str, priority: int, seq: int, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        self.plan = plan
+        self.priority = priority
+        self.seq = seq
+        self.state = "waiting"  # waiting, granted or rejected
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+        self.event = threading.Event() if loop is None else None
+
+    @property
+    def key(self) -> tuple:
+        return (self.priority, self.seq)
+
+    def wake(self) -> None:
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        else:
+            self.event.set()
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _percentile(samples: Deque[float], pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+class AdmissionController:
+    """Global and per-plan concurrency pools with a priority wait queue."""
+
+    def __init__(
+        self,
+        limit: int,
+        plans: Dict[str, Dict[str, Any]],
+        queue_size: int = 100,
+        timeout: float = 5.0,
+    ) -> None:
+        self.limit = limit
+        self.plans = plans
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active: Counter = Counter()
+        self.total_active = 0
+        self.admitted = 0
+        self.rejected: Counter = Counter()
+        self.max_queue_depth = 0
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._hold = 1.0  # moving average of slot hold time, for Retry-After
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    # -- pool bookkeeping (call with the lock held) -------------------------
+
+    def _plan_limit(self, plan: str) -> int:
+        return self.plans.get(plan, {}).get("llm_concurrency", self.limit)
+
+    def _priority(self, plan: str) -> int:
+        return self.plans.get(plan, {}).get("priority", 0)
+
+    def _can_run(self, plan: str) -> bool:
+        return self.total_active < self.limit and self.active[plan] < self._plan_limit(plan)
+
+    def _take(self, plan: str) -> None:
+        self.total_active += 1
+        self.active[plan] += 1
+        self.admitted += 1
+
+    def _retry_after(self) -> int:
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._hold * backlog / max(self.limit, 1)))
+
+    def _reject(self, plan: str) -> OverCapacity:
+        self.rejected[plan] += 1
+        return OverCapacity(self._retry_after())
+
+    def _dispatch(self) -> None:
+        """Grant freed slots to the best waiters that fit their plan pool."""
+        for waiter in list(self._waiters):
+            if self.total_active >= self.limit:
+                break
+            if self._can_run(waiter.plan):
+                self._waiters.remove(waiter)
+                self._take(waiter.plan)
+                waiter.state = "granted"
+                waiter.wake()
+
+    def _enqueue(self, plan: str, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[_Waiter]:
+        """Take a slot now (returning ``None``) or queue a waiter."""
+        if self._can_run(plan):
+            # waiters only exist while their own pools are full, so this
+            # never jumps ahead of a request that could run
+            self._take(plan)
+            self.waits.append(0.0)
+            return None
+        waiter = _Waiter(plan, self._priority(plan), next(self._seq), loop)
+        if len(self._waiters) >= self.queue_size:
+            worst = self._waiters[-1] if self._waiters else None
+            if worst is None or worst.key <= waiter.key:
+                raise self._reject(plan)
+            # a higher-priority request displaces the newest lowest one
+            self._waiters.pop()
+            self.rejected[worst.plan] += 1
+            worst.state = "rejected"
+            worst.wake()
+        self._waiters.append(waiter)
+        self._waiters.sort(key=lambda w: w.key)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        return waiter
+
+    def _settle(self, waiter: _Waiter, started: float) -> None:
+        """Resolve a waiter after its wait ended; raise if it was not admitted."""
+        with self._lock:
+            if waiter.state == "granted":
+                self.waits.append(time.monotonic() - started)
+                return
+            if waiter.state == "waiting":
+                self._waiters.remove(waiter)
+                error = self._reject(waiter.plan)
+            else:
+                error = OverCapacity(self._retry_after())
+        logger.warning("LLM call for %s plan rejected after %.2fs", waiter.plan, time.monotonic() - started)
+        raise error
+
+    def release(self, plan: str, held: float = 0.0) -> None:
+        with self._lock:
+            self.total_active -= 1
+            self.active[plan] -= 1
+            self._hold = 0.9 * self._hold + 0.1 * held
+            self._dispatch()
+
+    # -- public API ----------------------------------------------------------
+
+    async def acquire(self, plan: str) -> Ticket:
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        with self._lock:
+            waiter = self._enqueue(plan, loop)
+        if waiter is None:
+            return Ticket(self, plan)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.state == "waiting":
+                    self._waiters.remove(waiter)
+                granted = waiter.state == "granted"
+            if granted:
+                self.release(plan)
+            raise
+        self._settle(waiter, started)
+        return Ticket(self, plan)
+
+    def acquire_sync(self, plan: str) -> Ticket:
+        started = time.monotonic()
+        with self._lock:
+            waiter = self._enqueue(plan, None)
+        if waiter is None:
+            return Ticket(self, plan)
+        waiter.event.wait(self.timeout)
+        self._settle(waiter, started)
+        return Ticket(self, plan)
+
+    @asynccontextmanager
+    async def slot(self, plan: str) -> AsyncIterator[None]:
+        """Hold one LLM slot for ``plan`` for the duration of the block."""
+        ticket = await self.acquire(plan)
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    @contextmanager
+    def sync_slot(self, plan: str) -> Iterator[None]:
+        ticket = self.acquire_sync(plan)
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = Counter(w.plan for w in self._waiters)
+            return {
+                "limit": self.limit,
+                "active": self.total_active,
+                "active_by_plan": dict(self.active),
+                "queue_depth": len(self._waiters),
+                "queue_depth_by_plan": dict(queued),
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "wait_p50": _percentile(self.waits, 0.5),
+                "wait_p95": _percentile(self.waits, 0.95),
+            }
+
+
+admission = AdmissionController(
+    settings.llm_max_concurrency,
+    PLANS,
+    queue_size=settings.llm_queue_size,
+    timeout=settings.llm_queue_timeout,
+)
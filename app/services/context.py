@@ -0,0 +1,83 @@
+"""Build token-budgeted prompt history for chat requests."""
+
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.core.history_cache import history_cache, prompt_entry
+from app.core.tokens import estimate_tokens
+from app.repositories import message as message_repo
+from app.services.llm import SYSTEM_PROMPT
+
+DEFAULT_CONTEXT_TOKENS = 2000
+CONTEXT_PAGE_SIZE = 50
+
+
+def _from_cache(conversation_id: UUID, budget: int) -> Optional[List[Dict[str, Any]]]:
+    """Return the newest cached entries fitting ``budget`` or ``None`` if the cache can't answer."""
+    cached = history_cache.get(conversation_id)
+    if cached is None:
+        return None
+    used = 0
+    picked: List[Dict[str, Any]] = []
+    for entry in reversed(cached["messages"]):
+        if used + entry["tokens"] > budget:
+            return picked
+        used += entry["tokens"]
+        picked.append(entry)
+    return picked if cached["complete"] else None
+
+
+def _from_db(db: Session, conversation_id: UUID, budget: int) -> List[Dict[str, Any]]:
+    """Walk stored messages newest first and refill the history cache."""
+    # read before the query so a write landing meanwhile voids the refill
+    version = history_cache.version(conversation_id)
+    used = 0
+    picked: List[Dict[str, Any]] = []
+    skip = 0
+    complete = False
+    while True:
+        page = message_repo.list_recent_messages(
+            db, conversation_id, skip=skip, limit=CONTEXT_PAGE_SIZE
+        )
+        for m in page:
+            entry = prompt_entry(m)
+            if entry is None:
+                continue
+            if used + entry["tokens"] > budget:
+                history_cache.put(conversation_id, picked[::-1], complete=False, version=version)
+                return picked
+            used += entry["tokens"]
+            picked.append(entry)
+        if len(page) < CONTEXT_PAGE_SIZE:
+            complete = True
+            break
+        skip += CONTEXT_PAGE_SIZE
+    history_cache.put(conversation_id, picked[::-1], complete=complete, version=version)
+    return picked
+
+
+def build_chat_context(
+    db: Session,
+    conversation_id: Optional[UUID],
+    message: str,
+    plan: dict,
+) -> List[Dict[str, str]]:
+    """Return the prompt for ``message`` with as much recent history as fits.
+
+    History is read newest first and stops as soon as the next message would
+    exceed the plan's ``context_tokens`` budget, so prompt size stays bounded
+    however long the conversation grows. Hot conversations are answered from
+    the history cache without a database read. The system prompt and the new
+    user message are always included.
+    """
+    budget = plan.get("context_tokens", DEFAULT_CONTEXT_TOKENS)
+    budget -= estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(message)
+    picked: List[Dict[str, Any]] = []
+    if conversation_id:
+        picked = _from_cache(conversation_id, budget)
+        if picked is None:
+            picked = _from_db(db, conversation_id, budget)
+    turns = [{"role": e["role"], "content": e["content"]} for e in reversed(picked)]
+    return [{"role": "system", "content": SYSTEM_PROMPT}, *turns, {"role": "user", "content": message}]
@@ -0,0 +1,84 @@
+"""Background jobs for LLM work that should not hold a request open.
+
+Jobs run on a bounded thread pool and their state lives in a cache (memory
+per worker, or redis so any worker can answer a poll). A job record is a
+plain dict::
+
+    {"job_id", "user_id", "kind", "status", "created_at", "finished_at",
+     "result", "error", ...}
+
+``status`` moves from ``queued`` to ``running`` to ``succeeded`` or
+``failed``. Records expire ``job_ttl`` seconds after their last update.
+"""
+
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+from uuid import UUID
+
+from fastapi import HTTPException
+
+from app.core import settings
+from app.core.cache import make_cache
+
+logger = logging.getLogger(__name__)
+
+TERMINAL = {"succeeded", "failed"}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobManager:
+    """Run callables on a worker pool and track their progress."""
+
+    def __init__(self, backend: str, ttl: int, workers: int) -> None:
+        self._store = make_cache(backend, "jobs", 10000, ttl)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-job")
+
+    def create(self, user_id: UUID, kind: str, **fields: Any) -> Dict[str, Any]:
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "user_id": str(user_id),
+            "kind": kind,
+            "status": "queued",
+            "created_at": _now(),
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            **fields,
+        }
+        self._store.set(job["job_id"], job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._store.get(str(job_id))
+
+    def update(self, job_id: str, **fields: Any) -> Dict[str, Any]:
+        job = {**(self.get(job_id) or {}), **fields}
+        if fields.get("status") in TERMINAL:
+            job["finished_at"] = _now()
+        self._store.set(job_id, job)
+        return job
+
+    def submit(self, job: Dict[str, Any], fn: Callable[..., Any], *args: Any) -> None:
+        """Run ``fn(*args)`` in the pool; its return value becomes the result."""
+        self._executor.submit(self._run, job["job_id"], fn, args)
+
+    def _run(self, job_id: str, fn: Callable[..., Any], args: tuple) -> None:
+        self.update(job_id, status="running")
+        try:
+            result = fn(*args)
+        except HTTPException as exc:
+            self.update(job_id, status="failed", error=exc.detail)
+        except Exception:
+            logger.exception("Job %s failed", job_id)
+            self.update(job_id, status="failed", error="Internal error")
+        else:
+            self.update(job_id, status="succeeded", result=result)
+
+
+jobs = JobManager(settings.job_store_backend, settings.job_ttl, settings.llm_job_workers)
@@ -1,60 +1,146 @@
 """Service wrappers for the language model provider."""
 
+import hashlib
+import json
 import logging
-from typing import Any, List, Dict, Generator
+from contextlib import aclosing, nullcontext
+from typing import Any, AsyncGenerator, List, Dict, Generator
 
-from openai import OpenAI, OpenAIError
+from openai import AsyncOpenAI, OpenAI, OpenAIError
 
 from app.core import settings
+from app.core.cache import make_cache
+from app.core.tokens import estimate_tokens
+from app.services.admission import OverCapacity, admission
+from app.services.llm_router import CircuitBreaker, LLMRouter, Provider
+from app.services.singleflight import SingleFlight
 
-openai_client = OpenAI(api_key=settings.openai_api_key)
+if settings.llm_backend == "fake":
+    # local stand-in from app/fake_llm.py for offline load testing
+    _client_options: Dict[str, Any] = {"api_key": "fake", "base_url": settings.fake_llm_url}
+else:
+    _client_options = {"api_key": settings.openai_api_key}
+openai_client = OpenAI(**_client_options)
+async_openai_client = AsyncOpenAI(**_client_options)
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = (
+    "You are Flynkle, a witty, deeply personal AI assistant who speaks "
+    "like a friend and doesn't say 'As an AI...'"
+)
 
-def chat_with_openai(message: str) -> tuple[str, int]:
-    """Send a prompt to OpenAI GPT-4 and return the response and token usage."""
+MODEL = "gpt-4"
 
-    try:
-        response: Any = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are Flynkle, a witty, deeply personal AI assistant who speaks "
-                        "like a friend and doesn't say 'As an AI...'"
-                    ),
-                },
-                {"role": "user", "content": message},
-            ],
+response_cache = make_cache(
+    settings.llm_cache_backend, "llm", settings.llm_cache_size, settings.llm_cache_ttl
+)
+flights = SingleFlight()
+
+
+def _breaker() -> CircuitBreaker:
+    return CircuitBreaker(settings.llm_breaker_failures, settings.llm_breaker_reset)
+
+
+def build_router() -> LLMRouter:
+    """Create the provider registry from settings.
+
+    The default OpenAI provider (or the fake server when
+    ``settings.llm_backend`` is ``"fake"``) comes first, followed by any entries of
+    ``settings.llm_providers`` (dicts with ``name``, ``model`` and optional
+    ``base_url`` / ``api_key``) in priority order.
+    """
+    providers = [
+        Provider(settings.llm_backend, MODEL, async_openai_client, openai_client, breaker=_breaker())
+    ]
+    for conf in settings.llm_providers:
+        api_key = conf.get("api_key") or settings.openai_api_key
+        base_url = conf.get("base_url")
+        providers.append(
+            Provider(
+                conf["name"],
+                conf.get("model", MODEL),
+                AsyncOpenAI(api_key=api_key, base_url=base_url),
+                OpenAI(api_key=api_key, base_url=base_url),
+                breaker=_breaker(),
+            )
         )
-        tokens = 0
-        try:
-            tokens = int(response.usage.total_tokens)
-        except Exception:  # pragma: no cover - optional
-            tokens = 0
-        return response.choices[0].message.content, tokens
-    except OpenAIError as exc:  # pragma: no cover - API errors
+    return LLMRouter(providers, hedge=settings.llm_hedge_requests, hedge_delay=settings.llm_hedge_delay)
+
+
+router = build_router()
+
+
+def response_cache_key(model: str, messages: List[Dict[str, str]]) -> str:
+    """Hash the model and whitespace-normalized messages into a cache key."""
+    normalized = [
+        {"role": m["role"], "content": " ".join(str(m["content"]).split())}
+        for m in messages
+    ]
+    payload = json.dumps({"model": model, "messages": normalized}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cached_response(key: str) -> tuple[str, int] | None:
+    return _hit(response_cache.get(key))
+
+
+async def _async_cached_response(key: str) -> tuple[str, int] | None:
+    return _hit(await response_cache.aget(key))
+
+
+def _hit(cached: Any) -> tuple[str, int] | None:
+    if cached is None:
+        return None
+    logger.debug("LLM response cache hit")
+    # cached answers skip the upstream call and therefore cost no tokens
+    return cached[0], 0
+
+
+def chat_with_openai(message: str, use_cache: bool = False, plan: str | None = None) -> tuple[str, int]:
+    """Send a prompt to OpenAI GPT-4 and return the response and token usage.
+
+    With ``use_cache`` identical prompts are answered from the response cache.
+    With ``plan`` the upstream call, but not a cache hit, holds one of the
+    plan's admission slots (see :mod:`app.services.admission`).
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": message},
+    ]
+    key = response_cache_key(MODEL, messages)
+    if use_cache:
+        cached = _cached_response(key)
+        if cached is not None:
+            return cached
+    try:
+        if plan is None:
+            response: Any = router.complete_sync(messages)
+        else:
+            with admission.sync_slot(plan):
+                response = router.complete_sync(messages)
+    except RuntimeError as exc:  # pragma: no cover - API errors
         logger.exception("OpenAI API request failed")
         raise RuntimeError("OpenAI API request failed") from exc
+    tokens = 0
+    try:
+        tokens = int(response.usage.total_tokens)
+    except Exception:  # pragma: no cover - optional
+        tokens = 0
+    content = response.choices[0].message.content
+    if use_cache:
+        response_cache.set(key, [content, tokens])
+    return content, tokens
 
 
 def chat_with_openai_history(messages: List[Dict[str, str]]) -> tuple[str, int]:
     """Send conversation history to OpenAI GPT-4."""
+    response: Any = router.complete_sync(messages)
+    tokens = 0
     try:
-        response: Any = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=messages,
-        )
+        tokens = int(response.usage.total_tokens)
+    except Exception:  # pragma: no cover - optional
         tokens = 0
-        try:
-            tokens = int(response.usage.total_tokens)
-        except Exception:  # pragma: no cover - optional
-            tokens = 0
-        return response.choices[0].message.content, tokens
-    except OpenAIError as exc:  # pragma: no cover - API errors
-        logger.exception("OpenAI API request failed")
-        raise RuntimeError(str(exc)) from exc
+    return response.choices[0].message.content, tokens
 
 
 def stream_openai_history(
@@ -63,11 +149,7 @@ def stream_openai_history(
 ) -> Generator[str, None, None]:
     """Stream conversation history to OpenAI GPT-4."""
     try:
-        response: Any = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=messages,
-            stream=True,
-        )
+        response: Any = router.complete_sync(messages, stream=True)
         collected = []
         tokens = 0
         for chunk in response:
@@ -86,3 +168,128 @@ def stream_openai_history(
     except OpenAIError as exc:  # pragma: no cover - API errors
         logger.exception("OpenAI API request failed")
         raise RuntimeError(str(exc)) from exc
+
+
+async def _admitted_complete(messages: List[Dict[str, str]], plan: str | None) -> tuple[str, int]:
+    if plan is None:
+        return await _complete(messages)
+    async with admission.slot(plan):
+        return await _complete(messages)
+
+
+async def _complete(messages: List[Dict[str, str]]) -> tuple[str, int]:
+    response: Any = await router.complete(messages)
+    tokens = 0
+    try:
+        tokens = int(response.usage.total_tokens)
+    except Exception:  # pragma: no cover - optional
+        tokens = 0
+    return response.choices[0].message.content, tokens
+
+
+async def _stream(
+    messages: List[Dict[str, str]],
+    state: dict[str, Any],
+) -> AsyncGenerator[str, None]:
+    collected = []
+    tokens = 0
+    chunks = router.stream(messages)
+    try:
+        async for chunk in chunks:
+            if getattr(chunk, "choices", None):
+                delta = chunk.choices[0].delta
+                if delta and delta.content:
+                    collected.append(delta.content)
+                    yield delta.content
+            if getattr(chunk, "usage", None):
+                try:
+                    tokens = int(chunk.usage.total_tokens)
+                except Exception:  # pragma: no cover - optional
+                    tokens = 0
+    finally:
+        # closing the router stream closes the HTTP response upstream
+        await chunks.aclose()
+    state["tokens"] = tokens
+    state["response"] = "".join(collected)
+
+
+async def _admitted_stream(
+    messages: List[Dict[str, str]],
+    state: dict[str, Any],
+    plan: str | None,
+) -> AsyncGenerator[str, None]:
+    # the slot is held until the upstream stream ends or is closed
+    async with admission.slot(plan) if plan is not None else nullcontext():
+        async with aclosing(_stream(messages, state)) as deltas:
+            async for delta in deltas:
+                yield delta
+
+
+async def async_chat_with_openai_history(
+    messages: List[Dict[str, str]],
+    use_cache: bool = False,
+    scope: str | None = None,
+    plan: str | None = None,
+) -> tuple[str, int]:
+    """Send conversation history to OpenAI GPT-4 without blocking the event loop.
+
+    Concurrent calls with the same ``scope`` (usually the conversation) and
+    identical messages share a single upstream request. With ``plan`` only
+    that upstream request takes an admission slot; cache hits and callers
+    joining an in-flight request do not.
+    """
+    key = response_cache_key(MODEL, messages)
+    if use_cache:
+        cached = await _async_cached_response(key)
+        if cached is not None:
+            return cached
+    if scope is None:
+        content, tokens = await _admitted_complete(messages, plan)
+    else:
+        content, tokens = await flights.call(f"{scope}:{key}", lambda: _admitted_complete(messages, plan))
+    if use_cache:
+        await response_cache.aset(key, [content, tokens])
+    return content, tokens
+
+
+async def async_stream_openai_history(
+    messages: List[Dict[str, str]],
+    state: dict[str, Any],
+    scope: str | None = None,
+    plan: str | None = None,
+) -> AsyncGenerator[str, None]:
+    """Stream conversation history to OpenAI GPT-4 on the event loop.
+
+    Concurrent streams with the same ``scope`` and identical messages are fed
+    from one upstream stream. With ``plan`` only that upstream stream holds
+    an admission slot, so :class:`~app.services.admission.OverCapacity` is
+    raised before the first delta. If the consumer stops early (client disconnect)
+    the upstream stream is closed and ``state`` records the partial response
+    with ``truncated`` set and an estimate of the tokens actually consumed.
+    """
+    if scope is None:
+        source = _admitted_stream(messages, state, plan)
+    else:
+        key = f"{scope}:{response_cache_key(MODEL, messages)}"
+        source = flights.stream(key, lambda s: _admitted_stream(messages, s, plan), state)
+    parts: List[str] = []
+    completed = False
+    try:
+        async for delta in source:
+            parts.append(delta)
+            yield delta
+        completed = True
+    except (RuntimeError, OverCapacity) as exc:
+        state["error"] = str(exc)
+        raise
+    finally:
+        if not completed and "error" not in state:
+            state["truncated"] = True
+            state["response"] = "".join(parts)
+            state.setdefault(
+                "tokens",
+                sum(estimate_tokens(m["content"]) for m in messages)
+                + estimate_tokens(state["response"]),
+            )
+            logger.info("LLM stream truncated after %d chars", len(state["response"]))
+        await source.aclose()
@@ -0,0 +1,337 @@
+"""Route LLM calls across providers with circuit breaking and hedging."""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Awaitable, Callable, Deque, Dict, List, Optional
+
+from openai import AsyncOpenAI, OpenAI, OpenAIError
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 200
+MIN_HEDGE_SAMPLES = 20
+
+
+class CircuitBreaker:
+    """Stop sending traffic to a provider after repeated failures.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and the
+    provider is skipped. Once ``reset_after`` seconds have passed a single
+    trial request is let through (half-open); success closes the breaker and
+    failure opens it again. State changes are locked because the sync path
+    runs in threadpool workers.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_after: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def _allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_after:
+            self.state = "half-open"
+            self._trial_running = False
+        if self.state == "half-open":
+            return not self._trial_running
+        return self.state == "closed"
+
+    def allow(self) -> bool:
+        """Return whether a request may be sent now (without reserving it)."""
+        with self._lock:
+            return self._allow()
+
+    def begin(self) -> bool:
+        """Check and reserve a request; ``False`` if the provider must be skipped.
+
+        While half-open only the caller that takes the single trial gets
+        ``True``.
+        """
+        with self._lock:
+            if not self._allow():
+                return False
+            if self.state == "half-open":
+                self._trial_running = True
+            return True
+
+    def release(self) -> None:
+        """Give back a trial that ended without a verdict (e.g. cancelled)."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("Circuit opened after %d failures", self.failures)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial_running = False
+
+
+def _percentile(samples: Deque[float], pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@dataclass
+class Provider:
+    """One upstream model endpoint with its own health and latency record."""
+
+    name: str
+    model: str
+    client: AsyncOpenAI
+    sync_client: OpenAI
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLES))
+    ttfts: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLES))
+    requests: int = 0
+    errors: int = 0
+
+    def record_success(self, latency: float) -> None:
+        self.requests += 1
+        self.latencies.append(latency)
+        self.breaker.record_success()
+
+    def record_failure(self) -> None:
+        self.requests += 1
+        self.errors += 1
+        self.breaker.record_failure()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_latency": _percentile(self.latencies, 0.5),
+            "p95_latency": _percentile(self.latencies, 0.95),
+            "p95_ttft": _percentile(self.ttfts, 0.95),
+            "circuit": self.breaker.state,
+        }
+
+
+def _hedge_delay(samples: Deque[float], default: float) -> float:
+    if len(samples) < MIN_HEDGE_SAMPLES:
+        return default
+    return _percentile(samples, 0.95) or default
+
+
+class LLMRouter:
+    """Ordered provider registry.
+
+    Requests go to the first provider whose circuit allows traffic and fail
+    over to the next one on error. With ``hedge`` enabled a second provider
+    is started when the first has not answered (or, for streams, produced a
+    first token) within its p95 latency; whichever wins is used and the
+    other request is cancelled.
+    """
+
+    def __init__(self, providers: List[Provider], hedge: bool = False, hedge_delay: float = 2.0) -> None:
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+
+    def register(self, provider: Provider) -> None:
+        self.providers.append(provider)
+
+    def available(self) -> List[Provider]:
+        candidates = [p for p in self.providers if p.breaker.allow()]
+        if not candidates:
+            raise RuntimeError("No LLM provider available")
+        return candidates
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {p.name: p.stats() for p in self.providers}
+
+    # -- synchronous calls -------------------------------------------------
+
+    def complete_sync(self, messages: List[Dict[str, str]], **kwargs: Any) -> Any:
+        """Return a completion response using the first healthy provider."""
+        last_exc: Optional[Exception] = None
+        for provider in self.available():
+            if not provider.breaker.begin():
+                # another request took the half-open trial since available()
+                continue
+            start = time.monotonic()
+            try:
+                response = provider.sync_client.chat.completions.create(
+                    model=provider.model, messages=messages, **kwargs
+                )
+                provider.record_success(time.monotonic() - start)
+                return response
+            except OpenAIError as exc:
+                logger.warning("LLM provider %s failed: %s", provider.name, exc)
+                provider.record_failure()
+                last_exc = exc
+            finally:
+                # a no-op after a verdict; frees the half-open trial on any other error
+                provider.breaker.release()
+        if last_exc is None:
+            raise RuntimeError("No LLM provider available")
+        raise RuntimeError(str(last_exc)) from last_exc
+
+    # -- asynchronous calls ------------------------------------------------
+
+    async def _complete_one(self, provider: Provider, messages: List[Dict[str, str]]) -> Any:
+        start = time.monotonic()
+        try:
+            response = await provider.client.chat.completions.create(
+                model=provider.model, messages=messages
+            )
+        except OpenAIError as exc:
+            logger.warning("LLM provider %s failed: %s", provider.name, exc)
+            provider.record_failure()
+            raise RuntimeError(str(exc)) from exc
+        except asyncio.CancelledError:
+            provider.breaker.release()
+            raise
+        provider.record_success(time.monotonic() - start)
+        return response
+
+    async def complete(self, messages: List[Dict[str, str]]) -> Any:
+        """Return a completion response, hedging and failing over as configured."""
+        candidates = self.available()
+        return await self._race(
+            candidates,
+            lambda p: self._complete_one(p, messages),
+            _hedge_delay(candidates[0].latencies, self.hedge_delay),
+        )
+
+    async def _open_stream(self, provider: Provider, messages: List[Dict[str, str]]) -> tuple:
+        """Start a stream and read up to the first content delta."""
+        start = time.monotonic()
+        response = None
+        try:
+            response = await provider.client.chat.completions.create(
+                model=provider.model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            chunks = aiter(response)
+            head = []
+            async for chunk in chunks:
+                head.append(chunk)
+                choices = getattr(chunk, "choices", None)
+                if choices and choices[0].delta and choices[0].delta.content:
+                    break
+        except OpenAIError as exc:
+            logger.warning("LLM provider %s failed: %s", provider.name, exc)
+            provider.record_failure()
+            if response is not None:
+                await response.close()
+            raise RuntimeError(str(exc)) from exc
+        except BaseException:
+            # hedge loser or caller cancelled before the first token
+            provider.breaker.release()
+            if response is not None:
+                await response.close()
+            raise
+        provider.ttfts.append(time.monotonic() - start)
+        return provider, response, chunks, head, start
+
+    async def _discard_stream(self, opened: tuple) -> None:
+        """Close a stream that opened but lost the race."""
+        provider, response = opened[:2]
+        provider.breaker.release()
+        await response.close()
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncGenerator[Any, None]:
+        """Yield raw stream chunks from the winning provider."""
+        candidates = self.available()
+        provider, response, chunks, head, start = await self._race(
+            candidates,
+            lambda p: self._open_stream(p, messages),
+            _hedge_delay(candidates[0].ttfts, self.hedge_delay),
+            discard=self._discard_stream,
+        )
+        finished = False
+        try:
+            for chunk in head:
+                yield chunk
+            async for chunk in chunks:
+                yield chunk
+            finished = True
+        except OpenAIError as exc:
+            logger.warning("LLM provider %s failed mid-stream: %s", provider.name, exc)
+            provider.record_failure()
+            raise RuntimeError(str(exc)) from exc
+        finally:
+            await response.close()
+            if not finished:
+                provider.breaker.release()
+        provider.record_success(time.monotonic() - start)
+
+    async def _race(
+        self,
+        candidates: List[Provider],
+        start: Callable[[Provider], Any],
+        delay: float,
+        discard: Optional[Callable[[Any], Awaitable[None]]] = None,
+    ) -> Any:
+        """Run ``start`` on candidates in order, hedging after ``delay`` if enabled.
+
+        Losing results that completed anyway (several tasks can finish in the
+        same wake-up) are passed to ``discard``.
+        """
+        queue = list(candidates)
+        running: Dict[asyncio.Task, Provider] = {}
+        last_exc: Optional[BaseException] = None
+
+        def launch() -> bool:
+            # skip providers whose breaker no longer admits a request
+            while queue:
+                provider = queue.pop(0)
+                if provider.breaker.begin():
+                    running[asyncio.ensure_future(start(provider))] = provider
+                    return True
+            return False
+
+        if not launch():
+            raise RuntimeError("No LLM provider available")
+        try:
+            while running:
+                hedge_ready = self.hedge and queue and len(running) == 1
+                done, _ = await asyncio.wait(
+                    running,
+                    timeout=delay if hedge_ready else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    logger.info("Hedging LLM request to %s", queue[0].name)
+                    launch()
+                    continue
+                for task in done:
+                    running.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    last_exc = task.exception()
+                if not running and queue:
+                    launch()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                outcomes = await asyncio.gather(*running, return_exceptions=True)
+                if discard is not None:
+                    for outcome in outcomes:
+                        if not isinstance(outcome, BaseException):
+                            await discard(outcome)
+        raise RuntimeError(str(last_exc)) from last_exc
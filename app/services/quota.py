@@ -0,0 +1,47 @@
+"""Daily plan quota checks.
+
+Endpoints read today's counters once through :func:`daily_usage` and compare
+them to the plan with the ``check_*`` helpers, which raise the 403 the API
+uses for exhausted quotas. The counters come from
+:data:`app.repositories.usage_counter.usage_counter`, i.e. Redis or the database.
+"""
+
+from datetime import date
+from typing import Any, Dict
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.repositories.usage_counter import DailyUsage, usage_counter
+
+
+def daily_usage(db: Session, user_id: UUID) -> DailyUsage:
+    """Return today's counters for the user, zero when nothing was used."""
+    return usage_counter.get(db, user_id, date.today())
+
+
+def _upgrade_required() -> HTTPException:
+    return HTTPException(status_code=403, detail="Upgrade required")
+
+
+def check_tokens(used: DailyUsage, plan: Dict[str, Any], tokens: int = 0) -> None:
+    """Reject when the token budget is spent or ``tokens`` more would exceed it."""
+    if used.tokens >= plan["daily_tokens"] or (tokens and used.tokens + tokens > plan["daily_tokens"]):
+        raise _upgrade_required()
+
+
+def check_chat_quota(db: Session, user_id: UUID, plan: Dict[str, Any], messages: int = 1) -> DailyUsage:
+    """Allow ``messages`` more chat messages today or raise 403."""
+    used = daily_usage(db, user_id)
+    if used.messages + messages > plan["daily_messages"]:
+        raise _upgrade_required()
+    check_tokens(used, plan)
+    return used
+
+
+def check_upload_quota(db: Session, user_id: UUID, plan: Dict[str, Any]) -> DailyUsage:
+    used = daily_usage(db, user_id)
+    if used.file_uploads >= plan.get("max_file_uploads", 0):
+        raise _upgrade_required()
+    return used
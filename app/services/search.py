@@ -0,0 +1,66 @@
+"""Substring search over conversation titles and users.
+
+``ILIKE '%q%'`` cannot use a B-tree index. On PostgreSQL the filtered
+columns carry ``pg_trgm`` GIN indexes that serve these patterns, and hits are
+ordered by trigram ``similarity`` to the query, best first. Other databases
+(SQLite in tests) run the same substring filter ordered newest first. Either
+way at most ``limit`` rows come back, after skipping the first ``skip``;
+relevance order has no stable key, so search results page by offset.
+"""
+
+from typing import List
+from uuid import UUID
+
+from sqlalchemy import Select, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.conversation import Conversation
+from app.models.user import User
+
+DEFAULT_LIMIT = 20
+
+
+def _trigram(db: Session | AsyncSession) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def conversation_search(user_id: UUID, query: str, limit: int, trigram: bool, skip: int = 0) -> Select:
+    stmt = select(Conversation).where(
+        Conversation.user_id == user_id, Conversation.title.icontains(query, autoescape=True)
+    )
+    if trigram:
+        stmt = stmt.order_by(func.similarity(Conversation.title, query).desc())
+    stmt = stmt.order_by(Conversation.created_at.desc(), Conversation.conversation_id.desc())
+    return stmt.offset(skip).limit(limit)
+
+
+def user_search(query: str, limit: int, trigram: bool, skip: int = 0) -> Select:
+    stmt = select(User).where(
+        User.deleted_at.is_(None),
+        or_(User.email.icontains(query, autoescape=True), User.phone_number.icontains(query, autoescape=True)),
+    )
+    if trigram:
+        # greatest() skips the NULL similarity of a missing phone number
+        stmt = stmt.order_by(
+            func.greatest(func.similarity(User.email, query), func.similarity(User.phone_number, query)).desc()
+        )
+    return stmt.order_by(User.created_at.desc(), User.user_id.desc()).offset(skip).limit(limit)
+
+
+def search_conversations(
+    db: Session, user_id: UUID, query: str, skip: int = 0, limit: int = DEFAULT_LIMIT
+) -> List[Conversation]:
+    """Return the user's conversations whose title contains ``query``."""
+    return list(db.scalars(conversation_search(user_id, query, limit, _trigram(db), skip=skip)))
+
+
+async def async_search_conversations(
+    db: AsyncSession, user_id: UUID, query: str, skip: int = 0, limit: int = DEFAULT_LIMIT
+) -> List[Conversation]:
+    return list(await db.scalars(conversation_search(user_id, query, limit, _trigram(db), skip=skip)))
+
+
+def search_users(db: Session, query: str, skip: int = 0, limit: int = DEFAULT_LIMIT) -> List[User]:
+    """Return live users whose email or phone number contains ``query``."""
+    return list(db.scalars(user_search(query, limit, _trigram(db), skip=skip)))
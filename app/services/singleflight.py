@@ -0,0 +1,129 @@
+"""Coalesce identical in-flight LLM requests into one upstream call."""
+
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """Fan-out buffer for one shared upstream stream."""
+
+    def __init__(self) -> None:
+        self.chunks: List[str] = []
+        self.state: Dict[str, Any] = {}
+        self.done = False
+        self.error: Optional[BaseException] = None
+        # one marker per consumer still reading, and the one billed for it
+        self.subscribers: List[object] = []
+        self.payer: Optional[object] = None
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """Share one upstream call between concurrent requests with the same key.
+
+    The upstream work runs in its own task, so a caller going away does not
+    cancel it for the others. Exactly one caller is charged tokens; the others
+    receive the same answer with zero tokens. For calls that is the first
+    caller. For streams it starts as the first caller, but a payer that leaves
+    while others keep the stream going hands the bill to the next subscriber.
+    Whoever holds it when the stream completes is charged the full usage; if
+    the last subscriber leaves early the upstream is cancelled and that
+    caller keeps its truncation estimate.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _Flight] = {}
+
+    async def call(
+        self, key: str, factory: Callable[[], Awaitable[tuple[str, int]]]
+    ) -> tuple[str, int]:
+        task = self._calls.get(key)
+        if task is not None:
+            logger.debug("Joining in-flight LLM call %s", key)
+            content, _tokens = await asyncio.shield(task)
+            return content, 0
+        task = asyncio.ensure_future(factory())
+        self._calls[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        self._calls.pop(key, None)
+        if not task.cancelled():
+            # mark the exception retrieved even if every caller went away
+            task.exception()
+
+    async def stream(
+        self,
+        key: str,
+        factory: Callable[[Dict[str, Any]], AsyncIterator[str]],
+        state: Dict[str, Any],
+    ) -> AsyncGenerator[str, None]:
+        flight = self._streams.get(key)
+        me = object()
+        if flight is None:
+            flight = _Flight()
+            flight.payer = me
+            self._streams[key] = flight
+            flight.task = asyncio.ensure_future(self._pump(key, flight, factory))
+        else:
+            logger.debug("Joining in-flight LLM stream %s", key)
+        flight.subscribers.append(me)
+        completed = False
+        sent = 0
+        try:
+            while True:
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: len(flight.chunks) > sent or flight.done)
+                    pending = flight.chunks[sent:]
+                    finished = flight.done
+                for chunk in pending:
+                    yield chunk
+                sent += len(pending)
+                if finished and sent == len(flight.chunks):
+                    break
+            if flight.error is not None:
+                raise flight.error
+            state.update(flight.state)
+            state["response"] = "".join(flight.chunks)
+            completed = True
+        finally:
+            flight.subscribers.remove(me)
+            if flight.payer is me and not completed and not flight.done and flight.subscribers:
+                # the others keep the upstream going; the next one pays for it
+                flight.payer = flight.subscribers[0]
+            if flight.payer is not me:
+                state["tokens"] = 0
+            elif flight.done and flight.error is None:
+                # left after the upstream finished: it was consumed in full
+                state["tokens"] = flight.state.get("tokens", 0)
+            if not flight.subscribers and not flight.done and flight.task is not None:
+                flight.task.cancel()
+
+    async def _pump(
+        self,
+        key: str,
+        flight: _Flight,
+        factory: Callable[[Dict[str, Any]], AsyncIterator[str]],
+    ) -> None:
+        try:
+            async with aclosing(factory(flight.state)) as chunks:
+                async for chunk in chunks:
+                    async with flight.changed:
+                        flight.chunks.append(chunk)
+                        flight.changed.notify_all()
+        except BaseException as exc:
+            flight.error = exc
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+        finally:
+            self._streams.pop(key, None)
+            async with flight.changed:
+                flight.done = True
+                flight.changed.notify_all()
@@ -0,0 +1,96 @@
+"""Server-Sent Events framing for streamed chat responses."""
+
+import asyncio
+import json
+import logging
+import time
+from contextlib import aclosing, suppress
+from typing import Any, AsyncIterator, Dict
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format a single SSE event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def batch_deltas(
+    source: AsyncIterator[str],
+    max_bytes: int = 256,
+    max_delay: float = 0.02,
+) -> AsyncIterator[str]:
+    """Merge small deltas into batches flushed by size or age.
+
+    A batch is emitted once it holds ``max_bytes`` of text or its first delta
+    has waited ``max_delay`` seconds, whichever comes first. The source is
+    drained by a separate task so a slow model still flushes on time.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump() -> None:
+        try:
+            async for delta in source:
+                await queue.put(delta)
+        except Exception as exc:
+            await queue.put(exc)
+        else:
+            await queue.put(_END)
+
+    task = asyncio.ensure_future(pump())
+    buffer: list[str] = []
+    size = 0
+    deadline = 0.0
+    try:
+        while True:
+            timeout = None if not buffer else max(deadline - time.monotonic(), 0)
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield "".join(buffer)
+                buffer, size = [], 0
+                continue
+            if item is _END or isinstance(item, Exception):
+                if buffer:
+                    yield "".join(buffer)
+                if item is not _END:
+                    raise item
+                return
+            if not buffer:
+                deadline = time.monotonic() + max_delay
+            buffer.append(item)
+            size += len(item.encode())
+            if size >= max_bytes:
+                yield "".join(buffer)
+                buffer, size = [], 0
+    finally:
+        # stop reading upstream when the consumer goes away early
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+async def sse_stream(
+    source: AsyncIterator[str],
+    state: Dict[str, Any],
+    max_bytes: int = 256,
+    max_delay: float = 0.02,
+) -> AsyncIterator[str]:
+    """Wrap a delta stream in typed ``delta``, ``usage``, ``done`` and ``error`` events.
+
+    Upstream failures become an ``error`` event and are recorded in
+    ``state["error"]`` so the caller can skip persisting the turn.
+    """
+    try:
+        async with aclosing(batch_deltas(source, max_bytes, max_delay)) as batches:
+            async for text in batches:
+                yield sse_event("delta", {"text": text})
+    except RuntimeError as exc:
+        logger.warning("LLM stream failed: %s", exc)
+        state["error"] = str(exc)
+        yield sse_event("error", {"source": "openai", "reason": str(exc)})
+        return
+    yield sse_event("usage", {"tokens": state.get("tokens", 0)})
+    yield sse_event("done", {})
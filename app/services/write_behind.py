@@ -0,0 +1,277 @@
+"""Durable write-behind queue for streamed chat turns.
+
+Streaming responses hand their finished turn (both messages and the usage
+delta) to :data:`write_behind` instead of writing it on the request session.
+A background thread commits queued turns every ``flush_ms`` milliseconds as
+one :class:`~app.repositories.unit_of_work.UnitOfWork`, i.e. a multi-row
+message insert plus one usage update per user and day.
+
+Every turn is appended to a per-process journal file before it is queued and
+the journal is truncated once the turn is committed. On start-up a worker
+locks its own journal and replays journals left behind by dead workers.
+Turns whose messages are already stored are skipped on replay; usage-only
+turns (no conversation) may be counted twice if a worker dies between the
+commit and the journal truncation.
+
+When a batch fails its turns are retried one at a time. A turn that still
+fails is logged and appended to ``dead-letter.jsonl`` in the journal
+directory, with the error, so it no longer holds up the queue. While the
+database is unreachable turns stay queued and are retried instead.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core import settings
+from app.db.database import SessionLocal, replica_router
+from app.models.message import Message
+from app.repositories.unit_of_work import UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PREFIX = "journal-"
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+RETRY_DELAY = 1.0
+
+
+def make_turn(
+    user_id: UUID,
+    conversation_id: Optional[UUID],
+    prompt: str,
+    reply: str,
+    tokens: int,
+    extra: Optional[dict] = None,
+) -> Dict[str, Any]:
+    """Return the journal form of one chat exchange."""
+    return {
+        "user_id": str(user_id),
+        "conversation_id": str(conversation_id) if conversation_id else None,
+        "day": date.today().isoformat(),
+        "prompt": prompt,
+        "reply": reply,
+        "tokens": tokens,
+        "extra": extra,
+        # fixed up front so a replayed turn can be recognised
+        "message_ids": [str(uuid.uuid4()), str(uuid.uuid4())] if conversation_id else [],
+    }
+
+
+class WriteBehindQueue:
+    """Journal-backed queue that batches chat turns into one transaction."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        directory: str,
+        flush_ms: int = 50,
+        max_batch: int = 500,
+    ) -> None:
+        self.session_factory = session_factory
+        self.directory = directory
+        self.flush_interval = flush_ms / 1000
+        self.max_batch = max_batch
+        self.pending: List[Dict[str, Any]] = []
+        self.flushed = 0
+        self.batches = 0
+        self.dead = 0
+        self._cond = threading.Condition()
+        self._journal: Optional[Any] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{JOURNAL_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl")
+        self._journal = open(path, "a+", encoding="utf-8")
+        fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._stopping = False
+        self.recover()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Flush everything still queued and release the journal."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._journal is not None:
+            path = self._journal.name
+            empty = not self.pending
+            self._journal.close()
+            self._journal = None
+            if empty:
+                os.remove(path)
+
+    def recover(self) -> int:
+        """Replay journals of workers that are gone; return the turns written."""
+        own = self._journal.name if self._journal is not None else None
+        replayed = 0
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not name.startswith(JOURNAL_PREFIX) or path == own:
+                continue
+            with open(path, "r", encoding="utf-8") as journal:
+                try:
+                    fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a live worker owns it
+                turns = []
+                for line in journal:
+                    try:
+                        turns.append(json.loads(line))
+                    except ValueError:
+                        if line.strip():  # e.g. cut short when the worker died
+                            logger.warning("Skipping unreadable journal line in %s: %r", name, line)
+                if turns:
+                    logger.info("Replaying %d journaled chat turns from %s", len(turns), name)
+                    written, left = self._flush(turns)
+                    replayed += written
+                    if left:
+                        if self._journal is None:
+                            continue  # keep the journal for a later start
+                        # database unreachable: retry them from our own queue
+                        for turn in left:
+                            self.submit(turn)
+                os.remove(path)
+        return replayed
+
+    # -- producer side -------------------------------------------------------
+
+    def submit(self, turn: Dict[str, Any]) -> None:
+        """Journal ``turn`` and queue it for the next batch."""
+        with self._cond:
+            if self._journal is None:
+                raise RuntimeError("Write-behind queue is not running")
+            self._journal.write(json.dumps(turn) + "\n")
+            self._journal.flush()
+            self.pending.append(turn)
+            if len(self.pending) >= self.max_batch:
+                self._cond.notify()
+
+    def submit_chat_turn(self, *args: Any, **kwargs: Any) -> None:
+        self.submit(make_turn(*args, **kwargs))
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": len(self.pending), "flushed": self.flushed, "batches": self.batches, "dead": self.dead}
+
+    # -- flusher -------------------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._stopping:
+                    self._cond.wait(self.flush_interval)
+                if not self.pending:
+                    if self._stopping:
+                        return
+                    continue
+                batch = self.pending[: self.max_batch]
+                del self.pending[: len(batch)]
+            written, left = self._flush(batch)
+            with self._cond:
+                self.flushed += written
+                if written:
+                    self.batches += 1
+                self.pending[:0] = left
+                self._compact()
+                if left:
+                    if self._stopping:
+                        return  # the journal keeps them for the next start
+                    self._cond.wait(RETRY_DELAY)
+
+    def _flush(self, turns: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """Write ``turns``; return how many were stored and those to retry later.
+
+        If the batch fails the turns are written one at a time, and those that
+        fail on their own go to the dead-letter file. When the database cannot
+        be reached at all the remaining turns are handed back.
+        """
+        try:
+            self._write(turns)
+            return len(turns), []
+        except Exception:
+            logger.exception("Write-behind flush of %d turns failed; retrying them one at a time", len(turns))
+        written = 0
+        for index, turn in enumerate(turns):
+            try:
+                self._write([turn])
+            except OperationalError:
+                logger.exception("Database unavailable; keeping %d chat turns queued", len(turns) - index)
+                return written, turns[index:]
+            except Exception as exc:
+                logger.exception("Moving chat turn of user %s to the dead-letter file", turn.get("user_id"))
+                self._dead_letter(turn, exc)
+            else:
+                written += 1
+        return written, []
+
+    def _dead_letter(self, turn: Dict[str, Any], error: Exception) -> None:
+        with open(os.path.join(self.directory, DEAD_LETTER_FILE), "a", encoding="utf-8") as fh:
+            fh.write(json.dumps({**turn, "error": repr(error)}) + "\n")
+        self.dead += 1
+
+    def _compact(self) -> None:
+        """Rewrite the journal so it only holds turns not yet committed."""
+        journal = self._journal
+        journal.seek(0)
+        journal.truncate()
+        for turn in self.pending:
+            journal.write(json.dumps(turn) + "\n")
+        journal.flush()
+
+    def _write(self, turns: List[Dict[str, Any]]) -> None:
+        db = self.session_factory()
+        try:
+            ids = [UUID(i) for turn in turns for i in turn["message_ids"]]
+            stored = set()
+            if ids:
+                # turns are stored on or after their usage day (give or take a
+                # time zone), which keeps the lookup to recent partitions
+                since = datetime.combine(min(date.fromisoformat(turn["day"]) for turn in turns), datetime.min.time())
+                stored = {
+                    str(row[0])
+                    for row in db.query(Message.message_id)
+                    .filter(Message.message_id.in_(ids), Message.timestamp >= since - timedelta(days=1))
+                    .all()
+                }
+            uow = UnitOfWork(db)
+            for turn in turns:
+                if stored.intersection(turn["message_ids"]):
+                    continue
+                user_id = UUID(turn["user_id"])
+                if turn["conversation_id"]:
+                    conversation_id = UUID(turn["conversation_id"])
+                    prompt_id, reply_id = (UUID(i) for i in turn["message_ids"])
+                    uow.add_message(conversation_id, user_id, {"text": turn["prompt"]}, "user", message_id=prompt_id)
+                    uow.add_message(
+                        conversation_id, None, {"text": turn["reply"]}, "ai", extra=turn["extra"], message_id=reply_id
+                    )
+                uow.add_usage(user_id, date.fromisoformat(turn["day"]), messages=1, tokens=turn["tokens"])
+            uow.commit()
+        finally:
+            db.close()
+        for user_id in {turn["user_id"] for turn in turns}:
+            replica_router.mark_write(user_id)
+
+
+write_behind = WriteBehindQueue(
+    SessionLocal,
+    settings.write_behind_dir,
+    flush_ms=settings.write_behind_flush_ms,
+    max_batch=settings.write_behind_max_batch,
+)
@@ -0,0 +1,106 @@
+"""Compare concurrent chat stream capacity of the threadpool and async LLM paths.
+
+The bundled fake LLM server (``app/fake_llm.py``) is started locally so no
+API key or network access is needed. Every fake completion waits ``--ttft``
+seconds before the first token and then streams ``--tokens`` tokens at
+``--tps`` tokens per second, which mimics a slow model. The same number of concurrent streams is
+then pushed through:
+
+* ``threadpool`` - the sync ``stream_openai_history`` generator wrapped in
+  ``iterate_in_threadpool`` (how ``/chat`` used to work)
+* ``async`` - the ``async_stream_openai_history`` generator used by ``/chat``
+
+Run with::
+
+    python -m benchmarks.chat_concurrency --streams 200
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import threading
+import time
+
+import uvicorn
+from openai import AsyncOpenAI, OpenAI
+from starlette.concurrency import iterate_in_threadpool
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from app.fake_llm import FakeLLM  # noqa: E402
+from app.services import llm  # noqa: E402
+from app.services.llm_router import LLMRouter, Provider  # noqa: E402
+
+
+def start_upstream(upstream: FakeLLM) -> str:
+    """Run the fake upstream in a daemon thread and return its base URL."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    config = uvicorn.Config(upstream.app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+async def run_threadpool(streams: int) -> None:
+    async def one() -> None:
+        state: dict = {}
+        async for _ in iterate_in_threadpool(llm.stream_openai_history([{"role": "user", "content": "hi"}], state)):
+            pass
+
+    await asyncio.gather(*(one() for _ in range(streams)))
+
+
+async def run_async(streams: int) -> None:
+    async def one() -> None:
+        state: dict = {}
+        async for _ in llm.async_stream_openai_history([{"role": "user", "content": "hi"}], state):
+            pass
+
+    await asyncio.gather(*(one() for _ in range(streams)))
+
+
+def measure(name: str, runner, streams: int, upstream: FakeLLM) -> None:
+    upstream.reset()
+    start = time.perf_counter()
+    asyncio.run(runner(streams))
+    elapsed = time.perf_counter() - start
+    ideal = upstream.ttft + (upstream.response_tokens - 1) / upstream.tokens_per_sec
+    print(
+        f"{name:<10} streams={streams:<5} wall={elapsed:6.2f}s ideal={ideal:.2f}s "
+        f"peak_upstream_concurrency={upstream.peak:<5} streams/s={streams / elapsed:8.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=200, help="concurrent streams per run")
+    parser.add_argument("--ttft", type=float, default=1.0, help="seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=10, help="tokens per completion")
+    parser.add_argument("--tps", type=float, default=10.0, help="tokens per second after the first")
+    args = parser.parse_args()
+
+    upstream = FakeLLM(ttft=args.ttft, tokens_per_sec=args.tps, response_tokens=args.tokens)
+    base_url = start_upstream(upstream)
+    llm.router = LLMRouter(
+        [
+            Provider(
+                "bench",
+                llm.MODEL,
+                AsyncOpenAI(api_key="bench", base_url=base_url, max_retries=0),
+                OpenAI(api_key="bench", base_url=base_url, max_retries=0),
+            )
+        ]
+    )
+
+    measure("threadpool", run_threadpool, args.streams, upstream)
+    measure("async", run_async, args.streams, upstream)
+
+
+if __name__ == "__main__":
+    main()
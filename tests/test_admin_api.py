@@ -8,10 +8,11 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
-from app.db.database import Base, get_db
+from app.db.database import Base, get_async_db, get_db
 
 
 @pytest.fixture
@@ -28,6 +29,14 @@ def client():
             db.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    async_engine = create_async_engine("sqlite+aiosqlite:///./test_admin.db")
+    AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
@@ -61,6 +70,28 @@ def test_admin_can_access(client):
     assert resp.json()["code"] == 200
 
 
+
+def test_admin_user_search(client):
+    _, token = create_user_and_login(client, "admin@example.com", is_admin=True)
+    headers = {"Authorization": f"Bearer {token}"}
+    for email in ["alice@shop.example", "alicia@example.com", "bob_s@example.com", "bobxs@example.com"]:
+        create_user_and_login(client, email)
+
+    def search(q, **params):
+        resp = client.get("/api/v1/admin/users", headers=headers, params={"search": q, **params})
+        assert resp.status_code == 200
+        assert resp.json()["next_cursor"] is None
+        return [u["email"] for u in resp.json()["data"]]
+
+    assert search("ALIC") == ["alicia@example.com", "alice@shop.example"]
+    assert search("alic", limit=1) == ["alicia@example.com"]
+    assert search("b_s") == ["bob_s@example.com"]
+    # search results page with skip
+    assert search("example", limit=2) + search("example", skip=2, limit=2) == search("example", limit=4)
+    assert len(search("example", skip=2, limit=2)) == 2
+    cursor = client.get("/api/v1/admin/users", headers=headers, params={"search": "bob", "cursor": "x"})
+    assert cursor.status_code == 400
+
 def test_admin_create_and_delete_user(client):
     _, token = create_user_and_login(client, "admin2@example.com", is_admin=True)
     headers = {"Authorization": f"Bearer {token}"}
@@ -117,3 +148,21 @@ def test_admin_view_conversations_and_usage(client):
     usage = client.get(f"/api/v1/admin/users/{user_id}/usage", headers=admin_headers)
     assert usage.status_code == 200
     assert len(usage.json()["data"]) >= 1
+
+
+def test_admin_llm_metrics(client):
+    _, token = create_user_and_login(client, "metrics@example.com", is_admin=True)
+    resp = client.get("/api/v1/admin/metrics/llm", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert {"queue_depth", "wait_p95", "rejected"} <= set(data["admission"])
+    assert "openai" in data["providers"]
+
+
+def test_admin_db_metrics(client):
+    _, token = create_user_and_login(client, "dbmetrics@example.com", is_admin=True)
+    resp = client.get("/api/v1/admin/metrics/db", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert {"size", "checked_out", "overflow", "wait_p95", "timeouts"} <= set(data["sync"])
+    assert data["async"]["pool"] == "MeteredAsyncQueuePool"
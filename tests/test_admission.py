@@ -0,0 +1,107 @@
+import asyncio
+import os
+import sys
+import threading
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from app.services.admission import AdmissionController, OverCapacity
+
+PLANS = {
+    "free": {"llm_concurrency": 1, "priority": 1},
+    "pro": {"llm_concurrency": 2, "priority": 0},
+}
+
+
+def test_pro_waiters_are_admitted_first():
+    controller = AdmissionController(2, PLANS, queue_size=10, timeout=1)
+    order = []
+
+    async def run():
+        first = await controller.acquire("pro")
+        second = await controller.acquire("free")
+
+        async def wait(plan, name):
+            ticket = await controller.acquire(plan)
+            order.append(name)
+            ticket.release()
+
+        tasks = [asyncio.ensure_future(wait("free", "free-early"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(wait("pro", "pro-late")))
+        await asyncio.sleep(0)
+        assert controller.stats()["queue_depth"] == 2
+        first.release()
+        second.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["pro-late", "free-early"]
+    stats = controller.stats()
+    assert stats["active"] == 0 and stats["queue_depth"] == 0
+    assert stats["admitted"] == 4 and stats["max_queue_depth"] == 2
+
+
+def test_plan_pool_limits_free_users_only():
+    controller = AdmissionController(4, PLANS, queue_size=0, timeout=1)
+
+    async def run():
+        await controller.acquire("free")
+        with pytest.raises(OverCapacity) as exc:
+            await controller.acquire("free")
+        assert exc.value.status_code == 503
+        assert exc.value.headers["Retry-After"] == str(exc.value.retry_after)
+        await controller.acquire("pro")
+
+    asyncio.run(run())
+    assert controller.stats()["rejected"] == {"free": 1}
+
+
+def test_full_queue_displaces_lower_priority_and_times_out():
+    controller = AdmissionController(1, PLANS, queue_size=1, timeout=0.2)
+
+    async def run():
+        ticket = await controller.acquire("pro")
+        queued_free = asyncio.ensure_future(controller.acquire("free"))
+        await asyncio.sleep(0)
+        queued_pro = asyncio.ensure_future(controller.acquire("pro"))
+        with pytest.raises(OverCapacity):
+            await queued_free
+        with pytest.raises(OverCapacity):
+            await controller.acquire("free")
+        with pytest.raises(OverCapacity):
+            await queued_pro  # nobody released within the timeout
+        ticket.release()
+
+    asyncio.run(run())
+    stats = controller.stats()
+    assert stats["rejected"] == {"free": 2, "pro": 1}
+    assert stats["active"] == 0 and stats["queue_depth"] == 0
+
+
+def test_sync_and_async_callers_share_pools():
+    controller = AdmissionController(1, PLANS, queue_size=5, timeout=2)
+    admitted = threading.Event()
+
+    async def run():
+        ticket = await controller.acquire("pro")
+
+        def worker():
+            with controller.sync_slot("pro"):
+                admitted.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        while controller.stats()["queue_depth"] == 0:
+            await asyncio.sleep(0.01)
+        assert not admitted.is_set()
+        ticket.release()
+        await asyncio.get_running_loop().run_in_executor(None, thread.join)
+
+    asyncio.run(run())
+    assert admitted.is_set()
+    assert controller.stats()["active"] == 0
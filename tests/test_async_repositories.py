@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+from datetime import date
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base, async_database_url
+from app.repositories import aio
+from app.repositories import conversation as convo_repo
+from app.repositories import upload as upload_repo
+from app.repositories import user as user_repo
+from app.repositories.unit_of_work import record_chat_turn
+from app.schemas.user import UserCreate
+from app.services.search import async_search_conversations
+
+
+@pytest.fixture
+def seeded():
+    engine = create_engine("sqlite:///./test_aio.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    user = user_repo.create_user(db, UserCreate(provider="email", email="aio@example.com", password="pwd"))
+    conv = convo_repo.create_conversation(db, user.user_id, title="Async")
+    record_chat_turn(db, user.user_id, conv.conversation_id, "hello", "hi", 3)
+    ids = user.user_id, conv.conversation_id
+    db.close()
+    yield ids
+    engine.dispose()
+    os.remove("test_aio.db")
+
+
+def test_async_database_url():
+    assert async_database_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert async_database_url("sqlite:///./x.db") == "sqlite+aiosqlite:///./x.db"
+
+
+def test_async_repositories_read_same_rows(seeded):
+    user_id, conversation_id = seeded
+
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite:///./test_aio.db")
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            user = await aio.user.get_user(db, user_id)
+            convos = await async_search_conversations(db, user_id, "asy")
+            msgs = await aio.message.list_messages(db, conversation_id)
+            count = await aio.message.count_messages(db, conversation_id)
+            usage = await aio.usage.get_daily_usage(db, user_id, date.today())
+            uploads = await aio.upload.list_uploads(db, user_id)
+        await engine.dispose()
+        return user, convos, msgs, count, usage, uploads
+
+    user, convos, msgs, count, usage, uploads = asyncio.run(run())
+    assert user.email == "aio@example.com"
+    assert [c.conversation_id for c in convos] == [conversation_id]
+    assert [m.content["text"] for m in msgs] == ["hello", "hi"] and count == 2
+    assert usage.token_count == 3
+    assert uploads == []
+
+
+def test_async_uploads_page_by_key(seeded):
+    user_id, _ = seeded
+    engine = create_engine("sqlite:///./test_aio.db")
+    db = sessionmaker(bind=engine)()
+    created = [upload_repo.create_upload(db, user_id, "b", f"k{i}", None, 1) for i in range(3)]
+    newest_first = sorted(((u.created_at, u.upload_id) for u in created), reverse=True)
+    db.close()
+    engine.dispose()
+
+    async def run():
+        async_engine = create_async_engine("sqlite+aiosqlite:///./test_aio.db")
+        async with async_sessionmaker(async_engine, expire_on_commit=False)() as adb:
+            first = await aio.upload.list_uploads(adb, user_id, limit=2)
+            last = first[-1]
+            rest = await aio.upload.list_uploads(adb, user_id, limit=2, after=(last.created_at, last.upload_id))
+        await async_engine.dispose()
+        return first + rest
+
+    pages = asyncio.run(run())
+    assert [(u.created_at, u.upload_id) for u in pages] == newest_first
@@ -147,3 +147,24 @@ def test_otp_cannot_be_reused(client):
     bad = client.post("/api/v1/auth/verify-email", json={"email": email, "otp": otp})
     assert bad.status_code == 400
 
+
+
+def test_unreachable_redis_is_not_retried_every_call(monkeypatch):
+    from app.core import security
+
+    attempts = []
+
+    def from_url(url, **kwargs):
+        attempts.append(url)
+        raise ConnectionError("down")
+
+    monkeypatch.setattr(security.settings, "redis_url", "redis://down:6379/0")
+    monkeypatch.setattr(security, "redis_client", None)
+    monkeypatch.setattr(security, "_redis_retry_at", 0.0)
+    monkeypatch.setattr(security.redis, "from_url", from_url)
+    for _ in range(3):
+        assert security._get_redis_client() is None
+    assert len(attempts) == 1
+    monkeypatch.setattr(security, "_redis_retry_at", 0.0)
+    security._get_redis_client()
+    assert len(attempts) == 2
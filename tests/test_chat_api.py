@@ -8,10 +8,11 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
-from app.db.database import Base, get_db
+from app.db.database import Base, get_async_db, get_db
 
 
 @pytest.fixture
@@ -28,25 +29,39 @@ def client():
             db.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    async_engine = create_async_engine("sqlite+aiosqlite:///./test_chat.db")
+    AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
     os.remove("test_chat.db")
 
 
-def create_user_and_login(client):
-    client.post("/api/v1/users", json={"provider": "email", "email": "chat@example.com", "password": "pwd"})
-    resp = client.post("/api/v1/auth/login", json={"email": "chat@example.com", "password": "pwd"})
+def create_user_and_login(client, email="chat@example.com"):
+    client.post("/api/v1/users", json={"provider": "email", "email": email, "password": "pwd"})
+    resp = client.post("/api/v1/auth/login", json={"email": email, "password": "pwd"})
     return resp.json()["data"]["access_token"]
 
 
+def fake_llm(content, tokens):
+    async def _call(_messages, **_kwargs):
+        return content, tokens
+    return _call
+
+
 def test_chat_with_memory(client, monkeypatch):
     token = create_user_and_login(client)
     headers = {"Authorization": f"Bearer {token}"}
     conv = client.post("/api/v1/conversations", headers=headers, json={}).json()["data"]
     import app.api.v1.endpoints.chat as chat_ep
     monkeypatch.setattr(chat_ep, "check_chat_rate_limit", lambda _u: None)
-    monkeypatch.setattr(chat_ep, "chat_with_openai_history", lambda m: ("hi", 2))
+    monkeypatch.setattr(chat_ep, "async_chat_with_openai_history", fake_llm("hi", 2))
     resp = client.post("/api/v1/chat", headers=headers, json={"message": "hello", "conversation_id": conv["conversation_id"]})
     assert resp.status_code == 200
     data = resp.json()["data"]
@@ -55,14 +70,43 @@ def test_chat_with_memory(client, monkeypatch):
     assert len(msgs) == 2
 
 
+def test_chat_keeps_database_work_off_the_event_loop(client, monkeypatch):
+    import asyncio
+
+    import app.api.v1.endpoints.chat as chat_ep
+
+    token = create_user_and_login(client, "offloop@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    conv = client.post("/api/v1/conversations", headers=headers, json={}).json()["data"]
+    on_loop = []
+
+    def spy(func):
+        def wrapper(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(func.__name__)
+            except RuntimeError:
+                pass
+            return func(*args, **kwargs)
+        return wrapper
+
+    for name in ("check_chat_quota", "build_chat_context", "record_chat_turn"):
+        monkeypatch.setattr(chat_ep, name, spy(getattr(chat_ep, name)))
+    monkeypatch.setattr(chat_ep.convo_repo, "get_conversation", spy(chat_ep.convo_repo.get_conversation))
+    monkeypatch.setattr(chat_ep, "async_chat_with_openai_history", fake_llm("hi", 2))
+    resp = client.post("/api/v1/chat", headers=headers, json={"message": "hello", "conversation_id": conv["conversation_id"]})
+    assert resp.status_code == 200
+    assert on_loop == []
+
+
 def test_chat_openai_failure(client, monkeypatch):
     token = create_user_and_login(client)
     headers = {"Authorization": f"Bearer {token}"}
     conv = client.post("/api/v1/conversations", headers=headers, json={}).json()["data"]
     import app.api.v1.endpoints.chat as chat_ep
-    def fail(_):
+    async def fail(_, **_kwargs):
         raise RuntimeError("boom")
-    monkeypatch.setattr(chat_ep, "chat_with_openai_history", fail)
+    monkeypatch.setattr(chat_ep, "async_chat_with_openai_history", fail)
     resp = client.post("/api/v1/chat", headers=headers, json={"message": "hello", "conversation_id": conv["conversation_id"]})
     assert resp.status_code == 502
     assert resp.json()["data"]["source"] == "openai"
@@ -76,7 +120,7 @@ def test_chat_token_quota(client, monkeypatch):
     plans.PLANS["free"]["daily_tokens"] = 2
     import app.api.v1.endpoints.chat as chat_ep
     monkeypatch.setattr(chat_ep, "check_chat_rate_limit", lambda _u: None)
-    monkeypatch.setattr(chat_ep, "chat_with_openai_history", lambda m: ("ok", 1))
+    monkeypatch.setattr(chat_ep, "async_chat_with_openai_history", fake_llm("ok", 1))
     for _ in range(2):
         resp = client.post("/api/v1/chat", headers=headers, json={"message": "hello", "conversation_id": conv["conversation_id"]})
         assert resp.status_code == 200
@@ -93,10 +137,224 @@ def test_chat_message_quota(client, monkeypatch):
     plans.PLANS["free"]["daily_messages"] = 2
     import app.api.v1.endpoints.chat as chat_ep
     monkeypatch.setattr(chat_ep, "check_chat_rate_limit", lambda _u: None)
-    monkeypatch.setattr(chat_ep, "chat_with_openai_history", lambda m: ("ok", 1))
+    monkeypatch.setattr(chat_ep, "async_chat_with_openai_history", fake_llm("ok", 1))
     for _ in range(2):
         resp = client.post("/api/v1/chat", headers=headers, json={"message": "hi", "conversation_id": conv["conversation_id"]})
         assert resp.status_code == 200
     resp = client.post("/api/v1/chat", headers=headers, json={"message": "again", "conversation_id": conv["conversation_id"]})
     assert resp.status_code == 403
     plans.PLANS["free"]["daily_messages"] = original
+
+
+def test_chat_stream_persists_history(client, monkeypatch):
+    token = create_user_and_login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    conv = client.post("/api/v1/conversations", headers=headers, json={}).json()["data"]
+    import app.api.v1.endpoints.chat as chat_ep
+    monkeypatch.setattr(chat_ep, "check_chat_rate_limit", lambda _u: None)
+
+    async def fake_stream(_messages, state, **_kwargs):
+        for part in ("he", "llo"):
+            yield part
+        state["tokens"] = 3
+        state["response"] = "hello"
+
+    monkeypatch.setattr(chat_ep, "async_stream_openai_history", fake_stream)
+    resp = client.post(
+        "/api/v1/chat",
+        headers=headers,
+        params={"stream": True},
+        json={"message": "hi", "conversation_id": conv["conversation_id"]},
+    )
+    assert resp.status_code == 200
+    assert resp.text == "hello"
+    msgs = client.get(f"/api/v1/conversations/{conv['conversation_id']}/messages", headers=headers).json()["data"]
+    assert [m["content"]["text"] for m in msgs] == ["hi", "hello"]
+
+
+
+def test_chat_stream_uses_write_behind_queue(client, monkeypatch, tmp_path):
+    token = create_user_and_login(client, "wbstream@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    conv = client.post("/api/v1/conversations", headers=headers, json={}).json()["data"]
+    import app.api.v1.endpoints.chat as chat_ep
+    from app.services.write_behind import WriteBehindQueue
+    monkeypatch.setattr(chat_ep, "check_chat_rate_limit", lambda _u: None)
+
+    async def fake_stream(_messages, state, **_kwargs):
+        yield "queued"
+        state["tokens"] = 2
+        state["response"] = "queued"
+
+    monkeypatch.setattr(chat_ep, "async_stream_openai_history", fake_stream)
+    session_factory = app.dependency_overrides[get_db]
+    queue = WriteBehindQueue(lambda: next(session_factory()), str(tmp_path), flush_ms=10_000)
+    monkeypatch.setattr(chat_ep, "write_behind", queue)
+    monkeypatch.setattr(chat_ep.settings, "stream_write_behind", True)
+    queue.start()
+    resp = client.post(
+        "/api/v1/chat",
+        headers=headers,
+        params={"stream": True},
+        json={"message": "hi", "conversation_id": conv["conversation_id"]},
+    )
+    assert resp.text == "queued"
+    assert queue.stats()["pending"] == 1
+    queue.stop()
+    msgs = client.get(f"/api/v1/conversations/{conv['conversation_id']}/messages", headers=headers).json()["data"]
+    assert [m["content"]["text"] for m in msgs] == ["hi", "queued"]
+
+def parse_sse(text):
+    import json
+
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_sse_batches_deltas(client, monkeypatch):
+    token = create_user_and_login(client, "sse@example.com")
+    headers = {"Authorization": f"Bearer {token}", "Accept": "text/event-stream"}
+    conv = client.post("/api/v1/conversations", headers=headers, json={}).json()["data"]
+    import app.api.v1.endpoints.chat as chat_ep
+    monkeypatch.setattr(chat_ep, "check_chat_rate_limit", lambda _u: None)
+
+    async def fake_stream(_messages, state, **_kwargs):
+        for _ in range(100):
+            yield "x"
+        state["tokens"] = 42
+        state["response"] = "x" * 100
+
+    monkeypatch.setattr(chat_ep, "async_stream_openai_history", fake_stream)
+    resp = client.post(
+        "/api/v1/chat",
+        headers=headers,
+        params={"stream": True},
+        json={"message": "hi", "conversation_id": conv["conversation_id"]},
+    )
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(resp.text)
+    deltas = [data["text"] for name, data in events if name == "delta"]
+    assert "".join(deltas) == "x" * 100
+    assert len(deltas) < 100
+    assert events[-2:] == [("usage", {"tokens": 42}), ("done", {})]
+
+
+def test_chat_sse_error_event(client, monkeypatch):
+    token = create_user_and_login(client, "sse-error@example.com")
+    headers = {"Authorization": f"Bearer {token}", "Accept": "text/event-stream"}
+    conv = client.post("/api/v1/conversations", headers=headers, json={}).json()["data"]
+    import app.api.v1.endpoints.chat as chat_ep
+    monkeypatch.setattr(chat_ep, "check_chat_rate_limit", lambda _u: None)
+
+    async def failing_stream(_messages, state, **_kwargs):
+        yield "partial"
+        raise RuntimeError("upstream reset")
+
+    monkeypatch.setattr(chat_ep, "async_stream_openai_history", failing_stream)
+    resp = client.post(
+        "/api/v1/chat",
+        headers=headers,
+        params={"stream": True},
+        json={"message": "hi", "conversation_id": conv["conversation_id"]},
+    )
+    events = parse_sse(resp.text)
+    assert events[-1] == ("error", {"source": "openai", "reason": "upstream reset"})
+    msgs = client.get(f"/api/v1/conversations/{conv['conversation_id']}/messages", headers=headers).json()["data"]
+    assert msgs == []
+
+
+def test_chat_batch_fans_out_and_stores_history(client, monkeypatch):
+    token = create_user_and_login(client, email="batch@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    conv = client.post("/api/v1/conversations", headers=headers, json={}).json()["data"]
+    import asyncio
+    import app.api.v1.endpoints.chat as chat_ep
+    calls = []
+    active = {"now": 0, "peak": 0}
+
+    async def fake(messages, **_kwargs):
+        prompt = messages[-1]["content"]
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        calls.append(prompt)
+        if prompt == "boom":
+            raise RuntimeError("upstream down")
+        return f"re: {prompt}", 3
+
+    monkeypatch.setattr(chat_ep, "async_chat_with_openai_history", fake)
+    monkeypatch.setattr(chat_ep.settings, "chat_batch_concurrency", 2)
+    rate_checks = []
+    monkeypatch.setattr(chat_ep, "check_chat_rate_limit", rate_checks.append)
+    batch = [
+        {"message": "one", "conversation_id": conv["conversation_id"]},
+        {"message": "boom"},
+        {"message": "two", "conversation_id": conv["conversation_id"]},
+        {"message": "three"},
+    ]
+    resp = client.post("/api/v1/chat/batch", headers=headers, json={"requests": batch})
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert data["results"] == [
+        {"response": "re: one", "tokens": 3},
+        {"error": "OpenAI request failed"},
+        {"response": "re: two", "tokens": 3},
+        {"response": "re: three", "tokens": 3},
+    ]
+    assert data["tokens"] == 9
+    assert len(calls) == 4 and active["peak"] == 2
+    assert len(rate_checks) == 1
+    msgs = client.get(f"/api/v1/conversations/{conv['conversation_id']}/messages", headers=headers).json()["data"]
+    assert [m["content"]["text"] for m in msgs] == ["one", "re: one", "two", "re: two"]
+    usage = client.get("/api/v1/user/usage", headers=headers).json()["data"]
+    assert usage[0]["message_count"] == 3
+    assert usage[0]["token_count"] == 9
+
+
+def test_chat_batch_checks_quota_and_ownership(client, monkeypatch):
+    token = create_user_and_login(client, email="batchquota@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    import app.core.plans as plans
+    import app.api.v1.endpoints.chat as chat_ep
+    monkeypatch.setattr(chat_ep, "check_chat_rate_limit", lambda _u: None)
+    monkeypatch.setattr(chat_ep, "async_chat_with_openai_history", fake_llm("ok", 1))
+    monkeypatch.setitem(plans.PLANS["free"], "daily_messages", 2)
+    resp = client.post("/api/v1/chat/batch", headers=headers, json={"requests": [{"message": "a"}] * 3})
+    assert resp.status_code == 403
+    other = "00000000-0000-0000-0000-000000000000"
+    resp = client.post(
+        "/api/v1/chat/batch",
+        headers=headers,
+        json={"requests": [{"message": "a", "conversation_id": other}]},
+    )
+    assert resp.status_code == 404
+
+
+def test_chat_over_capacity_returns_503(client, monkeypatch):
+    token = create_user_and_login(client, "busy@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    import app.api.v1.endpoints.chat as chat_ep
+    from app.core.cache import LRUCache
+    from app.services import llm
+    from app.services.admission import AdmissionController
+    monkeypatch.setattr(chat_ep, "check_chat_rate_limit", lambda _u: None)
+    monkeypatch.setattr(llm, "_complete", fake_llm("hi", 1))
+    monkeypatch.setattr(llm, "response_cache", LRUCache(maxsize=8, ttl=60))
+    resp = client.post("/api/v1/chat", headers=headers, json={"message": "cached"})
+    assert resp.json()["data"] == {"response": "hi", "tokens": 1}
+
+    controller = AdmissionController(0, {}, queue_size=0)
+    monkeypatch.setattr(llm, "admission", controller)
+    # a cache hit makes no upstream call and needs no slot
+    resp = client.post("/api/v1/chat", headers=headers, json={"message": "cached"})
+    assert resp.json()["data"] == {"response": "hi", "tokens": 0}
+    resp = client.post("/api/v1/chat", headers=headers, json={"message": "hello"})
+    assert resp.status_code == 503
+    assert int(resp.headers["Retry-After"]) >= 1
+    resp = client.post("/api/v1/chat", headers=headers, params={"stream": True}, json={"message": "hello"})
+    assert resp.status_code == 503
+    assert controller.stats()["rejected"] == {"free": 2}
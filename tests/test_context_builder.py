@@ -0,0 +1,152 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.core import estimate_tokens
+from app.repositories import conversation as convo_repo
+from app.repositories import message as message_repo
+from app.repositories import user as user_repo
+from app.schemas.user import UserCreate
+from app.services.context import build_chat_context
+from app.services.llm import SYSTEM_PROMPT
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite:///./test_context.db", connect_args={"check_same_thread": False})
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        os.remove("test_context.db")
+
+
+def seed_conversation(db, texts):
+    user = user_repo.create_user(db, UserCreate(provider="email", email="ctx@example.com", password="pwd"))
+    conv = convo_repo.create_conversation(db, user.user_id)
+    start = datetime(2024, 1, 1)
+    # messages never predate their conversation
+    conv.created_at = start
+    for i, text in enumerate(texts):
+        msg = message_repo.create_message(
+            db, conv.conversation_id, None, {"text": text}, "user" if i % 2 == 0 else "ai"
+        )
+        msg.timestamp = start + timedelta(seconds=i)
+    db.commit()
+    return conv
+
+
+def test_context_keeps_newest_messages_within_budget(db):
+    texts = [f"message number {i}" for i in range(10)]
+    conv = seed_conversation(db, texts)
+    per_message = estimate_tokens(texts[0])
+    budget = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens("next") + 3 * per_message
+    history = build_chat_context(db, conv.conversation_id, "next", {"context_tokens": budget})
+    assert history[0]["role"] == "system"
+    assert [m["content"] for m in history[1:]] == texts[-3:] + ["next"]
+    assert [m["role"] for m in history[1:-1]] == ["assistant", "user", "assistant"]
+
+
+def test_context_uses_stored_token_counts(db):
+    conv = seed_conversation(db, ["old", "new"])
+    newest = message_repo.list_recent_messages(db, conv.conversation_id, limit=1)[0]
+    newest.token_count = 10_000
+    db.commit()
+    history = build_chat_context(db, conv.conversation_id, "hi", {"context_tokens": 2000})
+    assert [m["content"] for m in history] == [SYSTEM_PROMPT, "hi"]
+
+
+def test_context_without_conversation(db):
+    history = build_chat_context(db, None, "hello", {})
+    assert history == [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": "hello"},
+    ]
+
+
+def test_hot_conversation_served_from_history_cache(db, monkeypatch):
+    conv = seed_conversation(db, ["a", "b"])
+    build_chat_context(db, conv.conversation_id, "c", {})
+    message_repo.create_message(db, conv.conversation_id, None, {"text": "c"}, "user")
+    reply = message_repo.create_message(db, conv.conversation_id, None, {"text": "d"}, "ai")
+
+    import app.services.context as context
+
+    def no_db(*_args, **_kwargs):
+        raise AssertionError("history should come from the cache")
+
+    monkeypatch.setattr(context.message_repo, "list_recent_messages", no_db)
+    history = build_chat_context(db, conv.conversation_id, "e", {})
+    assert [m["content"] for m in history[1:]] == ["a", "b", "c", "d", "e"]
+
+    message_repo.update_message(db, reply, content={"text": "D"})
+    message_repo.delete_message(db, message_repo.get_message(db, reply.message_id))
+    history = build_chat_context(db, conv.conversation_id, "e", {})
+    assert [m["content"] for m in history[1:]] == ["a", "b", "c", "e"]
+
+
+def test_history_cache_invalidated_on_conversation_delete(db):
+    from app.core.history_cache import history_cache
+
+    conv = seed_conversation(db, ["a"])
+    build_chat_context(db, conv.conversation_id, "b", {})
+    assert history_cache.get(conv.conversation_id) is not None
+    convo_repo.delete_conversation(db, conv)
+    assert history_cache.get(conv.conversation_id) is None
+
+
+def test_stale_refill_does_not_overwrite_newer_write(db, monkeypatch):
+    from app.core.history_cache import history_cache
+    import app.services.context as context
+
+    conv = seed_conversation(db, ["a"])
+    history_cache.invalidate(conv.conversation_id)
+    list_recent = message_repo.list_recent_messages
+
+    def write_during_read(*args, **kwargs):
+        # the snapshot is taken, then another request commits a message
+        page = list_recent(*args, **kwargs)
+        message_repo.create_message(db, conv.conversation_id, None, {"text": "b"}, "ai")
+        return page
+
+    monkeypatch.setattr(context.message_repo, "list_recent_messages", write_during_read)
+    build_chat_context(db, conv.conversation_id, "c", {})
+    assert history_cache.get(conv.conversation_id) is None
+
+    monkeypatch.setattr(context.message_repo, "list_recent_messages", list_recent)
+    history = build_chat_context(db, conv.conversation_id, "c", {})
+    assert [m["content"] for m in history[1:]] == ["a", "b", "c"]
+
+
+def test_redis_history_writers_do_not_lose_appends(db, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    import app.core.cache as cache_module
+    from app.core.history_cache import HistoryCache
+
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(cache_module, "_get_redis_client", lambda: client)
+    first, second = (HistoryCache("redis", 100, 60, 50) for _ in range(2))
+    conv = seed_conversation(db, ["a"])
+    cid = conv.conversation_id
+    first.put(cid, [], complete=True)
+
+    stale, version = first._store.get_versioned(str(cid))
+    second.append(message_repo.create_message(db, cid, None, {"text": "b"}, "ai"))
+    assert not first.put(cid, stale["messages"], True, version)
+    assert [m["content"] for m in first.get(cid)["messages"]] == ["b"]
+
+    first.invalidate(cid)
+    assert second.get(cid) is None
+    assert not second.put(cid, [], True, version)
@@ -8,10 +8,11 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
-from app.db.database import Base, get_db
+from app.db.database import Base, get_async_db, get_db
 from app.repositories import user as user_repo
 from app.schemas.user import UserCreate
 
@@ -32,6 +33,14 @@ def client():
             db.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    async_engine = create_async_engine("sqlite+aiosqlite:///./test_conv.db")
+    AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
@@ -122,7 +131,7 @@ def test_token_limit_enforced(client, monkeypatch):
     plans.PLANS["free"]["daily_tokens"] = 2
     import app.api.v1.endpoints.conversations as conv_ep
 
-    monkeypatch.setattr(conv_ep, "chat_with_openai", lambda m: ("ok", 1))
+    monkeypatch.setattr(conv_ep, "chat_with_openai", lambda m, **_: ("ok", 1))
     orig_rate = conv_ep.check_message_rate_limit
     conv_ep.check_message_rate_limit = lambda _u: None
     try:
@@ -224,6 +233,14 @@ def test_search_and_bulk_delete(client):
         ids.append(resp.json()["data"]["conversation_id"])
     resp = client.get("/api/v1/conversations", headers=headers, params={"q": "Topic 1"})
     assert len(resp.json()["data"]) == 1
+    titles = [
+        c["title"]
+        for skip in range(3)
+        for c in client.get(
+            "/api/v1/conversations", headers=headers, params={"q": "topic", "skip": skip, "limit": 1}
+        ).json()["data"]
+    ]
+    assert titles == ["Topic 2", "Topic 1", "Topic 0"]
     del_resp = client.delete(
         "/api/v1/conversations", headers=headers, params=[("ids", i) for i in ids]
     )
@@ -283,13 +300,50 @@ def test_export_and_search(client):
     assert len(search.json()["data"]) == 1
 
 
+
+def test_search_filters_and_highlights(client):
+    _, headers = create_auth(client)
+    first = client.post("/api/v1/conversations", headers=headers, json={"title": "A"}).json()["data"]["conversation_id"]
+    second = client.post("/api/v1/conversations", headers=headers, json={"title": "B"}).json()["data"]["conversation_id"]
+    for cid, text, kind in [
+        (first, "Deploy the Rocket today", "user"),
+        (first, "rocket fuel is low", "ai"),
+        (second, "no rockets here? rocket!", "user"),
+        (second, "100% done_now", "user"),
+        (second, "<b onclick=x>Rocket</b> & co", "ai"),
+    ]:
+        client.post(
+            f"/api/v1/conversations/{cid}/messages",
+            headers=headers,
+            json={"content": {"text": text}, "message_type": kind},
+        )
+
+    def search(**params):
+        resp = client.get("/api/v1/messages/search", headers=headers, params=params)
+        assert resp.status_code == 200
+        return resp.json()["data"]
+
+    assert len(search(q="rocket")) == 4
+    assert [m["conversation_id"] for m in search(q="rocket", conversation_id=first)] == [first, first]
+    only_ai = search(q="rocket", message_type="ai")
+    assert [m["highlight"] for m in only_ai] == [
+        "&lt;b onclick=x&gt;<mark>Rocket</mark>&lt;/b&gt; &amp; co",
+        "<mark>rocket</mark> fuel is low",
+    ]
+    assert len(search(q="rocket", limit=2)) == 2
+    assert len(search(q="rocket", skip=2)) == 2
+    # JSON keys and LIKE wildcards do not match
+    assert search(q="text") == []
+    assert search(q="%")[0]["highlight"] == "100<mark>%</mark> done_now"
+    assert search(q="o_e") == []
+
 def test_llm_trigger_tool(client, monkeypatch):
     _, headers = create_auth(client)
     conv = client.post("/api/v1/conversations", headers=headers, json={}).json()["data"]
     cid = conv["conversation_id"]
     import app.api.v1.endpoints.conversations as conv_ep
 
-    monkeypatch.setattr(conv_ep, "chat_with_openai", lambda m: ("ok", 1))
+    monkeypatch.setattr(conv_ep, "chat_with_openai", lambda m, **_: ("ok", 1))
     monkeypatch.setattr(conv_ep, "check_message_rate_limit", lambda _u: None)
 
     resp = client.post(
@@ -301,3 +355,102 @@ def test_llm_trigger_tool(client, monkeypatch):
     msgs = client.get(f"/api/v1/conversations/{cid}/messages", headers=headers).json()["data"]
     assert len(msgs) == 2
     assert msgs[-1]["message_type"] == "ai"
+
+
+def test_llm_reply_as_background_job(client, monkeypatch):
+    import threading
+    import time
+
+    _, headers = create_auth(client)
+    conv = client.post("/api/v1/conversations", headers=headers, json={}).json()["data"]
+    cid = conv["conversation_id"]
+    import app.api.v1.endpoints.conversations as conv_ep
+
+    release = threading.Event()
+
+    def slow_llm(_m, **_):
+        release.wait(5)
+        return "later", 4
+
+    monkeypatch.setattr(conv_ep, "chat_with_openai", slow_llm)
+    monkeypatch.setitem(conv_ep.PLANS["free"], "daily_tokens", 5000)
+    monkeypatch.setattr(conv_ep, "check_message_rate_limit", lambda _u: None)
+    monkeypatch.setattr(conv_ep, "check_chat_rate_limit", lambda _u: None)
+
+    resp = client.post(
+        f"/api/v1/conversations/{cid}/messages",
+        headers=headers,
+        json={"content": {"text": "hi"}, "message_type": "user", "invoke_llm": True, "background": True},
+    )
+    assert resp.status_code == 202
+    data = resp.json()["data"]
+    assert data["message"]["content"] == {"text": "hi"}
+    job_id = data["job"]["job_id"]
+    assert data["job"]["status"] in {"queued", "running"}
+    msgs = client.get(f"/api/v1/conversations/{cid}/messages", headers=headers).json()["data"]
+    assert len(msgs) == 1
+
+    release.set()
+    for _ in range(100):
+        job = client.get(f"/api/v1/jobs/{job_id}", headers=headers).json()["data"]
+        if job["status"] == "succeeded":
+            break
+        time.sleep(0.02)
+    assert job["status"] == "succeeded", job["error"]
+    assert job["result"]["content"] == {"text": "later"}
+    msgs = client.get(f"/api/v1/conversations/{cid}/messages", headers=headers).json()["data"]
+    assert [m["message_type"] for m in msgs] == ["user", "ai"]
+
+    events = client.get(f"/api/v1/jobs/{job_id}/events", headers=headers).text
+    assert events.startswith("event: status\n")
+    assert '"status": "succeeded"' in events
+    assert events.endswith("event: done\ndata: {}\n\n")
+
+    _, other = create_auth(client)
+    assert client.get(f"/api/v1/jobs/{job_id}", headers=other).status_code == 404
+
+
+def test_cursor_pagination(client, monkeypatch):
+    import app.api.v1.endpoints.conversations as conv_ep
+
+    monkeypatch.setattr(conv_ep, "check_message_rate_limit", lambda _u: None)
+    token = create_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(5):
+        client.post("/api/v1/conversations", headers=headers, json={"title": f"c{i}"})
+    everything = client.get("/api/v1/conversations", headers=headers).json()
+    assert everything["next_cursor"] is None
+    expected = [c["conversation_id"] for c in everything["data"]]
+
+    seen, cursor = [], None
+    for _ in range(5):
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/v1/conversations", headers=headers, params=params).json()
+        seen += [c["conversation_id"] for c in body["data"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+    conv_id = expected[0]
+    for i in range(3):
+        client.post(
+            f"/api/v1/conversations/{conv_id}/messages",
+            headers=headers,
+            json={"content": {"text": f"m{i}"}, "message_type": "user"},
+        )
+    first = client.get(f"/api/v1/conversations/{conv_id}/messages", headers=headers, params={"limit": 2}).json()
+    assert [m["content"]["text"] for m in first["data"]] == ["m0", "m1"]
+    rest = client.get(
+        f"/api/v1/conversations/{conv_id}/messages",
+        headers=headers,
+        params={"limit": 2, "cursor": first["next_cursor"]},
+    ).json()
+    assert [m["content"]["text"] for m in rest["data"]] == ["m2"]
+    assert rest["next_cursor"] is None
+    # offset paging still works
+    offset = client.get(f"/api/v1/conversations/{conv_id}/messages", headers=headers, params={"skip": 2}).json()
+    assert [m["content"]["text"] for m in offset["data"]] == ["m2"]
+
+    resp = client.get("/api/v1/conversations", headers=headers, params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400
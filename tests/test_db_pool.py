@@ -0,0 +1,70 @@
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+
+from app.core import settings
+from app.db.pool import MeteredAsyncQueuePool, MeteredQueuePool, engine_options, pool_stats
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=MeteredQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.05,
+    )
+    yield engine
+    engine.dispose()
+
+
+def test_pool_stats_track_checkouts_and_overflow(engine):
+    first = engine.connect()
+    second = engine.connect()
+    first.execute(text("select 1"))
+    stats = pool_stats(engine)
+    assert stats["checked_out"] == 2
+    assert stats["overflow"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["wait_p95"] is not None
+
+    with pytest.raises(PoolTimeout):
+        engine.connect()
+    assert pool_stats(engine)["timeouts"] == 1
+
+    first.close()
+    second.close()
+    stats = pool_stats(engine)
+    assert stats["checked_out"] == 0
+    assert stats["checked_in"] == 1
+
+
+def test_engine_options_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, "db_pool_size", 20)
+    monkeypatch.setattr(settings, "db_pool_recycle", 300)
+    options = engine_options("postgresql://u:p@db/app")
+    assert options["poolclass"] is MeteredQueuePool
+    assert options["pool_size"] == 20
+    assert options["pool_recycle"] == 300
+    assert options["pool_pre_ping"] is True
+    assert "connect_args" not in options
+    assert engine_options("sqlite:///./app.db") == {}
+
+
+def test_pgbouncer_mode_disables_statement_caches(monkeypatch):
+    monkeypatch.setattr(settings, "db_pgbouncer", True)
+    options = engine_options("postgresql+asyncpg://u:p@db/app", is_async=True)
+    assert options["poolclass"] is MeteredAsyncQueuePool
+    args = options["connect_args"]
+    assert args["statement_cache_size"] == 0
+    assert args["prepared_statement_cache_size"] == 0
+    assert args["prepared_statement_name_func"]() != args["prepared_statement_name_func"]()
+    assert "connect_args" not in engine_options("postgresql://u:p@db/app")
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+import uvicorn
+from openai import AsyncOpenAI, InternalServerError
+
+from app.fake_llm import FakeLLM
+from app.services.llm_router import LLMRouter, Provider
+
+MESSAGES = [{"role": "user", "content": "hello there"}]
+
+
+@pytest.fixture(scope="module")
+def server():
+    fake = FakeLLM()
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    uv = uvicorn.Server(uvicorn.Config(fake.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=uv.run, daemon=True)
+    thread.start()
+    while not uv.started:
+        time.sleep(0.01)
+    yield fake, f"http://127.0.0.1:{port}/v1"
+    uv.should_exit = True
+    thread.join()
+
+
+@pytest.fixture
+def fake_server(server):
+    fake, base_url = server
+    fake.ttft, fake.tokens_per_sec, fake.response_tokens, fake.error_rate = 0, 1000, 8, 0.0
+    fake.reset()
+    return fake, base_url
+
+
+def make_client(base_url):
+    return AsyncOpenAI(api_key="fake", base_url=base_url, max_retries=0)
+
+
+def test_fake_llm_is_deterministic(fake_server):
+    fake, base_url = fake_server
+    client = make_client(base_url)
+
+    async def run():
+        first = await client.chat.completions.create(model="gpt-4", messages=MESSAGES)
+        second = await client.chat.completions.create(model="gpt-4", messages=MESSAGES)
+        other = await client.chat.completions.create(
+            model="gpt-4", messages=[{"role": "user", "content": "something else"}]
+        )
+        return first, second, other
+
+    first, second, other = asyncio.run(run())
+    assert first.choices[0].message.content == second.choices[0].message.content
+    assert first.choices[0].message.content != other.choices[0].message.content
+    assert first.usage.completion_tokens == 8
+    assert first.usage.total_tokens == first.usage.prompt_tokens + 8
+
+
+def test_fake_llm_streams_same_reply_with_usage(fake_server):
+    fake, base_url = fake_server
+    fake.response_tokens = 5
+    client = make_client(base_url)
+
+    async def run():
+        full = await client.chat.completions.create(model="gpt-4", messages=MESSAGES)
+        stream = await client.chat.completions.create(
+            model="gpt-4", messages=MESSAGES, stream=True, stream_options={"include_usage": True}
+        )
+        parts, usage = [], None
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            if chunk.usage:
+                usage = chunk.usage
+        return full, parts, usage
+
+    full, parts, usage = asyncio.run(run())
+    assert len(parts) == 5
+    assert "".join(parts) == full.choices[0].message.content
+    assert usage.total_tokens == full.usage.total_tokens
+    assert fake.peak == 1 and fake.active == 0
+
+
+def test_fake_llm_injects_errors_through_router(fake_server):
+    fake, base_url = fake_server
+    fake.error_rate = 1.0
+    router = LLMRouter([Provider("fake", "gpt-4", make_client(base_url), None)])
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(router.complete(MESSAGES))
+    assert fake.errors == 1
+    assert router.stats()["fake"]["errors"] == 1
+
+
+def test_fake_llm_error_status(fake_server):
+    fake, base_url = fake_server
+    fake.error_rate = 1.0
+    client = make_client(base_url)
+    with pytest.raises(InternalServerError):
+        asyncio.run(client.chat.completions.create(model="gpt-4", messages=MESSAGES))
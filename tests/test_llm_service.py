@@ -0,0 +1,423 @@
+import os
+import sys
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from app.core.cache import LRUCache
+from app.services import llm
+from app.services.llm_router import CircuitBreaker, LLMRouter, Provider
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=f"reply {self.calls}"))],
+            usage=SimpleNamespace(total_tokens=7),
+        )
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    completions = FakeCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(llm, "router", LLMRouter([Provider("fake", "gpt-4", None, client)]))
+    monkeypatch.setattr(llm, "response_cache", LRUCache(maxsize=2, ttl=60))
+    return completions
+
+
+def test_response_cache_hit_skips_upstream(fake_openai):
+    assert llm.chat_with_openai("hi", use_cache=True) == ("reply 1", 7)
+    assert llm.chat_with_openai("  hi ", use_cache=True) == ("reply 1", 0)
+    assert fake_openai.calls == 1
+    assert llm.response_cache.stats()["hits"] == 1
+    assert llm.response_cache.stats()["misses"] == 1
+
+
+def test_response_cache_opt_out(fake_openai):
+    llm.chat_with_openai("hi")
+    llm.chat_with_openai("hi")
+    assert fake_openai.calls == 2
+    assert len(llm.response_cache) == 0
+
+
+def test_lru_cache_evicts_and_expires(monkeypatch):
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    import app.core.cache as cache_mod
+
+    now = cache_mod.time.monotonic()
+    monkeypatch.setattr(cache_mod.time, "monotonic", lambda: now + 11)
+    assert cache.get("a") is None
+
+
+def test_single_flight_shares_one_upstream_call(monkeypatch):
+    import asyncio
+
+    calls = []
+
+    async def fake_complete(messages):
+        calls.append(messages)
+        await asyncio.sleep(0.05)
+        return "shared", 9
+
+    monkeypatch.setattr(llm, "_complete", fake_complete)
+    history = [{"role": "user", "content": "hi"}]
+
+    async def run():
+        return await asyncio.gather(
+            llm.async_chat_with_openai_history(history, scope="conv"),
+            llm.async_chat_with_openai_history(history, scope="conv"),
+            llm.async_chat_with_openai_history(history, scope="other"),
+        )
+
+    results = asyncio.run(run())
+    assert results == [("shared", 9), ("shared", 0), ("shared", 9)]
+    assert len(calls) == 2
+
+
+def test_single_flight_followers_take_no_admission_slot(monkeypatch):
+    import asyncio
+
+    from app.services.admission import AdmissionController
+
+    async def fake_complete(messages):
+        await asyncio.sleep(0.05)
+        return "shared", 9
+
+    controller = AdmissionController(1, {}, queue_size=0)
+    monkeypatch.setattr(llm, "_complete", fake_complete)
+    monkeypatch.setattr(llm, "admission", controller)
+    history = [{"role": "user", "content": "hi"}]
+
+    async def run():
+        return await asyncio.gather(
+            *(llm.async_chat_with_openai_history(history, scope="conv", plan="free") for _ in range(3))
+        )
+
+    assert asyncio.run(run()) == [("shared", 9), ("shared", 0), ("shared", 0)]
+    assert controller.stats()["admitted"] == 1 and controller.stats()["rejected"] == {}
+
+
+def test_single_flight_fans_out_stream(monkeypatch):
+    import asyncio
+
+    upstreams = []
+
+    async def fake_stream(messages, state):
+        upstreams.append(messages)
+        for part in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield part
+        state["tokens"] = 5
+
+    monkeypatch.setattr(llm, "_stream", fake_stream)
+    history = [{"role": "user", "content": "hi"}]
+
+    async def consume(state):
+        return "".join([d async for d in llm.async_stream_openai_history(history, state, scope="conv")])
+
+    async def run():
+        first, second = {}, {}
+        texts = await asyncio.gather(consume(first), consume(second))
+        return texts, first, second
+
+    texts, first, second = asyncio.run(run())
+    assert texts == ["abc", "abc"]
+    assert len(upstreams) == 1
+    assert (first["tokens"], second["tokens"]) == (5, 0)
+    assert first["response"] == second["response"] == "abc"
+
+
+def test_single_flight_stream_holds_one_slot_for_the_upstream(monkeypatch):
+    import asyncio
+
+    from app.services.admission import AdmissionController
+
+    async def fake_stream(messages, state):
+        for part in ("a", "b"):
+            await asyncio.sleep(0.01)
+            yield part
+        state["tokens"] = 5
+
+    controller = AdmissionController(1, {}, queue_size=0)
+    monkeypatch.setattr(llm, "_stream", fake_stream)
+    monkeypatch.setattr(llm, "admission", controller)
+    history = [{"role": "user", "content": "hi"}]
+
+    async def consume():
+        state = {}
+        text = "".join([d async for d in llm.async_stream_openai_history(history, state, scope="c", plan="free")])
+        return text, state["tokens"]
+
+    async def run():
+        return await asyncio.gather(consume(), consume())
+
+    assert asyncio.run(run()) == [("ab", 5), ("ab", 0)]
+    stats = controller.stats()
+    assert (stats["admitted"], stats["active"], stats["rejected"]) == (1, 0, {})
+
+
+def test_single_flight_bills_follower_when_leader_leaves(monkeypatch):
+    import asyncio
+
+    async def fake_stream(messages, state):
+        for part in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield part
+        state["tokens"] = 5
+
+    monkeypatch.setattr(llm, "_stream", fake_stream)
+    history = [{"role": "user", "content": "hi"}]
+
+    async def leave_early(state):
+        stream = llm.async_stream_openai_history(history, state, scope="conv")
+        await stream.__anext__()
+        await stream.aclose()
+
+    async def consume(state):
+        return "".join([d async for d in llm.async_stream_openai_history(history, state, scope="conv")])
+
+    async def run():
+        leader, follower = {}, {}
+        _, text = await asyncio.gather(leave_early(leader), consume(follower))
+        return text, leader, follower
+
+    text, leader, follower = asyncio.run(run())
+    assert text == "abc"
+    assert leader["truncated"] and leader["tokens"] == 0
+    assert follower["tokens"] == 5
+
+
+def test_stream_truncated_when_consumer_leaves(monkeypatch):
+    import asyncio
+
+    closed = []
+
+    async def fake_stream(messages, state):
+        try:
+            for part in ("first", "second", "third"):
+                yield part
+                await asyncio.sleep(0.01)
+            state["tokens"] = 100
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(llm, "_stream", fake_stream)
+    history = [{"role": "user", "content": "hello there"}]
+
+    async def run():
+        state = {}
+        stream = llm.async_stream_openai_history(history, state)
+        assert await stream.__anext__() == "first"
+        await stream.aclose()
+        return state
+
+    state = asyncio.run(run())
+    assert closed == [True]
+    assert state["truncated"] is True
+    assert state["response"] == "first"
+    assert 0 < state["tokens"] < 100
+
+
+def test_streaming_response_finalizes_on_disconnect():
+    import asyncio
+
+    from starlette.background import BackgroundTask
+
+    from app.api.streaming import ChatStreamingResponse
+
+    events = []
+
+    async def body():
+        try:
+            yield "a"
+            await asyncio.sleep(10)
+            yield "b"
+        finally:
+            events.append("closed")
+
+    async def run():
+        sent = asyncio.Event()
+
+        async def receive():
+            await sent.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message.get("body"):
+                sent.set()
+
+        response = ChatStreamingResponse(
+            body(), background=BackgroundTask(lambda: events.append("finalized"))
+        )
+        scope = {"type": "http", "asgi": {"spec_version": "2.3"}}
+        await asyncio.wait_for(response(scope, receive, send), 2)
+
+    asyncio.run(run())
+    assert events == ["closed", "finalized"]
+
+
+class FakeAsyncCompletions:
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        import asyncio
+
+        from openai import APIConnectionError
+
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise APIConnectionError(request=None)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.name))],
+            usage=SimpleNamespace(total_tokens=1),
+        )
+
+
+def make_provider(completions, breaker=None):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return Provider(completions.name, "gpt-4", client, None, breaker=breaker or CircuitBreaker())
+
+
+def test_router_fails_over_and_opens_circuit():
+    import asyncio
+
+    bad = FakeAsyncCompletions("bad", fail=True)
+    good = FakeAsyncCompletions("good")
+    router = LLMRouter([make_provider(bad, CircuitBreaker(failure_threshold=2)), make_provider(good)])
+
+    for _ in range(3):
+        response = asyncio.run(router.complete([{"role": "user", "content": "hi"}]))
+        assert response.choices[0].message.content == "good"
+    assert bad.calls == 2
+    stats = router.stats()
+    assert stats["bad"]["circuit"] == "open"
+    assert stats["bad"]["errors"] == 2
+    assert stats["good"]["requests"] == 3
+
+
+def test_router_hedges_slow_primary():
+    import asyncio
+
+    slow = FakeAsyncCompletions("slow", delay=1.0)
+    fast = FakeAsyncCompletions("fast", delay=0.01)
+    router = LLMRouter([make_provider(slow), make_provider(fast)], hedge=True, hedge_delay=0.05)
+
+    response = asyncio.run(router.complete([{"role": "user", "content": "hi"}]))
+    assert response.choices[0].message.content == "fast"
+    assert slow.calls == 1 and fast.calls == 1
+    assert router.stats()["slow"]["requests"] == 0
+
+
+def test_circuit_breaker_half_open_trial(monkeypatch):
+    import app.services.llm_router as router_mod
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=10)
+    breaker.record_failure()
+    assert not breaker.allow()
+    now = router_mod.time.monotonic()
+    monkeypatch.setattr(router_mod.time, "monotonic", lambda: now + 11)
+    assert breaker.allow()
+    assert breaker.begin()
+    assert not breaker.allow() and not breaker.begin()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_router_skips_provider_whose_trial_was_taken(monkeypatch):
+    import asyncio
+
+    import app.services.llm_router as router_mod
+
+    flaky = FakeAsyncCompletions("flaky")
+    good = FakeAsyncCompletions("good")
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=10)
+    breaker.record_failure()
+    router = LLMRouter([make_provider(flaky, breaker), make_provider(good)])
+    now = router_mod.time.monotonic()
+    monkeypatch.setattr(router_mod.time, "monotonic", lambda: now + 11)
+
+    candidates = router.available()
+    assert [p.name for p in candidates] == ["flaky", "good"]
+    # another request reserves the half-open trial before this one launches
+    assert breaker.begin()
+    started = []
+
+    async def start(provider):
+        started.append(provider.name)
+        return provider.name
+
+    assert asyncio.run(router._race(candidates, start, 1.0)) == "good"
+    assert started == ["good"]
+    with pytest.raises(RuntimeError, match="No LLM provider available"):
+        asyncio.run(router._race(candidates[:1], start, 1.0))
+
+    sync_calls = []
+    monkeypatch.setattr(router, "available", lambda: [candidates[0]])
+    candidates[0].sync_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kw: sync_calls.append(kw)))
+    )
+    with pytest.raises(RuntimeError, match="No LLM provider available"):
+        router.complete_sync([{"role": "user", "content": "hi"}])
+    assert sync_calls == []
+
+
+def test_router_closes_every_losing_stream():
+    import asyncio
+
+    closed = []
+
+    async def run():
+        both_started = asyncio.Event()
+        started = []
+
+        async def opened(provider):
+            # the hedge finishes in the same wake-up as the primary
+            started.append(provider)
+            if len(started) == 2:
+                both_started.set()
+            await both_started.wait()
+            return provider, SimpleNamespace(close=lambda: closed.append(provider.name) or asyncio.sleep(0))
+
+        return await router._race(providers, opened, 0.01, discard=router._discard_stream)
+
+    providers = [make_provider(FakeAsyncCompletions(name)) for name in ("a", "b")]
+    router = LLMRouter(providers, hedge=True)
+    winner, _ = asyncio.run(run())
+    assert closed == [p.name for p in providers if p is not winner]
+
+
+def test_complete_sync_frees_trial_on_unexpected_error(monkeypatch):
+    import app.services.llm_router as router_mod
+
+    def create(**kwargs):
+        raise ValueError("bad payload")
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=10)
+    breaker.record_failure()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    router = LLMRouter([Provider("flaky", "gpt-4", None, client, breaker=breaker)])
+    now = router_mod.time.monotonic()
+    monkeypatch.setattr(router_mod.time, "monotonic", lambda: now + 11)
+    with pytest.raises(ValueError):
+        router.complete_sync([{"role": "user", "content": "hi"}])
+    assert breaker.state == "half-open" and breaker.allow()
@@ -0,0 +1,112 @@
+import os
+import sys
+import uuid
+from datetime import date
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
+
+from app.db.database import Base
+from app.db.partitions import PartitionMaintainer, add_months, ensure_message_partitions, maintenance_enabled
+from app.models.message import Message
+from app.repositories import conversation as convo_repo
+from app.repositories import message as message_repo
+from app.repositories import user as user_repo
+from app.schemas.user import UserCreate
+
+
+class FakeConnection:
+    """Records statements and reports ``existing`` partitions."""
+
+    dialect = postgresql.dialect()
+
+    def __init__(self, existing):
+        self.existing = existing
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+        return SimpleNamespace(scalars=lambda: iter(self.existing))
+
+
+def test_add_months_rolls_over_years():
+    assert add_months(date(2026, 11, 1), 1) == date(2026, 12, 1)
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), 25) == date(2028, 2, 1)
+
+
+def test_messages_table_is_range_partitioned_on_postgres():
+    ddl = str(CreateTable(Message.__table__).compile(dialect=postgresql.dialect()))
+    assert "PRIMARY KEY (message_id, timestamp)" in ddl
+    assert ddl.rstrip().endswith("PARTITION BY RANGE (timestamp)")
+
+
+def test_creates_missing_months_ahead_and_default():
+    connection = FakeConnection(["messages_y2026m12"])
+    created = ensure_message_partitions(connection, today=date(2026, 11, 17), months_ahead=2)
+    assert created == ["messages_y2026m11", "messages_y2027m01"]
+    ddl = connection.statements[1:]
+    assert "messages_y2026m11 PARTITION OF messages FOR VALUES FROM ('2026-11-01') TO ('2026-12-01')" in ddl[0]
+    assert "FROM ('2027-01-01') TO ('2027-02-01')" in ddl[1]
+    assert ddl[2].endswith("messages_default PARTITION OF messages DEFAULT")
+
+
+def test_maintenance_defaults_to_on_for_postgres(monkeypatch):
+    from app.core import settings
+
+    postgres = SimpleNamespace(dialect=postgresql.dialect())
+    sqlite = create_engine("sqlite://")
+    monkeypatch.setattr(settings, "message_partition_maintenance", None)
+    assert maintenance_enabled(postgres) and not maintenance_enabled(sqlite)
+    monkeypatch.setattr(settings, "message_partition_maintenance", False)
+    assert not maintenance_enabled(postgres)
+
+
+def test_startup_check_logs_missing_next_month(caplog):
+    def maintainer(existing):
+        connection = FakeConnection(existing)
+        return PartitionMaintainer(SimpleNamespace(connect=lambda: nullcontext(connection)))
+
+    assert maintainer(["messages_y2026m12"]).check(today=date(2026, 11, 17))
+    assert not caplog.records
+    assert not maintainer(["messages_y2026m11"]).check(today=date(2026, 11, 17))
+    assert "messages_y2026m12 is missing" in caplog.text
+
+
+def test_other_databases_are_left_alone(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plain.db'}")
+    with engine.begin() as connection:
+        assert ensure_message_partitions(connection) == []
+
+
+def test_conversation_queries_bound_timestamp_for_pruning(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'prune.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    user = user_repo.create_user(db, UserCreate(email="prune@example.com", provider="email", password="pw"))
+    conversation = convo_repo.create_conversation(db, user.user_id, title="p")
+    first = message_repo.create_message(db, conversation.conversation_id, user.user_id, {"text": "one"}, "user")
+    message_repo.create_message(db, conversation.conversation_id, None, {"text": "two"}, "ai")
+    conversation_id = conversation.conversation_id
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert [m.content["text"] for m in message_repo.list_messages(db, conversation_id)] == ["one", "two"]
+    after = (first.timestamp, first.message_id)
+    assert [m.content["text"] for m in message_repo.list_messages(db, conversation_id, after=after)] == ["two"]
+    assert message_repo.count_messages(db, conversation_id) == 2
+    assert len(message_repo.list_recent_messages(db, conversation_id)) == 2
+    assert message_repo.count_messages(db, uuid.uuid4()) == 0
+    assert message_repo.get_message(db, first.message_id, conversation_id).message_id == first.message_id
+    assert message_repo.get_message(db, first.message_id, uuid.uuid4()) is None
+    selects = [s for s in statements if "FROM messages" in s]
+    assert selects and all('messages.timestamp >= coalesce((SELECT conversations.created_at' in s for s in selects)
+    db.close()
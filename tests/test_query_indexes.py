@@ -0,0 +1,168 @@
+import os
+import sys
+import uuid
+from datetime import date, datetime
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.models.message import Message
+from app.repositories import conversation as convo_repo
+from app.repositories import message as message_repo
+from app.repositories import upload as upload_repo
+from app.repositories import usage as usage_repo
+from app.repositories import user as user_repo
+from app.models.conversation import Conversation
+from app.models.user import User
+from app.schemas.user import UserCreate
+from app.services import search
+
+USER_ID = uuid.uuid4()
+CONVERSATION_ID = uuid.uuid4()
+AFTER = (datetime(2026, 1, 1), uuid.uuid4())
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def query_plan(db, call):
+    """Run ``call`` and return the EXPLAIN QUERY PLAN of each SELECT it issued."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        call()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    assert statements
+    connection = db.connection().connection
+    return [
+        " | ".join(row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters))
+        for statement, parameters in statements
+    ]
+
+
+@pytest.mark.parametrize(
+    "call, index",
+    [
+        (lambda db: message_repo.list_messages(db, CONVERSATION_ID), "ix_messages_conversation_id_timestamp_message_id"),
+        (
+            lambda db: message_repo.list_messages(db, CONVERSATION_ID, after=AFTER),
+            "ix_messages_conversation_id_timestamp_message_id",
+        ),
+        (lambda db: message_repo.list_recent_messages(db, CONVERSATION_ID), "ix_messages_conversation_id_timestamp_message_id"),
+        (lambda db: message_repo.count_messages(db, CONVERSATION_ID), "ix_messages_conversation_id_timestamp_message_id"),
+        (lambda db: convo_repo.list_conversations(db, USER_ID), "ix_conversations_user_id_created_at_conversation_id"),
+        (
+            lambda db: convo_repo.list_conversations(db, USER_ID, limit=10, after=AFTER),
+            "ix_conversations_user_id_created_at_conversation_id",
+        ),
+        (lambda db: convo_repo.count_conversations(db, USER_ID), "ix_conversations_user_id_created_at_conversation_id"),
+        (lambda db: convo_repo.export_summaries(db, USER_ID), "ix_conversations_user_id_created_at_conversation_id"),
+        (lambda db: usage_repo.get_usage(db, USER_ID), "uq_usage_user_id_date"),
+        (lambda db: usage_repo.get_daily_usage(db, USER_ID, date.today()), "uq_usage_user_id_date"),
+        (lambda db: upload_repo.list_uploads(db, USER_ID), "ix_uploads_user_id_created_at_upload_id"),
+        (lambda db: upload_repo.list_uploads(db, USER_ID, after=AFTER), "ix_uploads_user_id_created_at_upload_id"),
+        (lambda db: user_repo.list_users(db, after=AFTER), "ix_users_live_created_at_user_id"),
+    ],
+)
+def test_repository_queries_use_indexes(db, call, index):
+    if index.startswith("uq_"):
+        # sqlite names the index backing a unique constraint itself
+        index = next(row[1] for row in db.execute(text("PRAGMA index_list('usage')")) if row[3] == "u")
+    for plan in query_plan(db, lambda: call(db)):
+        assert index in plan, plan
+        assert "TEMP B-TREE" not in plan, plan
+
+
+def test_recent_messages_break_timestamp_ties(db):
+    user = user_repo.create_user(db, UserCreate(email="ties@example.com", provider="email", password="pw"))
+    conversation = convo_repo.create_conversation(db, user.user_id)
+    msgs = [
+        message_repo.create_message(db, conversation.conversation_id, None, {"text": str(i)}, "ai") for i in range(4)
+    ]
+    for msg in msgs:
+        msg.timestamp = msgs[0].timestamp
+    db.commit()
+    newest_first = sorted((m.message_id for m in msgs), reverse=True)
+    pages = [message_repo.list_recent_messages(db, conversation.conversation_id, skip=i, limit=2) for i in (0, 2)]
+    assert [m.message_id for page in pages for m in page] == newest_first
+
+
+def test_export_summaries_is_one_query(db):
+    user = user_repo.create_user(db, UserCreate(email="export@example.com", provider="email", password="pw"))
+    conversations = [convo_repo.create_conversation(db, user.user_id, title=f"c{i}") for i in range(3)]
+    for conversation in conversations:
+        message_repo.insert_messages(
+            db,
+            [
+                Message(conversation_id=conversation.conversation_id, content={"text": "hi"}, message_type="user"),
+                Message(conversation_id=conversation.conversation_id, content={"text": "yo"}, message_type="ai"),
+            ],
+        )
+    db.commit()
+    last = message_repo.create_message(db, conversations[0].conversation_id, user.user_id, {"text": "bye"}, "user")
+    message_repo.delete_message(db, last)
+
+    user_id = user.user_id
+    plans = query_plan(db, lambda: convo_repo.export_summaries(db, user_id))
+    assert len(plans) == 1
+    summaries = convo_repo.export_summaries(db, user_id)
+    assert [s["message_count"] for s in summaries] == [2, 2, 2]
+    assert all(s["last_message_at"] is not None for s in summaries)
+
+
+def test_postgres_search_uses_vector_and_pages_before_headline():
+    stmt = message_repo.ranked_search(select(Message), "rocket fuel", skip=0, limit=20)
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    inner = sql[sql.index("FROM (") :]
+    assert "messages.search_vector @@ websearch_to_tsquery" in inner
+    assert "LIMIT" in inner
+    assert "ts_headline" not in inner
+
+
+def test_postgres_headline_is_escaped():
+    raw = "<img src=x onerror=alert(1)> \x02rocket\x03 & fuel"
+    assert message_repo._mark_headline(raw) == "&lt;img src=x onerror=alert(1)&gt; <mark>rocket</mark> &amp; fuel"
+
+
+@pytest.mark.parametrize(
+    "statement, column",
+    [
+        (search.conversation_search(USER_ID, "plan", 20, trigram=True), "conversations.title"),
+        (search.user_search("@acme", 20, trigram=True), "users.email"),
+    ],
+)
+def test_substring_search_is_trigram_ranked(statement, column):
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert f"{column} ILIKE" in sql
+    assert sql.index("similarity(") > sql.index("ORDER BY")
+    assert "LIMIT" in sql
+
+
+def test_trigram_indexes_are_postgres_only(db):
+    indexes = {index.name: index for table in (Conversation, User) for index in table.__table__.indexes}
+    ddl = str(CreateIndex(indexes["ix_users_live_email_trgm"]).compile(dialect=postgresql.dialect()))
+    assert "USING gin (email gin_trgm_ops) WHERE deleted_at IS NULL" in ddl
+    created = {row[0] for row in db.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    assert not {name for name in indexes if name.endswith("_trgm")} & created
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.db.database import Base, get_async_db, get_db, replica, replica_router
+from app.db.replicas import ReplicaRouter
+
+
+def make_router(*replicas, **kwargs):
+    options = {"max_lag": 5.0, "check_interval": 60.0, "sticky_seconds": 5.0, "client_factory": lambda: None}
+    return ReplicaRouter(list(replicas), **{**options, **kwargs})
+
+
+@pytest.fixture
+def replica_urls(tmp_path):
+    urls = []
+    for name in ("one", "two"):
+        url = f"sqlite:///{tmp_path / name}.db"
+        Base.metadata.create_all(bind=create_engine(url))
+        urls.append(url)
+    return urls
+
+
+def test_round_robin_over_healthy_replicas(replica_urls, tmp_path):
+    one, two = replica(replica_urls[0]), replica(replica_urls[1])
+    broken = replica(f"sqlite:///{tmp_path / 'missing' / 'three.db'}")
+    router = make_router(one, two, broken)
+    # nothing is used before the first health check
+    assert router.pick() is None
+
+    router.check()
+    assert (one.healthy, two.healthy, broken.healthy) == (True, True, False)
+    assert [router.pick() for _ in range(4)] == [one, two, one, two]
+    stats = router.stats()
+    assert stats["primary_reads"] == 1
+    assert [r["reads"] for r in stats["replicas"]] == [2, 2, 0]
+
+
+def test_lagging_replicas_fall_back_to_primary(replica_urls, monkeypatch):
+    one, two = replica(replica_urls[0]), replica(replica_urls[1])
+    router = make_router(one, two)
+    lags = {one.engine: 30.0, two.engine: 1.0}
+    monkeypatch.setattr(router, "_lag", lambda connection: lags[connection.engine])
+    router.check()
+    assert [router.pick() for _ in range(2)] == [two, two]
+
+    lags[two.engine] = 12.0
+    router.check()
+    assert router.pick() is None
+
+
+def test_reads_stick_to_primary_after_a_write(replica_urls):
+    one = replica(replica_urls[0])
+    router = make_router(one, sticky_seconds=0.05)
+    router.check()
+    router.mark_write("writer")
+    assert router.pick("writer") is None
+    assert router.pick("reader") is one
+    time.sleep(0.06)
+    assert router.pick("writer") is one
+
+
+def test_write_window_shared_through_redis(replica_urls):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    one = replica(replica_urls[0])
+    writer_worker = make_router(one, client_factory=lambda: client)
+    reader_worker = make_router(one, client_factory=lambda: client)
+    reader_worker.check()
+    writer_worker.mark_write("writer")
+    assert reader_worker.pick("writer") is None
+    assert 0 < client.pttl("db:sticky:writer") <= 5000
+
+
+@pytest.fixture
+def client(tmp_path, replica_urls, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'primary.db'}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    sessions = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async_sessions = async_sessionmaker(
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}"), autoflush=False, expire_on_commit=False
+    )
+
+    async def override_get_async_db():
+        async with async_sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    # the replica is never written to, so anything read from it is stale
+    stale = replica(replica_urls[0])
+    monkeypatch.setattr(replica_router, "replicas", [stale])
+    monkeypatch.setattr(replica_router, "_sticky", {})
+    monkeypatch.setattr(replica_router, "client_factory", lambda: None)
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.clear()
+
+
+def test_read_endpoints_use_replica_except_after_own_write(client):
+    client.post("/api/v1/users", json={"provider": "email", "email": "replica@example.com", "password": "pwd"})
+    login = client.post("/api/v1/auth/login", json={"email": "replica@example.com", "password": "pwd"})
+    headers = {"Authorization": f"Bearer {login.json()['data']['access_token']}"}
+    created = client.post("/api/v1/conversations", headers=headers, json={"title": "fresh"})
+    assert created.status_code == 200
+
+    # the write opened a read-your-writes window: served by the primary
+    assert [c["title"] for c in client.get("/api/v1/conversations", headers=headers).json()["data"]] == ["fresh"]
+    assert client.get("/api/v1/uploads", headers=headers).status_code == 200
+
+    replica_router._sticky.clear()
+    assert client.get("/api/v1/conversations", headers=headers).json()["data"] == []
+    assert client.get("/api/v1/conversations/export", headers=headers).json()["data"] == []
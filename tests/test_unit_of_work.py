@@ -0,0 +1,104 @@
+import os
+import sys
+from datetime import date
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.core.history_cache import history_cache
+from app.repositories import conversation as convo_repo
+from app.repositories import message as message_repo
+from app.repositories import usage as usage_repo
+from app.repositories import user as user_repo
+from app.repositories.unit_of_work import UnitOfWork, record_chat_turn
+from app.schemas.user import UserCreate
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///./test_uow.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+    os.remove("test_uow.db")
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def seed(db):
+    user = user_repo.create_user(db, UserCreate(provider="email", email="uow@example.com", password="pwd"))
+    conv = convo_repo.create_conversation(db, user.user_id)
+    return user.user_id, conv.conversation_id
+
+
+def test_chat_turn_is_one_transaction(engine, db):
+    user_id, conversation_id = seed(db)
+    history_cache.put(conversation_id, [], complete=True)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    record_chat_turn(db, user_id, conversation_id, "hello", "hi there", 7)
+    record_chat_turn(db, user_id, conversation_id, "again", "sure", 3)
+
+    inserts = [s for s in statements if s.startswith("INSERT INTO messages")]
+    assert len(inserts) == 2 and all("RETURNING" in s for s in inserts)
+    assert not any(s.startswith("SELECT") for s in statements)
+    msgs = message_repo.list_messages(db, conversation_id)
+    assert [m.content["text"] for m in msgs] == ["hello", "hi there", "again", "sure"]
+    assert [m["content"] for m in history_cache.get(conversation_id)["messages"]] == [
+        "hello",
+        "hi there",
+        "again",
+        "sure",
+    ]
+    usage = usage_repo.get_daily_usage(db, user_id, date.today())
+    assert (usage.message_count, usage.token_count) == (2, 10)
+
+
+def test_failed_commit_writes_nothing(db, monkeypatch):
+    user_id, conversation_id = seed(db)
+    history_cache.put(conversation_id, [], complete=True)
+    uow = UnitOfWork(db)
+    uow.add_message(conversation_id, user_id, {"text": "hello"}, "user")
+    uow.add_usage(user_id, date.today(), messages=1, tokens=5)
+
+    def fail():
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(db, "commit", fail)
+    with pytest.raises(RuntimeError):
+        uow.commit()
+    monkeypatch.undo()
+
+    assert message_repo.count_messages(db, conversation_id) == 0
+    assert usage_repo.get_daily_usage(db, user_id, date.today()) is None
+    assert history_cache.get(conversation_id)["messages"] == []
+
+
+def test_usage_upsert_is_one_statement(engine, db):
+    user_id, _ = seed(db)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    first = usage_repo.add_usage(db, user_id, date.today(), messages=1, tokens=4)
+    second = usage_repo.add_usage(db, user_id, date.today(), tokens=6, file_uploads=1)
+    db.commit()
+
+    assert len(statements) == 2
+    assert all("ON CONFLICT" in s and "RETURNING" in s for s in statements)
+    assert first is second
+    assert (second.message_count, second.token_count, second.file_uploads) == (1, 10, 1)
+    assert len(usage_repo.get_usage(db, user_id)) == 1
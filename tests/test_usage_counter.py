@@ -0,0 +1,152 @@
+import os
+import sys
+from datetime import date
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.repositories import usage as usage_repo
+from app.repositories import user as user_repo
+from app.repositories.usage_counter import DailyUsage, UsageCounter
+from app.schemas.user import UserCreate
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def user_id(db):
+    return user_repo.create_user(db, UserCreate(provider="email", email="count@example.com", password="pwd")).user_id
+
+
+@pytest.fixture
+def redis_client():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def stored(session_factory, user_id):
+    db = session_factory()
+    try:
+        row = usage_repo.get_daily_usage(db, user_id, TODAY)
+        return (row.message_count, row.token_count, row.file_uploads) if row else None
+    finally:
+        db.close()
+
+
+def test_counts_in_redis_and_flushes_deltas(session_factory, db, user_id, redis_client):
+    usage_repo.add_usage(db, user_id, TODAY, messages=2, tokens=20)
+    db.commit()
+    counter = UsageCounter("redis", session_factory, client_factory=lambda: redis_client)
+
+    counter.record(db, user_id, TODAY, messages=1, tokens=5)
+    assert counter.get(db, user_id, TODAY) == DailyUsage(3, 25, 0)
+    counter.record(db, user_id, TODAY, messages=1, tokens=7, file_uploads=1)
+    assert counter.get(db, user_id, TODAY) == DailyUsage(4, 32, 1)
+    assert stored(session_factory, user_id) == (2, 20, 0)
+
+    assert counter.flush() == 1
+    assert stored(session_factory, user_id) == (4, 32, 1)
+    assert counter.get(db, user_id, TODAY) == DailyUsage(4, 32, 1)
+    assert counter.flush() == 0
+
+
+def test_failed_flush_keeps_deltas(session_factory, db, user_id, redis_client):
+    calls = []
+
+    def broken_session():
+        calls.append(1)
+        raise RuntimeError("database down")
+
+    counter = UsageCounter("redis", broken_session, client_factory=lambda: redis_client)
+    counter.record(db, user_id, TODAY, messages=1, tokens=3)
+    with pytest.raises(RuntimeError):
+        counter.flush()
+
+    counter.session_factory = session_factory
+    assert counter.flush() == 1
+    assert stored(session_factory, user_id) == (1, 3, 0)
+
+
+def test_seed_during_flush_counts_in_flight_deltas(session_factory, db, user_id, redis_client, monkeypatch):
+    import app.repositories.usage_counter as counter_module
+
+    monkeypatch.setattr(counter_module, "SEED_WAIT", 0)
+    counter = UsageCounter("redis", session_factory, client_factory=lambda: redis_client)
+    counter.record(db, user_id, TODAY, messages=1, tokens=3)
+    seen = []
+    write = counter._write
+
+    def slow_write(taken):
+        # a quota check seeding the totals while the deltas are uncommitted
+        seen.append(counter.get(db, user_id, TODAY))
+        write(taken)
+
+    monkeypatch.setattr(counter, "_write", slow_write)
+    assert counter.flush() == 1
+    assert seen == [DailyUsage(1, 3, 0)]
+    db.rollback()
+    assert counter.get(db, user_id, TODAY) == DailyUsage(1, 3, 0)
+
+
+def test_flush_during_seed_restarts_it(session_factory, db, user_id, redis_client, monkeypatch):
+    import app.repositories.usage_counter as counter_module
+
+    counter = UsageCounter("redis", session_factory, client_factory=lambda: redis_client)
+    counter.record(db, user_id, TODAY, messages=2, tokens=5)
+    db_usage = counter_module._db_usage
+    loads = []
+
+    def stale_then_flushed(*args):
+        stored = db_usage(*args)
+        if not loads:
+            # the snapshot is taken, then a flush commits the pending deltas
+            counter.flush()
+        loads.append(stored)
+        return stored
+
+    monkeypatch.setattr(counter_module, "_db_usage", stale_then_flushed)
+    assert counter.get(db, user_id, TODAY) == DailyUsage(2, 5, 0)
+    assert len(loads) == 2
+
+
+def test_reconcile_resets_drifted_totals(session_factory, db, user_id, redis_client):
+    counter = UsageCounter("redis", session_factory, client_factory=lambda: redis_client)
+    counter.record(db, user_id, TODAY, messages=1, tokens=4)
+    assert counter.get(db, user_id, TODAY) == DailyUsage(1, 4, 0)
+    # written while Redis was unreachable
+    usage_repo.add_usage(db, user_id, TODAY, messages=2, tokens=10)
+    db.commit()
+
+    drift = counter.reconcile(TODAY)
+    assert [entry["user_id"] for entry in drift] == [str(user_id)]
+    assert counter.get(db, user_id, TODAY) == DailyUsage(3, 14, 0)
+    assert counter.reconcile(TODAY) == []
+
+
+def test_falls_back_to_database_without_redis(session_factory, db, user_id):
+    counter = UsageCounter("redis", session_factory, client_factory=lambda: None)
+    counter.record(db, user_id, TODAY, messages=1, tokens=9)
+    assert stored(session_factory, user_id) == (1, 9, 0)
+    assert counter.get(db, user_id, TODAY) == DailyUsage(1, 9, 0)
+    assert counter.stats()["fallback_writes"] == 1
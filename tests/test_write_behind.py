@@ -0,0 +1,146 @@
+import json
+import os
+import sys
+from datetime import date
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.repositories import conversation as convo_repo
+from app.repositories import message as message_repo
+from app.repositories import usage as usage_repo
+from app.repositories import user as user_repo
+from app.schemas.user import UserCreate
+from app.services.write_behind import WriteBehindQueue, make_turn
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///./test_write_behind.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+    os.remove("test_write_behind.db")
+
+
+@pytest.fixture
+def factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def seed(factory):
+    db = factory()
+    user = user_repo.create_user(db, UserCreate(provider="email", email="wb@example.com", password="pwd"))
+    conv = convo_repo.create_conversation(db, user.user_id)
+    ids = user.user_id, conv.conversation_id
+    db.close()
+    return ids
+
+
+def test_turns_are_batched_into_one_insert(engine, factory, tmp_path):
+    user_id, conversation_id = seed(factory)
+    inserts = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statement.startswith("INSERT INTO messages") and inserts.append(statement),
+    )
+    queue = WriteBehindQueue(factory, str(tmp_path), flush_ms=10_000)
+    queue.start()
+    for i in range(5):
+        queue.submit_chat_turn(user_id, conversation_id, f"q{i}", f"a{i}", 2)
+    queue.submit_chat_turn(user_id, None, "no conversation", "ok", 1)
+    journal = os.path.join(tmp_path, os.listdir(tmp_path)[0])
+    with open(journal) as fh:
+        assert len(fh.readlines()) == 6
+    queue.stop()
+
+    assert len(inserts) == 1
+    assert queue.stats() == {"pending": 0, "flushed": 6, "batches": 1, "dead": 0}
+    assert os.listdir(tmp_path) == []
+    db = factory()
+    texts = [m.content["text"] for m in message_repo.list_messages(db, conversation_id)]
+    assert texts == [t for i in range(5) for t in (f"q{i}", f"a{i}")]
+    usage = usage_repo.get_daily_usage(db, user_id, date.today())
+    assert (usage.message_count, usage.token_count) == (6, 11)
+    db.close()
+
+
+def test_orphaned_journal_is_replayed_once(factory, tmp_path):
+    user_id, conversation_id = seed(factory)
+    done = make_turn(user_id, conversation_id, "old", "already stored", 3)
+    lost = make_turn(user_id, conversation_id, "new", "never flushed", 4)
+    first = WriteBehindQueue(factory, str(tmp_path))
+    first._write([done])
+    with open(os.path.join(tmp_path, "journal-1-dead.jsonl"), "w") as fh:
+        fh.write(json.dumps(done) + "\n" + json.dumps(lost) + "\n")
+
+    queue = WriteBehindQueue(factory, str(tmp_path))
+    queue.start()
+    queue.stop()
+
+    db = factory()
+    texts = [m.content["text"] for m in message_repo.list_messages(db, conversation_id)]
+    assert texts == ["old", "already stored", "new", "never flushed"]
+    usage = usage_repo.get_daily_usage(db, user_id, date.today())
+    assert (usage.message_count, usage.token_count) == (2, 7)
+    db.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_failing_turn_is_dead_lettered(factory, tmp_path):
+    user_id, conversation_id = seed(factory)
+    broken = {**make_turn(user_id, conversation_id, "bad", "day", 1), "day": "not a date"}
+    queue = WriteBehindQueue(factory, str(tmp_path), flush_ms=10_000)
+    queue.start()
+    queue.submit_chat_turn(user_id, conversation_id, "q0", "a0", 1)
+    queue.submit(broken)
+    queue.submit_chat_turn(user_id, conversation_id, "q1", "a1", 1)
+    queue.stop()
+
+    assert queue.stats() == {"pending": 0, "flushed": 2, "batches": 1, "dead": 1}
+    assert os.listdir(tmp_path) == ["dead-letter.jsonl"]
+    with open(os.path.join(tmp_path, "dead-letter.jsonl")) as fh:
+        (dead,) = [json.loads(line) for line in fh]
+    assert dead["message_ids"] == broken["message_ids"] and "not a date" in dead["error"]
+    db = factory()
+    texts = [m.content["text"] for m in message_repo.list_messages(db, conversation_id)]
+    assert texts == ["q0", "a0", "q1", "a1"]
+    db.close()
+
+
+def test_replay_survives_bad_turns(factory, tmp_path):
+    user_id, conversation_id = seed(factory)
+    lost = make_turn(user_id, conversation_id, "new", "never flushed", 4)
+    broken = {**make_turn(user_id, None, "bad", "turn", 1), "user_id": "nobody"}
+    with open(os.path.join(tmp_path, "journal-1-dead.jsonl"), "w") as fh:
+        fh.write(json.dumps(broken) + "\n" + json.dumps(lost) + '\n{"user_id": "cut sh')
+
+    queue = WriteBehindQueue(factory, str(tmp_path))
+    queue.start()
+    queue.stop()
+
+    assert queue.dead == 1
+    assert os.listdir(tmp_path) == ["dead-letter.jsonl"]
+    db = factory()
+    texts = [m.content["text"] for m in message_repo.list_messages(db, conversation_id)]
+    assert texts == ["new", "never flushed"]
+    db.close()
+
+
+def test_commit_opens_read_your_writes_window(factory, tmp_path, monkeypatch):
+    from app.db.database import replica_router
+
+    monkeypatch.setattr(replica_router, "replicas", [object()])
+    monkeypatch.setattr(replica_router, "_sticky", {})
+    monkeypatch.setattr(replica_router, "client_factory", lambda: None)
+    user_id, conversation_id = seed(factory)
+    queue = WriteBehindQueue(factory, str(tmp_path))
+    queue._write([make_turn(user_id, conversation_id, "q", "a", 1)])
+    assert replica_router.is_sticky(str(user_id))